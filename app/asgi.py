@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# The workers open their connections and load the catalog before serving the first request
+os.environ.setdefault("WARM_UP", "true")
 
 application = get_asgi_application()
@@ -1,4 +1,5 @@
 from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
 
 
 def is_registered(exception):
@@ -8,14 +9,8 @@ def is_registered(exception):
         return False
 
 
-class RequestExceptionHandler:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        response = self.get_response(request)
-        return response
-
+# MiddlewareMixin makes the handler work on both the sync (WSGI) and async (ASGI) request paths
+class RequestExceptionHandler(MiddlewareMixin):
     def process_exception(self, request, exception):
         if is_registered(exception):
             status = exception.status_code
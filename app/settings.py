@@ -12,8 +12,6 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
-import sys
-import django
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,29 +34,43 @@ ALLOWED_HOSTS = [
 
 # Application definition
 
+# The API authenticates with tokens, the admin along with its sessions and messages is only loaded
+# when DJANGO_ADMIN is true, serving it on /admin/.
+DJANGO_ADMIN = os.environ.get("DJANGO_ADMIN", "false").lower() == "true"
+
 INSTALLED_APPS = [
     "corsheaders",
-    "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
-    "django.contrib.sessions",
-    "django.contrib.messages",
     "django.contrib.staticfiles",
     "calculator",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     #'django.middleware.csrf.CsrfViewMiddleware',
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "app.middleware.RequestExceptionHandler",
     "corsheaders.middleware.CorsMiddleware",
 ]
 
+if DJANGO_ADMIN:
+    INSTALLED_APPS[1:1] = [
+        "django.contrib.admin",
+    ]
+    INSTALLED_APPS[4:4] = [
+        "django.contrib.sessions",
+        "django.contrib.messages",
+    ]
+    MIDDLEWARE[1:1] = [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+    ]
+    MIDDLEWARE[3:3] = [
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+    ]
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://localhost:8000",
@@ -96,30 +108,95 @@ TEMPLATES = [
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
-                "django.contrib.auth.context_processors.auth",
-                "django.contrib.messages.context_processors.messages",
             ],
         },
     },
 ]
 
+if DJANGO_ADMIN:
+    TEMPLATES[0]["OPTIONS"]["context_processors"] += [
+        "django.contrib.auth.context_processors.auth",
+        "django.contrib.messages.context_processors.messages",
+    ]
+
 WSGI_APPLICATION = "app.wsgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections
+# Each worker keeps its connections open for DATABASE_CONN_MAX_AGE seconds ("none" keeps them
+# forever, 0 closes them after every request) and checks with a SELECT 1 that a reused one is still
+# alive before the first query of a request. DATABASE_POOL_MAX_SIZE > 0 shares a pool of that many
+# connections between the threads of each worker instead (threaded WSGI, ASGI), a request waits up
+# to DATABASE_POOL_TIMEOUT seconds for a free one. DATABASE_PREPARED_STATEMENTS prepares the hot
+# statements once per connection, turn it off behind a transaction pooler like PgBouncer.
+
+DATABASE_CONN_MAX_AGE = os.environ.get("DATABASE_CONN_MAX_AGE", "60")
+
+DATABASE_CONN_MAX_AGE = (
+    None if DATABASE_CONN_MAX_AGE.lower() == "none" else int(DATABASE_CONN_MAX_AGE)
+)
+
+DATABASE_HEALTH_CHECKS = (
+    os.environ.get("DATABASE_HEALTH_CHECKS", "true").lower() == "true"
+)
+
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 0))
+
+DATABASE_POOL = (
+    {
+        "MAX_SIZE": DATABASE_POOL_MAX_SIZE,
+        "TIMEOUT": float(os.environ.get("DATABASE_POOL_TIMEOUT", 5)),
+        "CHECK_IDLE": float(os.environ.get("DATABASE_POOL_CHECK_IDLE", 30)),
+    }
+    if DATABASE_POOL_MAX_SIZE > 0
+    else None
+)
+
+DATABASE_PREPARED_STATEMENTS = (
+    os.environ.get("DATABASE_PREPARED_STATEMENTS", "true").lower() == "true"
+)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "calculator.backends.postgresql",
         "NAME": os.environ.get("RDS_DB_NAME"),
         "USER": os.environ.get("RDS_USERNAME"),
         "PASSWORD": os.environ.get("RDS_PASSWORD"),
         "HOST": os.environ.get("RDS_HOSTNAME", "db"),
         "PORT": os.environ.get("RDS_PORT", 5432),
+        # The pooled connections go back to the pool at the end of every request
+        "CONN_MAX_AGE": 0 if DATABASE_POOL else DATABASE_CONN_MAX_AGE,
+        "HEALTH_CHECKS": DATABASE_HEALTH_CHECKS,
+        "POOL": DATABASE_POOL,
+        "PREPARED_STATEMENTS": DATABASE_PREPARED_STATEMENTS,
     }
 }
 
+# Read replicas
+# RDS_REPLICA_HOSTNAMES is a comma separated list of hosts replicating the default database, the
+# listings and the user data are read from them while the writes and the authentication stay on the
+# primary one. After a write the reads of the user stick to the primary for REPLICA_STICKY_SECONDS.
+# Locally RDS_REPLICA_HOSTNAMES=db adds a second alias pointing to the same database.
+
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(
+    filter(None, os.environ.get("RDS_REPLICA_HOSTNAMES", "").split(",")), start=1
+):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["calculator.utils.db_router.ReplicaRouter"]
+
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -164,4 +241,147 @@ STATIC_URL = "/static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-django.setup()
+# Shared cache
+# CACHES shares between the workers and nodes the version stamps of their in-memory caches (tokens,
+# operation catalog, records pages) and the read-your-writes window of the replicas. CACHE_BACKEND is
+# "memcached" (CACHE_LOCATION: comma separated host:port, needs pymemcache), "database" (run
+# manage.py createcachetable once) or "locmem", which keeps it on each process and is only right
+# with a single worker: the records page cache and the read replicas are turned off with it.
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+
+if CACHE_BACKEND == "memcached":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "127.0.0.1:11211").split(","),
+        }
+    }
+elif CACHE_BACKEND == "database":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "calculator_cache"),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+SHARED_CACHE = CACHE_BACKEND != "locmem"
+
+# Token authentication cache
+# Each worker keeps the validated tokens in memory, only with a SHARED_CACHE as it's the one taking
+# the logouts done on one worker/node to the rest of them.
+
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get("TOKEN_CACHE_MAX_SIZE", 10000))
+
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", 300))
+
+# Stateless access tokens
+# When enabled /login hands out HMAC signed tokens carrying the user id and the expiration, those
+# are validated without the database and revoked tokens are tracked on each worker.
+
+STATELESS_TOKENS = os.environ.get("STATELESS_TOKENS", "false").lower() == "true"
+
+SIGNED_TOKEN_LIFETIME = int(os.environ.get("SIGNED_TOKEN_LIFETIME", 60 * 60 * 24))
+
+# Without a SHARED_CACHE the logouts reach the other workers when they reload their revoked tokens,
+# which they do at least every SIGNED_TOKEN_REVOCATION_MAX_AGE seconds.
+SIGNED_TOKEN_REVOCATION_MAX_AGE = int(
+    os.environ.get("SIGNED_TOKEN_REVOCATION_MAX_AGE", 5)
+)
+
+# Random strings
+# Each worker prefetches batches of strings from the provider ("random_org", "local" or the dotted
+# path of a RandomStringProvider subclass) and refills them in background below the low water mark.
+
+RANDOM_STRING_PROVIDER = os.environ.get("RANDOM_STRING_PROVIDER", "random_org")
+
+RANDOM_STRING_BATCH_SIZE = int(os.environ.get("RANDOM_STRING_BATCH_SIZE", 200))
+
+RANDOM_STRING_LOW_WATER_MARK = int(os.environ.get("RANDOM_STRING_LOW_WATER_MARK", 50))
+
+RANDOM_STRING_BACKGROUND_REFILL = (
+    os.environ.get("RANDOM_STRING_BACKGROUND_REFILL", "true").lower() == "true"
+)
+
+# Outbound calls to random.org (seconds)
+
+RANDOM_ORG_CONNECT_TIMEOUT = float(os.environ.get("RANDOM_ORG_CONNECT_TIMEOUT", 2))
+
+RANDOM_ORG_READ_TIMEOUT = float(os.environ.get("RANDOM_ORG_READ_TIMEOUT", 5))
+
+RANDOM_ORG_MAX_RETRIES = int(os.environ.get("RANDOM_ORG_MAX_RETRIES", 2))
+
+RANDOM_ORG_FAILURE_THRESHOLD = int(os.environ.get("RANDOM_ORG_FAILURE_THRESHOLD", 5))
+
+RANDOM_ORG_RESET_TIMEOUT = float(os.environ.get("RANDOM_ORG_RESET_TIMEOUT", 30))
+
+# Metrics
+# /api/status/metrics exposes the state of the random.org client and of the database pools, it is
+# only served to the requests sending METRICS_TOKEN as their bearer token and disabled while unset.
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# JSON responses
+# Codec used to serialize the API responses: "auto" (orjson when installed, json otherwise), "json",
+# "orjson" or the dotted path of a function returning the bytes of the data.
+
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+# Async views
+# Routes /api/ to the async views, meant for ASGI deployments (app.asgi) where a worker keeps many
+# requests in flight while they wait on the database or random.org.
+
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "false").lower() == "true"
+
+# Operation catalog
+# Each worker keeps the operations in memory and reloads them when they are written, or at least
+# every OPERATION_CATALOG_MAX_AGE seconds so the writes of other workers reach it without a
+# SHARED_CACHE.
+
+OPERATION_CATALOG_MAX_AGE = int(os.environ.get("OPERATION_CATALOG_MAX_AGE", 30))
+
+# Operations response cache
+# GET /api/operations keeps its serialized responses keyed by the request parameters and the digest
+# of the catalog: "local" (on each worker), "shared" (on the OPERATIONS_RESPONSE_CACHE_ALIAS backend
+# of CACHES), "none" or the dotted path of a cache class. TTL in seconds, 0 keeps them until evicted.
+
+OPERATIONS_RESPONSE_CACHE = os.environ.get("OPERATIONS_RESPONSE_CACHE", "local")
+
+OPERATIONS_RESPONSE_CACHE_ALIAS = os.environ.get(
+    "OPERATIONS_RESPONSE_CACHE_ALIAS", "default"
+)
+
+OPERATIONS_RESPONSE_CACHE_SIZE = int(
+    os.environ.get("OPERATIONS_RESPONSE_CACHE_SIZE", 256)
+)
+
+OPERATIONS_RESPONSE_CACHE_TTL = (
+    int(os.environ.get("OPERATIONS_RESPONSE_CACHE_TTL", 3600)) or None
+)
+
+# Records listing cache
+# Each worker keeps the pages of the records listing per user, until a record of the user is created
+# or deleted (the generation shared through CACHES moves) or the TTL (seconds) passes. Only used with
+# a SHARED_CACHE, otherwise the other workers wouldn't see the generation move.
+
+RECORD_PAGE_CACHE_SIZE = int(os.environ.get("RECORD_PAGE_CACHE_SIZE", 2048))
+
+RECORD_PAGE_CACHE_TTL = int(os.environ.get("RECORD_PAGE_CACHE_TTL", 300))
+
+# Record retention
+# manage.py archive_records moves the soft deleted records and the ones older than the retention
+# (days, 0 keeps them forever) to the archive table, in batches of RECORD_ARCHIVE_BATCH_SIZE rows.
+
+RECORD_RETENTION_DAYS = int(os.environ.get("RECORD_RETENTION_DAYS", 365))
+
+RECORD_ARCHIVE_BATCH_SIZE = int(os.environ.get("RECORD_ARCHIVE_BATCH_SIZE", 1000))
+
+# Warm-up
+# When WARM_UP is true (app.wsgi and app.asgi turn it on) the workers load the operation catalog and
+# check their databases once the apps are ready, before their first request. The connections are
+# closed afterwards, only a pooled one is kept for the requests. Don't combine it with gunicorn
+# --preload, the pools would be shared by the forked workers.
+
+WARM_UP = os.environ.get("WARM_UP", "false").lower() == "true"
@@ -31,3 +31,25 @@ OPERATION_TYPES = (
 )
 
 BASE_USER_BALANCE = 5
+
+
+@enum.unique
+class BatchMode(enum.Enum):
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best_effort"
+
+
+MAX_BATCH_OPERATIONS = 100
+
+# Records deleted at once by their ids
+MAX_BULK_DELETE_IDS = 1000
+
+
+@enum.unique
+class ExportFormat(enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+# Rows fetched per round trip by the server-side cursor of the exports
+EXPORT_CHUNK_SIZE = 2000
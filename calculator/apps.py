@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CalculatorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "calculator"
+
+    def ready(self):
+        from calculator import signals  # noqa: F401
+
+        if settings.WARM_UP:
+            from calculator.utils.startup import warm_up
+
+            warm_up()
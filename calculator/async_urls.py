@@ -0,0 +1,35 @@
+from django.urls import path
+
+from calculator.views import ApiStatusView, MetricsView
+from .views.async_views import (
+    AsyncDeleteRecord,
+    AsyncDeleteRecords,
+    AsyncGetOperations,
+    AsyncGetRecordsSummary,
+    AsyncGetUserRecords,
+    AsyncNewOperationView,
+    AsyncUserView,
+)
+from .views.user_views import LoginView, LogoutView
+from .views.operation_views import BatchOperationView
+
+# Same routes of calculator.urls served by the async views where they are available. records/export
+# is left out, Django 3.2 iterates streaming responses on the event loop where the ORM can't run.
+urlpatterns = [
+    path("login", LoginView.as_view(), name="login"),
+    path("logout", LogoutView.as_view(), name="logout"),
+    path("record", AsyncNewOperationView.as_view(), name="new_operation_record"),
+    path("operations", AsyncGetOperations.as_view(), name="get_operations"),
+    path("records", AsyncGetUserRecords.as_view(), name="get_records"),
+    path("records/summary", AsyncGetRecordsSummary.as_view(), name="records_summary"),
+    path(
+        "records/batch",
+        BatchOperationView.as_view(),
+        name="new_operation_records_batch",
+    ),
+    path("record/delete", AsyncDeleteRecord.as_view(), name="delete_record"),
+    path("records/delete", AsyncDeleteRecords.as_view(), name="delete_records"),
+    path("user", AsyncUserView.as_view(), name="get_user_info"),
+    path("status/", ApiStatusView.as_view(), name="get_api_status"),
+    path("status/metrics", MetricsView.as_view(), name="get_api_metrics"),
+]
@@ -0,0 +1,147 @@
+import psycopg2
+import psycopg2.extras
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from calculator.utils.db_pool import close_connection_pool, get_connection_pool
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    # psycopg2 connection remembering the statements prepared on its session
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+def open_connection(conn_params: dict):
+    # Same connection the Django backend opens, the isolation level is set when it is taken
+    connection = psycopg2.connect(**conn_params)
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # The idle connections of the pool would keep the test database from being dropped
+        close_connection_pool(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend adding to the Django one:
+
+    * HEALTH_CHECKS: a persistent connection (CONN_MAX_AGE) is checked with a SELECT 1 before the
+      first query of each request, so a connection dropped by the server is replaced instead of
+      failing the request.
+    * POOL: {"MAX_SIZE": 10, "TIMEOUT": 5, "CHECK_IDLE": 30} shares a ConnectionPool between the
+      threads of the worker, the connections are taken from it and given back instead of being
+      opened and closed.
+    * PREPARED_STATEMENTS: the statements run through `execute_prepared` are prepared once per
+      connection.
+    """
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        # Pool the current connection was taken from
+        self.connection_pool = None
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get("HEALTH_CHECKS", False)
+
+    @property
+    def prepared_statements_enabled(self):
+        return self.settings_dict.get("PREPARED_STATEMENTS", False)
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        if self.prepared_statements_enabled:
+            conn_params["connection_factory"] = PreparedConnection
+        return conn_params
+
+    def get_pool(self, conn_params: dict):
+        options = self.settings_dict.get("POOL")
+        # The connections to the maintenance database (creating the test one) are never kept
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        return get_connection_pool(
+            self.alias,
+            conn_params,
+            lambda: open_connection(conn_params),
+            max_size=options.get("MAX_SIZE", 10),
+            timeout=options.get("TIMEOUT", 5),
+            check_idle=options.get("CHECK_IDLE", 30),
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn()
+        self.connection_pool = pool
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def connect(self):
+        super().connect()
+        # A new connection doesn't need to be checked
+        self.health_check_done = True
+
+    def _close(self):
+        if self.connection is not None and self.connection_pool is not None:
+            pool, self.connection_pool = self.connection_pool, None
+            with self.wrap_database_errors:
+                return pool.putconn(self.connection)
+        return super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Runs when the requests start and finish, the next request checks the connection again
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_checks_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def execute_prepared(self, cursor, name: str, sql: str, types: list, params: list):
+        """
+        This function runs a statement as a server-side prepared statement, preparing it the first
+        time it runs on the connection so the next runs skip its parsing and planning.
+
+        :param cursor: A cursor of this connection
+        :param name: The name of the prepared statement, unique per statement
+        :param sql: The statement with %s placeholders
+        :param types: The PostgreSQL types of the parameters, in order
+        :param params: The parameters of this run
+        """
+        prepared = getattr(self.connection, "prepared_statements", None)
+        if prepared is None:
+            return cursor.execute(sql, params)
+        if name not in prepared:
+            parts = sql.split("%s")
+            numbered = parts[0] + "".join(
+                f"${number}{part}" for number, part in enumerate(parts[1:], start=1)
+            )
+            cursor.execute(f"PREPARE {name} ({', '.join(types)}) AS {numbered}")
+            prepared.add(name)
+        return cursor.execute(
+            f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params
+        )
@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.hits += 1
+        server.client_ports.add(self.client_address[1])
+        if server.delay:
+            time.sleep(server.delay)
+        if server.failures > 0:
+            server.failures -= 1
+            status, payload = 500, {"error": "upstream error"}
+        else:
+            status, payload = 200, {"result": {"random": {"data": ["abcdefghij"]}}}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fake_upstream_server():
+    """
+    Local HTTP server standing for random.org, the tests can make it fail the next `failures`
+    requests or answer after `delay` seconds, and check how many requests and connections it got.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstreamHandler)
+    server.daemon_threads = True
+    server.hits = 0
+    server.failures = 0
+    server.delay = 0
+    server.client_ports = set()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/json-rpc/4/invoke"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -116,10 +116,14 @@ def build_sample_records(
 
 
 @pytest.fixture
-def random_string_mock_response(monkeypatch):
+def random_string_mock_response(monkeypatch, settings):
+    # Start from an empty pool that is only refilled by the requests of the test
+    settings.RANDOM_STRING_PROVIDER = "random_org"
+    settings.RANDOM_STRING_BACKGROUND_REFILL = False
+    monkeypatch.setattr("calculator.utils.random_string.random_string_pool", None)
     random_string = str(random.randint(1000, 10000))
 
-    def fake_post_event(path, **kwargs):
+    def fake_post_event(session, method, path, **kwargs):
         payload = {
             "jsonrpc": "2.0",
             "result": {
@@ -139,4 +143,4 @@ def random_string_mock_response(monkeypatch):
         response._content = json.dumps(payload).encode("utf-8")
         return response
 
-    monkeypatch.setattr("requests.post", fake_post_event)
+    monkeypatch.setattr("requests.Session.request", fake_post_event)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from calculator.model_queries import query_archive_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the soft deleted records and the ones older than the retention period to the archive "
+        "table, one batch per transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.RECORD_RETENTION_DAYS,
+            help=(
+                "Records older than this amount of days are archived, 0 only archives the "
+                "deleted ones"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.RECORD_ARCHIVE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options["retention_days"] > 0:
+            older_than = now() - timedelta(days=options["retention_days"])
+        archived = 0
+        while True:
+            moved = query_archive_records(older_than, options["batch_size"])
+            if not moved:
+                break
+            archived += moved
+            self.stdout.write(f"{archived} records archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} records"))
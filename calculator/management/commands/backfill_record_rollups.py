@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from calculator.models import Record, RecordArchive, RecordRollup, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily spend rollups of the users from the history of their records, a chunk "
+        "of users per transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="How many users are rebuilt per transaction",
+        )
+
+    @staticmethod
+    def rebuild(user_ids: list):
+        """
+        This function replaces the rollups of the users by the totals of their non deleted records,
+        the archived ones included.
+
+        :param user_ids: The ids of the users to rebuild
+        :return: How many rollups were created
+        """
+        with transaction.atomic():
+            # Locking the users holds back their charges until their rollups are rebuilt
+            list(
+                User.objects.select_for_update()
+                .filter(id__in=user_ids)
+                .values_list("id", flat=True)
+            )
+            RecordRollup.objects.filter(user_id__in=user_ids).delete()
+            rollups = {}
+            for model in (Record, RecordArchive):
+                totals = (
+                    model.objects.filter(user_id__in=user_ids, deleted=False)
+                    .annotate(
+                        day=TruncDate("created_at"), operation_type=F("operation__type")
+                    )
+                    .values("user_id", "day", "operation_type")
+                    .annotate(records=Count("id"), amount=Sum("amount"))
+                    .order_by()
+                )
+                for total in totals.iterator():
+                    key = (total["user_id"], total["day"], total["operation_type"])
+                    rollup = rollups.setdefault(
+                        key,
+                        RecordRollup(user_id=key[0], day=key[1], operation_type=key[2]),
+                    )
+                    rollup.records += total["records"]
+                    rollup.amount += total["amount"]
+            RecordRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+        return len(rollups)
+
+    def handle(self, *args, **options):
+        users = rollups = 0
+        last_user_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_user_id)
+                .order_by("id")
+                .values_list("id", flat=True)[: options["chunk_size"]]
+            )
+            if not user_ids:
+                break
+            rollups += self.rebuild(user_ids)
+            users += len(user_ids)
+            last_user_id = user_ids[-1]
+            self.stdout.write(f"{users} users rebuilt, {rollups} rollups")
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rollups} rollups of {users} users")
+        )
@@ -0,0 +1,71 @@
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import override_settings
+from calculator.utils.responses import ApiResponse, json_codecs, orjson
+from calculator.utils.utils import add_success_response
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the rendering of a large records page: JsonResponse re-parsed twice to add the "
+        "envelope keys against the envelope serialized once by each JSON codec"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=50)
+
+    @staticmethod
+    def build_page(rows):
+        created_at = datetime(2023, 6, 24, 4, 24, 26, 123456)
+        return {
+            "data": [
+                {
+                    "id": index,
+                    "operation_id": random.randint(1, 5),
+                    "user_id": 1,
+                    "amount": round(random.uniform(0, 1), 2),
+                    "user_balance": round(random.uniform(0, 100), 2),
+                    "operation_response": str(random.randint(10, 1000)),
+                    "created_at": created_at - timedelta(minutes=index),
+                    "deleted": False,
+                }
+                for index in range(rows)
+            ],
+            "total_pages": 100,
+            "page": 1,
+            "size": rows,
+        }
+
+    def measure(self, label, render, rounds):
+        started_at = time.perf_counter()
+        size = 0
+        for _ in range(rounds):
+            size += len(render().content)
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            f"{label:<16} {rounds / elapsed:9.1f} pages/s  "
+            f"{size / elapsed / 1024 / 1024:8.1f} MB/s"
+        )
+
+    def handle(self, *args, **options):
+        page = self.build_page(options["rows"])
+
+        def reparse():
+            response = JsonResponse(page)
+            response = add_success_response(response, "success", True)
+            return add_success_response(response, "user_balance", 4.2)
+
+        self.measure("reparse", reparse, options["rounds"])
+        for codec in json_codecs:
+            if codec == "orjson" and orjson is None:
+                continue
+            with override_settings(JSON_CODEC=codec):
+                self.measure(
+                    f"envelope {codec}",
+                    lambda: ApiResponse({**page, "success": True, "user_balance": 4.2}),
+                    options["rounds"],
+                )
@@ -0,0 +1,50 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from calculator.utils.random_string import LocalRandomStringProvider, RandomStringPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the random string operation served one request at a time from the provider "
+        "against the prefetching pool, using the offline provider with a simulated latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Seconds the offline provider waits per call, like a round trip to random.org",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--low-water-mark", type=int, default=50)
+
+    def measure(self, label, get_string, requests):
+        timings = []
+        for _ in range(requests):
+            started_at = time.perf_counter()
+            get_string()
+            timings.append((time.perf_counter() - started_at) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f"{label:<10} mean {statistics.mean(timings):8.3f} ms  "
+            f"p50 {timings[len(timings) // 2]:8.3f} ms  "
+            f"p99 {timings[int(len(timings) * 0.99) - 1]:8.3f} ms"
+        )
+
+    def handle(self, *args, **options):
+        provider = LocalRandomStringProvider(latency=options["latency"])
+        # A single string per request, like calling random.org with n=1
+        self.measure(
+            "direct",
+            lambda: provider.fetch(1)[0],
+            min(options["requests"], 100),
+        )
+        pool = RandomStringPool(
+            provider,
+            batch_size=options["batch_size"],
+            low_water_mark=options["low_water_mark"],
+        )
+        self.measure("pool", pool.get, options["requests"])
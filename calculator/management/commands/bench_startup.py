@@ -0,0 +1,43 @@
+import statistics
+from django.core.management.base import BaseCommand, CommandError
+from calculator.utils.startup import LAZY_MODULES, measure_imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the cold start of a worker: the time a new interpreter takes to set Django up "
+        "and load the URLconf, along with the slowest imports"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument(
+            "--max-ms",
+            type=float,
+            default=None,
+            help="Fail when the median startup takes longer",
+        )
+
+    def handle(self, *args, **options):
+        runs = [measure_imports() for _ in range(max(options["runs"], 1))]
+        wall_ms = statistics.median(run[0] for run in runs)
+        # The imports of the last run, once the bytecode caches are written
+        _, imports, modules = runs[-1]
+        imports_ms = sum(self_us for self_us, _ in imports.values()) / 1000
+        self.stdout.write(
+            f"startup {wall_ms:8.1f} ms (median of {len(runs)})  "
+            f"imports {imports_ms:8.1f} ms  modules {len(modules)}"
+        )
+        slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)
+        for module, (self_us, cumulative_us) in slowest[: options["top"]]:
+            self.stdout.write(
+                f"{self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {module}"
+            )
+        eager = [module for module in LAZY_MODULES if module in modules]
+        if eager:
+            self.stdout.write(f"Imported at startup: {', '.join(eager)}")
+        if options["max_ms"] is not None and wall_ms > options["max_ms"]:
+            raise CommandError(
+                f"The startup took {wall_ms:.1f} ms, more than {options['max_ms']} ms"
+            )
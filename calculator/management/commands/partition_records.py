@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from calculator.utils.partitions import (
+    add_months,
+    create_month_partition,
+    is_partitioned,
+    month_start,
+    partition_name,
+    partition_record_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Partition the records table by month on PostgreSQL and create the partitions of the next "
+        "months, it is meant to run periodically once the table was partitioned"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="How many months after the current one get their partition created",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                "The records table can only be partitioned on PostgreSQL"
+            )
+        with connection.schema_editor() as schema_editor:
+            if not is_partitioned(schema_editor):
+                partition_record_table(schema_editor)
+                self.stdout.write("The records table was partitioned by month")
+            month = month_start(datetime.now(timezone.utc))
+            for _ in range(options["months_ahead"] + 1):
+                if create_month_partition(schema_editor, month):
+                    self.stdout.write(f"Created {partition_name(month)}")
+                month = add_months(month, 1)
+        self.stdout.write(self.style.SUCCESS("The records partitions are up to date"))
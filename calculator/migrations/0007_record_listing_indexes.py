@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0006_operation_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', '-created_at', '-id'], name='record_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', 'amount', 'id'], name='record_user_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', 'user_balance', 'id'], name='record_user_balance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', 'operation', '-created_at'], name='record_user_operation_idx'),
+        ),
+    ]
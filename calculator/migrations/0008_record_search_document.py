@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:39
+
+from django.db import migrations, models
+from calculator.utils.search_index import (
+    build_search_document,
+    create_search_index,
+    drop_search_index,
+)
+
+
+def fill_search_documents(apps, schema_editor):
+    Record = apps.get_model('calculator', 'Record')
+    records = Record.objects.select_related('operation', 'user').order_by('id')
+    batch = []
+    for record in records.iterator(chunk_size=1000):
+        record.search_document = build_search_document(
+            record.operation.type,
+            record.user.username,
+            record.amount,
+            record.user_balance,
+            record.operation_response,
+        )
+        batch.append(record)
+        if len(batch) == 1000:
+            Record.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Record.objects.bulk_update(batch, ['search_document'])
+
+
+def add_search_index(apps, schema_editor):
+    create_search_index(schema_editor)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0007_record_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='search_document',
+            field=models.TextField(default='', editable=False, help_text='Lowercase copy of the searchable fields, indexed to search the records'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
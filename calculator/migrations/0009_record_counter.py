@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_records(apps, schema_editor):
+    Record = apps.get_model('calculator', 'Record')
+    RecordCounter = apps.get_model('calculator', 'RecordCounter')
+    totals = (
+        Record.objects.filter(deleted=False)
+        .values('user_id')
+        .annotate(records=models.Count('id'), spent=models.Sum('amount'))
+        .order_by()
+    )
+    RecordCounter.objects.bulk_create(
+        [RecordCounter(**total) for total in totals.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0008_record_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='record_counter', serialize=False, to='calculator.user')),
+                ('records', models.IntegerField(default=0, help_text='How many non deleted records the user has')),
+                ('spent', models.FloatField(default=0, help_text='How much the non deleted records of the user cost')),
+            ],
+        ),
+        migrations.RunPython(count_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+def stamp_counters(apps, schema_editor):
+    # The deletions weren't timestamped, the newest record is the best guess of the last change
+    Record = apps.get_model('calculator', 'Record')
+    RecordCounter = apps.get_model('calculator', 'RecordCounter')
+    newest = (
+        Record.objects.filter(user_id=models.OuterRef('user_id'))
+        .order_by('-created_at')
+        .values('created_at')[:1]
+    )
+    RecordCounter.objects.update(changed_at=models.Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0009_record_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordcounter',
+            name='changed_at',
+            field=models.DateTimeField(help_text='Last time a record of the user was created or deleted', null=True),
+        ),
+        migrations.RunPython(stamp_counters, migrations.RunPython.noop),
+    ]
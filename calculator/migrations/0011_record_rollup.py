@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0010_recordcounter_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Day the records were created, on the server time zone')),
+                ('operation_type', models.CharField(choices=[('addition', 'Addition'), ('subtraction', 'Subtraction'), ('division', 'Division'), ('square_root', 'Square root'), ('random_string', 'Random string')], help_text='Type of the operation of the records', max_length=30)),
+                ('records', models.IntegerField(default=0, help_text='How many non deleted records the user has on the day')),
+                ('amount', models.FloatField(default=0, help_text='How much the non deleted records of the user cost on the day')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculator.user')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recordrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'operation_type'), name='record_rollup_key'),
+        ),
+    ]
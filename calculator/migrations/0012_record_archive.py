@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculator', '0011_record_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.FloatField(default=0, help_text='How much cost the operation')),
+                ('user_balance', models.FloatField(default=5, help_text='How much left to the user to process new operations')),
+                ('operation_response', models.CharField(default='', help_text='The result of the operation calculated, it could be a number or a random string', max_length=120)),
+                ('created_at', models.DateTimeField(help_text='Date the record was created')),
+                ('deleted', models.BooleanField(default=False, help_text='For logical deletion')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, help_text='Date the record was archived')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculator.operation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='calculator.user')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recordarchive',
+            index=models.Index(fields=['user', '-created_at'], name='record_archive_user_idx'),
+        ),
+    ]
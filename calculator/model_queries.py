@@ -1,34 +1,494 @@
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import localdate, now
 from functools import reduce
+from calculator.models import (
+    Record,
+    RecordArchive,
+    RecordCounter,
+    RecordRollup,
+    Token,
+    User,
+)
+from calculator.utils.exceptions import OutOfMoney
+from calculator.utils.operation_catalog import operation_catalog
+from calculator.utils.record_cache import bump_records_generation
+from calculator.utils.search_index import SEARCH_TABLE, build_search_document
 
 
-def query_filter_to_paginated_api_view(allowed_filters, filter_conditions, queryset):
-    # Apply filter conditions one by one
-    for condition in filter_conditions:
-        key, value = condition.split(":")
+def query_ordering_keys(queryset):
+    """
+    This function returns the ordering of a queryset with the primary key added as the last key, so
+    every row has a unique position to seek from.
 
-        # Handle different filter conditions based on the key
-        if key in allowed_filters:
-            queryset = queryset.filter(**{key: value})
-    return queryset
+    :param queryset: An ordered (or not) queryset
+    :return: A list of ordering keys like ["-created_at", "-id"]
+    """
+    ordering = [key for key in queryset.query.order_by if isinstance(key, str)]
+    if not ordering:
+        ordering = list(queryset.model._meta.ordering)
+    if not any(key.lstrip("-") in ("id", "pk") for key in ordering):
+        descending = bool(ordering) and ordering[-1].startswith("-")
+        ordering.append("-id" if descending else "id")
+    return ordering
 
 
-def query_order_to_paginated_api_view(
-    allowed_order_filters, ordering_conditions, queryset
-):
-    # Apply ordering conditions one by one
-    allowed = lambda x: x in allowed_order_filters
-    for condition in ordering_conditions:
-        if condition.startswith("-"):
-            field = condition[1:]  # Remove the leading '-' for descending order
-            if allowed(field):
-                queryset = queryset.order_by(f"-{field}")
-        elif allowed(condition):
-            queryset = queryset.order_by(condition)
-    return queryset
+def reverse_ordering_keys(ordering):
+    return [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+
+
+def query_seek_to_paginated_api_view(queryset, ordering, values):
+    """
+    This function keeps the rows placed after `values` on the given ordering, the keyset (seek)
+    alternative to OFFSET: (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., using < for descending keys.
+
+    :param queryset: The queryset being paginated
+    :param ordering: The ordering keys of the queryset, like ["-created_at", "-id"]
+    :param values: The values of the ordering keys of the last row already read
+    :return: The filtered queryset
+    """
+    conditions = []
+    for index, key in enumerate(ordering):
+        lookup = "lt" if key.startswith("-") else "gt"
+        previous_keys = {
+            previous_key.lstrip("-"): value
+            for previous_key, value in zip(ordering[:index], values)
+        }
+        conditions.append(
+            Q(**previous_keys, **{f"{key.lstrip('-')}__{lookup}": values[index]})
+        )
+    return queryset.filter(reduce(lambda x, y: x | y, conditions))
 
 
 def query_search_by_related_conditions(queryset, conditions, search):
     queries = [Q(**{f"{condition}__icontains": search}) for condition in conditions]
     queryset = queryset.filter(reduce(lambda x, y: x | y, queries))
     return queryset
+
+
+def query_search_document(queryset, search):
+    """
+    This function searches the records through their indexed search document instead of matching
+    every searchable column of the joined tables.
+
+    :param queryset: A queryset of a model with a `search_document` field
+    :param search: The text to search, it is matched anywhere on the document ignoring the case
+    :return: The filtered queryset
+    """
+    term = search.lower()
+    if connection.vendor == "sqlite" and len(term) >= 3:
+        # The FTS5 trigram tokenizer needs at least 3 characters, shorter terms use LIKE
+        match = '"' + term.replace('"', '""') + '"'
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                [match],
+            )
+        )
+    # The documents are lowercase already, LIKE (instead of ILIKE/UPPER) can use the trigram index
+    return queryset.filter(search_document__contains=term)
+
+
+def query_debit_user_balance(user_id, amount):
+    """
+    This function debits `amount` from the user balance using a single conditional UPDATE, so
+    concurrent debits of the same user never lose updates nor leave a negative balance.
+
+    :param user_id: The id of the user to charge
+    :param amount: How much is going to be debited from the user balance
+    :return: The new user balance or None if the user doesn't have enough money
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {User._meta.db_table} "
+                "SET balance = ROUND((balance - %s)::numeric, 2)::double precision "
+                "WHERE id = %s AND balance >= %s RETURNING balance",
+                [amount, user_id, amount],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    new_balance = Func(
+        F("balance") - amount, Value(2), function="ROUND", output_field=FloatField()
+    )
+    with transaction.atomic():
+        updated = User.objects.filter(id=user_id, balance__gte=amount).update(
+            balance=new_balance
+        )
+        if not updated:
+            return None
+        return User.objects.values_list("balance", flat=True).get(id=user_id)
+
+
+def raise_out_of_money(user_id, operation_type, amount):
+    balance = User.objects.values_list("balance", flat=True).get(id=user_id)
+    raise OutOfMoney(
+        f"User balance({balance}) is not enough to perform an operation({operation_type}) of {amount}"
+    )
+
+
+def query_records_changed(user_id):
+    """
+    This function reads the counters of the records of a user, enough to find out if any of them was
+    created or deleted since a previous read.
+
+    :param user_id: The id of the user owning the records
+    :return: A tuple with how many records the user has and the last time one of them was created or
+    deleted, (0, None) when the user never had any record.
+    """
+    return (
+        RecordCounter.objects.filter(user_id=user_id)
+        .values_list("records", "changed_at")
+        .first()
+    ) or (0, None)
+
+
+def execute_statement(cursor, name: str, sql: str, types: list, params: list):
+    # The PostgreSQL backend of the project prepares the hot statements once per connection
+    if hasattr(cursor.db, "execute_prepared"):
+        return cursor.db.execute_prepared(cursor, name, sql, types, params)
+    return cursor.execute(sql, params)
+
+
+def select_model_columns(model, table_alias: str):
+    # Attribute names of the concrete fields and the SQL selecting them, in the same order
+    fields = model._meta.concrete_fields
+    columns = ", ".join(f'{table_alias}."{field.column}"' for field in fields)
+    return [field.attname for field in fields], columns
+
+
+def query_authenticated_token(key: str):
+    """
+    This function looks up a token that is not deleted along with its user, the query of the
+    requests missing the token cache. On PostgreSQL it is prepared once per connection like the
+    charge of the operations.
+
+    :param key: The token key sent by the client on the HTTP_AUTHORIZATION header
+    :return: The `Token` with its `user` already loaded. If there is no such token a
+    Token.DoesNotExist exception is raised.
+    """
+    if connection.vendor != "postgresql":
+        return Token.objects.select_related("user").get(key=key, deleted=False)
+    token_fields, token_columns = select_model_columns(Token, "token")
+    user_fields, user_columns = select_model_columns(User, "account")
+    with connection.cursor() as cursor:
+        execute_statement(
+            cursor,
+            "authenticated_token",
+            f"SELECT {token_columns}, {user_columns} FROM {Token._meta.db_table} AS token "
+            f"INNER JOIN {User._meta.db_table} AS account ON account.id = token.user_id "
+            "WHERE token.key = %s AND NOT token.deleted",
+            ["text"],
+            [key],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Token.DoesNotExist("Token matching query does not exist.")
+    token = Token.from_db(connection.alias, token_fields, row[: len(token_fields)])
+    token.user = User.from_db(connection.alias, user_fields, row[len(token_fields) :])
+    return token
+
+
+def query_user(user_id: int):
+    """
+    This function loads the user of a token already validated (cached or stateless tokens), prepared
+    once per connection on PostgreSQL.
+
+    :param user_id: The id of the user
+    :return: The `User`. If it doesn't exist a User.DoesNotExist exception is raised.
+    """
+    if connection.vendor != "postgresql":
+        return User.objects.get(pk=user_id)
+    user_fields, user_columns = select_model_columns(User, "account")
+    with connection.cursor() as cursor:
+        execute_statement(
+            cursor,
+            "user_by_id",
+            f"SELECT {user_columns} FROM {User._meta.db_table} AS account "
+            "WHERE account.id = %s",
+            ["int8"],
+            [user_id],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise User.DoesNotExist("User matching query does not exist.")
+    return User.from_db(connection.alias, user_fields, row)
+
+
+# Types of the parameters of the charge statement, in the order they are passed
+CHARGE_OPERATION_TYPES = [
+    "float8",
+    "int8",
+    "float8",
+    "int8",
+    "float8",
+    "timestamptz",
+    "int8",
+    "date",
+    "text",
+    "float8",
+    "int8",
+    "int8",
+    "float8",
+    "text",
+    "timestamptz",
+    "text",
+    "text",
+    "text",
+]
+
+
+def query_charge_operation(user_id, operation, operation_response):
+    """
+    This function charges an operation to the user and stores its `Record` in the same transaction.
+    On PostgreSQL every write is done by a single statement, the conditional UPDATE of the user
+    balance feeds the INSERT of the record and the upserts of the user record counters and of the daily
+    rollup through CTEs, prepared once per connection when the database has PREPARED_STATEMENTS on.
+
+    :param user_id: The id of the user performing the operation
+    :param operation: The operation being charged, its `cost` is debited from the user balance
+    :param operation_response: The result of the operation as a string
+    :return: A tuple with the new user balance and the created `Record`. If the user balance is not
+    enough to pay the operation an OutOfMoney exception is raised and nothing is written.
+    """
+    record = Record(
+        operation_id=operation.id,
+        user_id=user_id,
+        amount=operation.cost,
+        operation_response=operation_response,
+        created_at=now(),
+    )
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                execute_statement(
+                    cursor,
+                    "charge_operation",
+                    f"WITH charged AS ("
+                    f"UPDATE {User._meta.db_table} "
+                    "SET balance = ROUND((balance - %s)::numeric, 2)::double precision "
+                    "WHERE id = %s AND balance >= %s RETURNING balance, username"
+                    f"), counted AS (INSERT INTO {RecordCounter._meta.db_table} AS counter "
+                    "(user_id, records, spent, changed_at) SELECT %s, 1, %s, %s FROM charged "
+                    "ON CONFLICT (user_id) DO UPDATE SET records = counter.records + 1, "
+                    "spent = counter.spent + EXCLUDED.spent, changed_at = EXCLUDED.changed_at"
+                    f"), rolled AS (INSERT INTO {RecordRollup._meta.db_table} AS rollup "
+                    "(user_id, day, operation_type, records, amount) SELECT %s, %s, %s, 1, %s "
+                    "FROM charged ON CONFLICT (user_id, day, operation_type) DO UPDATE SET "
+                    "records = rollup.records + 1, amount = rollup.amount + EXCLUDED.amount"
+                    f") INSERT INTO {Record._meta.db_table} "
+                    "(operation_id, user_id, amount, user_balance, operation_response, created_at, deleted, "
+                    "search_document) "
+                    "SELECT %s, %s, %s, charged.balance, %s, %s, false, "
+                    # Same document built by build_search_document
+                    "LOWER(CONCAT_WS(' ', %s, charged.username, %s, "
+                    "ROUND(charged.balance::numeric, 2)::text, %s)) FROM charged "
+                    "RETURNING id, user_balance, search_document",
+                    CHARGE_OPERATION_TYPES,
+                    [
+                        operation.cost,
+                        user_id,
+                        operation.cost,
+                        user_id,
+                        operation.cost,
+                        record.created_at,
+                        user_id,
+                        localdate(record.created_at),
+                        operation.type,
+                        operation.cost,
+                        record.operation_id,
+                        user_id,
+                        record.amount,
+                        record.operation_response,
+                        record.created_at,
+                        operation.type,
+                        f"{operation.cost:.2f}",
+                        record.operation_response,
+                    ],
+                )
+                row = cursor.fetchone()
+            if row is None:
+                raise_out_of_money(user_id, operation.type, operation.cost)
+            record.id, record.user_balance, record.search_document = row
+            bump_records_generation(user_id)
+        else:
+            new_balance = query_debit_user_balance(user_id, operation.cost)
+            if new_balance is None:
+                raise_out_of_money(user_id, operation.type, operation.cost)
+            record.user_balance = new_balance
+            record.search_document = build_search_document(
+                operation.type,
+                User.objects.values_list("username", flat=True).get(id=user_id),
+                operation.cost,
+                new_balance,
+                operation_response,
+            )
+            record.save()
+    return record.user_balance, record
+
+
+def query_charge_operations(user_id, charges):
+    """
+    This function charges several operations to the user at once, debiting their total cost with a
+    single conditional UPDATE and inserting all their records with one bulk INSERT, both in the same
+    transaction.
+
+    :param user_id: The id of the user performing the operations
+    :param charges: List of (operation, operation_response) tuples in the order they were performed
+    :return: A tuple with the new user balance and the list of created records, each one of them
+    storing the balance the user had right after its operation. If the user balance is not enough to
+    pay all the operations an OutOfMoney exception is raised and nothing is written.
+    """
+    total_cost = round(sum(operation.cost for operation, _ in charges), 2)
+    with transaction.atomic():
+        new_balance = query_debit_user_balance(user_id, total_cost)
+        if new_balance is None:
+            raise_out_of_money(user_id, "batch", total_cost)
+
+        created_at = now()
+        username = User.objects.values_list("username", flat=True).get(id=user_id)
+        user_balance = new_balance + total_cost
+        records = []
+        for operation, operation_response in charges:
+            user_balance -= operation.cost
+            records.append(
+                Record(
+                    operation_id=operation.id,
+                    user_id=user_id,
+                    amount=operation.cost,
+                    user_balance=round(user_balance, 2),
+                    operation_response=operation_response,
+                    created_at=created_at,
+                    search_document=build_search_document(
+                        operation.type,
+                        username,
+                        operation.cost,
+                        round(user_balance, 2),
+                        operation_response,
+                    ),
+                )
+            )
+        Record.objects.bulk_create(records)
+        RecordCounter.add(user_id, len(records), total_cost)
+        rollups = {}
+        for operation, _ in charges:
+            records_count, amount = rollups.get(operation.type, (0, 0))
+            rollups[operation.type] = (records_count + 1, amount + operation.cost)
+        for operation_type, (records_count, amount) in rollups.items():
+            RecordRollup.add(
+                user_id, localdate(created_at), operation_type, records_count, amount
+            )
+    return new_balance, records
+
+
+def query_soft_delete_records(user_id, queryset):
+    """
+    This function soft deletes the records of a user matching a queryset with a single UPDATE, and
+    discounts them from the counters and the rollups of the user in the same transaction. The records
+    that were already deleted are left out, so deleting them again doesn't change the counters.
+
+    :param user_id: The id of the user owning the records, the UPDATE never touches other users rows
+    :param queryset: The records to delete, e.g. the listing filters or a list of ids
+    :return: How many records were deleted
+    """
+    pending = queryset.filter(user_id=user_id, deleted=False).order_by()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            ids_sql, params = pending.values("id").query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {Record._meta.db_table} SET deleted = true "
+                    f"WHERE user_id = %s AND NOT deleted AND id IN ({ids_sql}) "
+                    "RETURNING operation_id, amount, created_at",
+                    [user_id, *params],
+                )
+                rows = cursor.fetchall()
+        else:
+            rows = list(
+                pending.select_for_update().values_list(
+                    "id", "operation_id", "amount", "created_at"
+                )
+            )
+            Record.objects.filter(id__in=[row[0] for row in rows]).update(deleted=True)
+            rows = [row[1:] for row in rows]
+
+        if rows:
+            RecordCounter.add(user_id, -len(rows), -sum(row[1] for row in rows))
+        rollups = {}
+        for operation_id, amount, created_at in rows:
+            key = (localdate(created_at), operation_catalog.get(operation_id).type)
+            records, total = rollups.get(key, (0, 0))
+            rollups[key] = (records + 1, total + amount)
+        for (day, operation_type), (records, amount) in rollups.items():
+            RecordRollup.add(user_id, day, operation_type, -records, -amount)
+    return len(rows)
+
+
+ARCHIVE_COLUMNS = [
+    "id",
+    "operation_id",
+    "user_id",
+    "amount",
+    "user_balance",
+    "operation_response",
+    "created_at",
+    "deleted",
+]
+
+
+def query_archive_records(older_than, batch_size: int):
+    """
+    This function moves a batch of records from the `Record` table to the `RecordArchive` one, the soft
+    deleted records and the ones created before `older_than`. The non deleted records moved are
+    discounted from the counters of their users, the rollups keep them as part of the spend history.
+    On PostgreSQL the batch is moved by a single statement, skipping the rows locked by other requests.
+
+    :param older_than: Datetime before which the records are archived, None to only archive the soft
+    deleted ones
+    :param batch_size: Maximum amount of records moved
+    :return: How many records were moved
+    """
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            condition = (
+                "deleted" if older_than is None else "deleted OR created_at < %s"
+            )
+            params = [batch_size] if older_than is None else [older_than, batch_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {Record._meta.db_table} WHERE id IN ("
+                    f"SELECT id FROM {Record._meta.db_table} WHERE {condition} "
+                    f"ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED) RETURNING {columns}"
+                    f"), archived AS (INSERT INTO {RecordArchive._meta.db_table} "
+                    f"({columns}, archived_at) SELECT {columns}, NOW() FROM moved) "
+                    "SELECT user_id, deleted, COUNT(*), SUM(amount) FROM moved "
+                    "GROUP BY user_id, deleted",
+                    params,
+                )
+                totals = cursor.fetchall()
+        else:
+            condition = Q(deleted=True)
+            if older_than is not None:
+                condition |= Q(created_at__lt=older_than)
+            rows = list(
+                Record.objects.filter(condition)
+                .order_by("id")
+                .values(*ARCHIVE_COLUMNS)[:batch_size]
+            )
+            RecordArchive.objects.bulk_create([RecordArchive(**row) for row in rows])
+            Record.objects.filter(id__in=[row["id"] for row in rows]).delete()
+            grouped = {}
+            for row in rows:
+                records, amount = grouped.get((row["user_id"], row["deleted"]), (0, 0))
+                grouped[(row["user_id"], row["deleted"])] = (
+                    records + 1,
+                    amount + row["amount"],
+                )
+            totals = [key + value for key, value in grouped.items()]
+        for user_id, deleted, records, amount in totals:
+            if not deleted:
+                RecordCounter.add(user_id, -records, -amount)
+    return sum(records for _, _, records, _ in totals)
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.hashers import make_password
-from django.utils.timezone import now
+from django.utils.timezone import localdate, now
 from datetime import timedelta
 from calculator import UserStatus, OperationType, USER_STATUSES, OPERATION_TYPES
+from calculator.utils.operation_catalog import operation_catalog
+from calculator.utils.record_cache import bump_records_generation
+from calculator.utils.search_index import build_search_document
 
 
 class User(models.Model):
@@ -103,7 +106,207 @@ class Record(models.Model):
         auto_now_add=True, help_text="Date the record was created"
     )
     deleted = models.BooleanField(default=False, help_text="For logical deletion")
+    search_document = models.TextField(
+        default="",
+        editable=False,
+        help_text="Lowercase copy of the searchable fields, indexed to search the records",
+    )
+
+    class Meta:
+        # The records listing always filters by user and non deleted rows, each index matches one of
+        # the orderings it allows keeping the id as tiebreaker for the cursor pagination, the last one
+        # serves the listings filtered by operation type newest first
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                condition=models.Q(deleted=False),
+                name="record_user_created_idx",
+            ),
+            models.Index(
+                fields=["user", "amount", "id"],
+                condition=models.Q(deleted=False),
+                name="record_user_amount_idx",
+            ),
+            models.Index(
+                fields=["user", "user_balance", "id"],
+                condition=models.Q(deleted=False),
+                name="record_user_balance_idx",
+            ),
+            models.Index(
+                fields=["user", "operation", "-created_at"],
+                condition=models.Q(deleted=False),
+                name="record_user_operation_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         self.user_balance = round(self.user_balance, 2)  # Round the number
-        super().save(*args, **kwargs)
+        if not self.search_document:
+            self.search_document = build_search_document(
+                self.operation.type,
+                self.user.username,
+                self.amount,
+                self.user_balance,
+                self.operation_response,
+            )
+        if not self._state.adding or self.deleted:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            RecordCounter.add(self.user_id, 1, self.amount)
+            self.add_to_rollup(1)
+
+    def add_to_rollup(self, records: int):
+        # The operation type comes from the catalog so the operation of the record isn't loaded
+        RecordRollup.add(
+            self.user_id,
+            localdate(self.created_at),
+            operation_catalog.get(self.operation_id).type,
+            records,
+            records * self.amount,
+        )
+
+    def soft_delete(self):
+        """
+        This function marks the record as deleted, discounting it from the counters and the rollups of
+        its user in the same transaction. Deleting a record that was already deleted doesn't change them.
+        """
+        with transaction.atomic():
+            deleted = Record.objects.filter(pk=self.pk, deleted=False).update(
+                deleted=True
+            )
+            if deleted:
+                RecordCounter.add(self.user_id, -1, -self.amount)
+                self.add_to_rollup(-1)
+        self.deleted = True
+
+
+class RecordCounter(models.Model):
+    user = models.OneToOneField(
+        User, primary_key=True, on_delete=models.CASCADE, related_name="record_counter"
+    )
+    records = models.IntegerField(
+        default=0, help_text="How many non deleted records the user has"
+    )
+    spent = models.FloatField(
+        default=0, help_text="How much the non deleted records of the user cost"
+    )
+    changed_at = models.DateTimeField(
+        null=True, help_text="Last time a record of the user was created or deleted"
+    )
+
+    @classmethod
+    def add(cls, user_id: int, records: int, spent: float):
+        """
+        This function adds `records` and `spent` (negative values to discount them) to the counters of
+        a user with an atomic UPDATE, creating them the first time. The `changed_at` stamp is moved
+        forward too, it validates the cached copies of the records listing, and the generation of the
+        pages kept in memory is bumped once committed.
+        """
+        bump_records_generation(user_id)
+        counters = cls.objects.filter(user_id=user_id)
+        changed_at = now()
+        values = {
+            "records": models.F("records") + records,
+            "spent": models.F("spent") + spent,
+            "changed_at": changed_at,
+        }
+        if counters.update(**values):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id,
+                    records=records,
+                    spent=spent,
+                    changed_at=changed_at,
+                )
+        except IntegrityError:
+            # Another request created them meanwhile
+            counters.update(**values)
+
+
+class RecordRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField(
+        help_text="Day the records were created, on the server time zone"
+    )
+    operation_type = models.CharField(
+        max_length=30,
+        choices=OPERATION_TYPES,
+        help_text="Type of the operation of the records",
+    )
+    records = models.IntegerField(
+        default=0, help_text="How many non deleted records the user has on the day"
+    )
+    amount = models.FloatField(
+        default=0,
+        help_text="How much the non deleted records of the user cost on the day",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day", "operation_type"], name="record_rollup_key"
+            )
+        ]
+
+    @classmethod
+    def add(cls, user_id: int, day, operation_type: str, records: int, amount: float):
+        """
+        This function adds `records` and `amount` (negative values to discount them) to the rollup of
+        a user for a day and operation type with an atomic UPDATE, creating it the first time.
+        """
+        rollups = cls.objects.filter(
+            user_id=user_id, day=day, operation_type=operation_type
+        )
+        values = {
+            "records": models.F("records") + records,
+            "amount": models.F("amount") + amount,
+        }
+        if rollups.update(**values):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id,
+                    day=day,
+                    operation_type=operation_type,
+                    records=records,
+                    amount=amount,
+                )
+        except IntegrityError:
+            # Another request created it meanwhile
+            rollups.update(**values)
+
+
+class RecordArchive(models.Model):
+    """
+    Cold copy of the records moved out of the `Record` table by the retention job, either because they
+    were soft deleted or because they are older than the retention period. They keep their ids.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    operation = models.ForeignKey(Operation, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    amount = models.FloatField(default=0, help_text="How much cost the operation")
+    user_balance = models.FloatField(
+        default=5, help_text="How much left to the user to process new operations"
+    )
+    operation_response = models.CharField(
+        max_length=120,
+        default="",
+        help_text="The result of the operation calculated, it could be a number or a random string",
+    )
+    created_at = models.DateTimeField(help_text="Date the record was created")
+    deleted = models.BooleanField(default=False, help_text="For logical deletion")
+    archived_at = models.DateTimeField(
+        auto_now_add=True, help_text="Date the record was archived"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"], name="record_archive_user_idx"
+            ),
+        ]
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from calculator.models import Operation
+from calculator.utils.operation_catalog import operation_catalog
+
+
+@receiver(post_save, sender=Operation)
+@receiver(post_delete, sender=Operation)
+def invalidate_operation_catalog(sender, **kwargs):
+    operation_catalog.invalidate()
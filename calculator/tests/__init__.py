@@ -18,3 +18,18 @@ def delete_api(url: str, payload: dict = {}, token="", headers: dict = {}):
     client = Client()
     headers["HTTP_AUTHORIZATION"] = f"Bearer {token}"
     return client.delete(url, payload, content_type="application/json", **headers)
+
+
+def explain_query(queryset):
+    """
+    This function returns the plan the database picks for a queryset. The test tables are too small
+    for PostgreSQL to prefer an index over scanning and sorting the whole table, so those plans are
+    disabled for the current transaction to see which index would serve the query.
+    """
+    from django.db import connection
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            for plan in ("seqscan", "bitmapscan", "sort"):
+                cursor.execute(f"SET LOCAL enable_{plan} = off")
+    return queryset.explain()
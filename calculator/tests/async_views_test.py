@@ -0,0 +1,148 @@
+import json
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+import pytest
+from calculator import OperationType
+from calculator.models import Record
+from calculator.tests import delete_api, get_api, post_api
+
+pytestmark = pytest.mark.urls("calculator.tests.async_urls")
+
+
+def test_async_operation(sample_logged_user_account_token, sample_addition_operation):
+    """
+    This function tests that the async view performs an operation, charges it to the user and stores
+    its record.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    _, operation = sample_addition_operation
+    payload = {
+        "operation_id": operation.id,
+        "variables": json.dumps({"A": 4, "B": 2}),
+    }
+    response = post_api("/api/record", payload, sample_logged_user_account_token.key)
+    data = response.json()
+    assert response.status_code == 200
+    assert data["success"]
+    assert data["data"]["result"] == 6
+    user = sample_logged_user_account_token.user
+    assert data["data"]["user_balance"] == user.balance - operation.cost
+    assert Record.objects.filter(user=user).count() == 1
+
+
+def test_async_random_string_operation(
+    sample_logged_user_account_token,
+    build_sample_operation,
+    random_string_mock_response,
+):
+    """
+    This function tests that the async view performs the random string operation, which runs outside
+    the thread used for the database.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_operation: Fixture creating an operation of the given type, cost and fields
+    :param random_string_mock_response: Fixture answering the random.org requests with a fake string
+    """
+    _, operation = build_sample_operation(OperationType.RANDOM_STRING.value, 1, {})
+    payload = {"operation_id": operation.id, "variables": "{}"}
+    response = post_api("/api/record", payload, sample_logged_user_account_token.key)
+    assert response.status_code == 200
+    assert response.json()["data"]["result"].isdigit()
+
+
+def test_async_operation_out_of_money(
+    sample_logged_user_account_token, sample_addition_record_zero_balance
+):
+    """
+    This function tests that the async view answers with a 402 when the user balance can't pay the
+    operation.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_record_zero_balance: Fixture leaving the user without balance for an
+    addition
+    """
+    operation = sample_addition_record_zero_balance[1].operation
+    payload = {"operation_id": operation.id, "variables": json.dumps({"A": 1, "B": 1})}
+    response = post_api("/api/record", payload, sample_logged_user_account_token.key)
+    assert response.status_code == 402
+    assert not response.json()["success"]
+
+
+def test_async_unauthorized(db):
+    """
+    This function tests that the async views reject the requests sent with an unknown token.
+    """
+    response = get_api("/api/records", {"page": 1, "size": 10}, "unknown")
+    assert response.status_code == 401
+
+
+def test_async_read_endpoints(sample_logged_user_account_token, build_sample_records):
+    """
+    This function tests that the async records, operations and user views answer like the sync ones,
+    and that a record can be deleted through them.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(8)
+    token = sample_logged_user_account_token.key
+    records = get_api("/api/records", {"page": 1, "size": 5}, token)
+    assert records.status_code == 200
+    assert len(records.json()["data"]) == 5
+    operations = get_api("/api/operations", {"page": 1, "size": 10}, token)
+    assert operations.status_code == 200
+    assert operations.json()["data"]
+    user = get_api("/api/user", {}, token)
+    assert (
+        user.json()["data"]["username"]
+        == sample_logged_user_account_token.user.username
+    )
+
+    record_id = records.json()["data"][0]["id"]
+    response = delete_api(f"/api/record/delete?id={record_id}", {}, token)
+    assert response.status_code == 200
+    assert Record.objects.get(id=record_id).deleted
+
+
+def test_async_views_on_asgi_handler(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the async views run on the ASGI handler, which awaits them as
+    coroutines.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    _, operation = sample_addition_operation
+    client = AsyncClient()
+    payload = {"operation_id": operation.id, "variables": {"A": 1, "B": 2}}
+    # Extra keyword arguments are sent as raw headers by the AsyncClient of Django 3.2
+    response = async_to_sync(client.post)(
+        "/api/record",
+        json.dumps(payload),
+        "application/json",
+        authorization=f"Bearer {sample_logged_user_account_token.key}",
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["result"] == 3
+
+
+@pytest.mark.parametrize("url", ["/api/records", "/api/operations", "/api/user"])
+def test_async_methods_not_implemented(sample_logged_user_account_token, url):
+    """
+    This function tests that the async views answer the methods they don't implement like the sync
+    ones, 405 for PUT and the allowed methods for OPTIONS.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param url: The endpoint of an async view
+    """
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {sample_logged_user_account_token.key}"}
+    client = Client()
+    assert client.put(url, **headers).status_code == 405
+    response = client.options(url, **headers)
+    assert response.status_code == 200
+    assert "GET" in response["Allow"]
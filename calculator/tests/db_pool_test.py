@@ -0,0 +1,169 @@
+import threading
+import pytest
+from django.db import connection
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from calculator.tests import get_api
+from calculator.utils.db_pool import ConnectionPool, close_connection_pool
+
+postgresql_only = pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="PostgreSQL backend"
+)
+
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+
+    def rollback(self):
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def test_pool_reuses_connections():
+    """
+    This function tests that a connection given back to the pool is handed out again instead of
+    opening a new one.
+    """
+    opened = []
+    pool = ConnectionPool(lambda: opened.append(FakeConnection()) or opened[-1])
+    first = pool.getconn()
+    pool.putconn(first)
+    assert pool.getconn() is first
+    assert len(opened) == 1
+    assert pool.metrics()["in_use"] == 1
+
+
+def test_pool_rolls_back_and_discards():
+    """
+    This function tests that the pool rolls back the transaction left open on a returned connection
+    and replaces the broken ones.
+    """
+    pool = ConnectionPool(FakeConnection)
+    connection = pool.getconn()
+    connection.info.transaction_status = TRANSACTION_STATUS_INTRANS
+    pool.putconn(connection)
+    assert pool.getconn() is connection
+
+    # Broken connections are replaced by new ones
+    connection.closed = 2
+    pool.putconn(connection)
+    assert pool.getconn() is not connection
+    assert pool.metrics()["discarded"] == 1
+
+
+def test_pool_waits_for_a_free_connection():
+    """
+    This function tests that a full pool waits for a connection to be given back, failing with an
+    OperationalError once the timeout passes.
+    """
+    pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+    connection = pool.getconn()
+    with pytest.raises(OperationalError):
+        pool.getconn()
+
+    # A connection given back meanwhile is handed to the waiting thread
+    pool.timeout = 5
+    threading.Timer(0.05, pool.putconn, [connection]).start()
+    assert pool.getconn() is connection
+    metrics = pool.metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["waits"] == 1
+    assert metrics["size"] == metrics["max_size"] == 1
+
+
+@postgresql_only
+def test_pooled_backend(db, settings):
+    """
+    This function tests that the backend takes its connection from the pool and gives it back on
+    close, and that the pool is reported on the metrics.
+    """
+    from calculator.backends.postgresql.base import DatabaseWrapper
+
+    pooled = DatabaseWrapper(
+        {**connection.settings_dict, "POOL": {"MAX_SIZE": 2}}, alias="pooled"
+    )
+    try:
+        with pooled.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        raw_connection = pooled.connection
+        pooled.close()
+        pool = pooled.get_pool(pooled.get_connection_params())
+        assert pool.metrics()["idle"] == 1
+        with pooled.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        assert pooled.connection is raw_connection
+        settings.METRICS_TOKEN = "metrics-token"
+        metrics = get_api("/api/status/metrics", token="metrics-token").json()
+        pools = metrics["database"]["pools"]
+        assert pools["pooled"]["checkouts"] == 2
+    finally:
+        pooled.close()
+        close_connection_pool("pooled")
+
+
+@postgresql_only
+def test_charge_statement_is_prepared(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the charge of the operations is prepared once per connection and
+    executed on the following charges.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    from calculator.tests.operation_test import reach_operation
+
+    if not connection.settings_dict.get("PREPARED_STATEMENTS"):
+        pytest.skip("Prepared statements are disabled")
+    _, operation = sample_addition_operation
+    for _ in range(2):
+        response, _ = reach_operation(operation, sample_logged_user_account_token.key)
+        assert response.status_code == 200
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM pg_prepared_statements WHERE name = 'charge_operation'"
+        )
+        assert cursor.fetchone()[0] == 1
+
+
+@postgresql_only
+def test_authentication_statements_are_prepared(
+    settings, sample_user_success_account, sample_logged_user_account_token
+):
+    """
+    This function tests that the token lookup of the requests missing the token cache and the user
+    lookup of the stateless tokens are prepared once per connection.
+
+    :param settings: pytest-django fixture to override the django settings
+    :param sample_user_success_account: It is a fixture that sets up a sample user account with
+    valid credentials for testing purposes
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    from calculator.tests.user_test import reach_login
+
+    if not connection.settings_dict.get("PREPARED_STATEMENTS"):
+        pytest.skip("Prepared statements are disabled")
+    for _ in range(2):
+        response = get_api("/api/user", token=sample_logged_user_account_token.key)
+        assert response.status_code == 200
+    settings.STATELESS_TOKENS = True
+    token = reach_login(sample_user_success_account[0]).json()["token"]
+    for _ in range(2):
+        response = get_api("/api/user", token=token)
+        username = response.json()["data"]["username"]
+        assert username == sample_user_success_account[1].username
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM pg_prepared_statements "
+            "WHERE name IN ('authenticated_token', 'user_by_id') ORDER BY name"
+        )
+        assert cursor.fetchall() == [("authenticated_token",), ("user_by_id",)]
@@ -0,0 +1,113 @@
+import pytest
+from calculator.tests import get_api
+from calculator.utils.exceptions import ServiceUnavailable
+from calculator.utils.http_client import OutboundClient
+
+
+def build_client(**kwargs):
+    options = {"read_timeout": 0.5, "max_retries": 2, "backoff": 0.01, **kwargs}
+    return OutboundClient("fake", **options)
+
+
+def test_client_reuses_connections(fake_upstream_server):
+    """
+    This function tests that consecutive requests go through the same keep-alive connection.
+
+    :param fake_upstream_server: Local HTTP server standing for random.org
+    """
+    client = build_client()
+    for _ in range(3):
+        assert client.post(fake_upstream_server.url, json={}).status_code == 200
+    assert fake_upstream_server.hits == 3
+    assert len(fake_upstream_server.client_ports) == 1
+
+
+def test_client_retries_server_errors(fake_upstream_server):
+    """
+    This function tests that 5xx responses are retried until the upstream answers successfully.
+
+    :param fake_upstream_server: Local HTTP server standing for random.org
+    """
+    fake_upstream_server.failures = 2
+    client = build_client()
+    response = client.post(fake_upstream_server.url, json={})
+    metrics = client.metrics()
+    assert response.status_code == 200
+    assert metrics["requests"] == 3
+    assert metrics["retries"] == metrics["errors"] == 2
+
+
+def test_client_read_timeout(fake_upstream_server):
+    """
+    This function tests that a hung upstream is abandoned after the read timeout.
+
+    :param fake_upstream_server: Local HTTP server standing for random.org
+    """
+    fake_upstream_server.delay = 1
+    client = build_client(read_timeout=0.1, max_retries=0)
+    with pytest.raises(ServiceUnavailable):
+        client.post(fake_upstream_server.url, json={})
+    assert client.metrics()["timeouts"] == 1
+
+
+def test_client_circuit_breaker_fails_fast(fake_upstream_server):
+    """
+    This function tests that once the circuit opens the upstream is not called anymore.
+
+    :param fake_upstream_server: Local HTTP server standing for random.org
+    """
+    fake_upstream_server.failures = 10
+    client = build_client(max_retries=0, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ServiceUnavailable):
+            client.post(fake_upstream_server.url, json={})
+    with pytest.raises(ServiceUnavailable):
+        client.post(fake_upstream_server.url, json={})
+    assert fake_upstream_server.hits == 2
+    assert client.metrics()["rejected"] == 1
+    assert client.metrics()["circuit"] == "open"
+
+
+def test_random_string_upstream_unavailable(
+    settings,
+    monkeypatch,
+    fake_upstream_server,
+    sample_logged_user_account_token,
+    sample_operation_records,
+):
+    """
+    This function tests that a failing random.org is reported with a 503 and nothing is charged.
+
+    :param fake_upstream_server: Local HTTP server standing for random.org
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_operation_records: It is a fixture with the operations of the catalog
+    """
+    from calculator.tests.operation_test import reach_operation
+
+    settings.RANDOM_STRING_BACKGROUND_REFILL = False
+    settings.RANDOM_ORG_MAX_RETRIES = 0
+    monkeypatch.setenv("RANDOM_V4_API_URL", fake_upstream_server.url)
+    monkeypatch.setattr("calculator.utils.random_string.random_string_pool", None)
+    monkeypatch.setattr("calculator.utils.random_string.random_org_client", None)
+    fake_upstream_server.failures = 1
+    operation = next(op for op in sample_operation_records if not op.fields)
+    response, _ = reach_operation(operation, sample_logged_user_account_token.key)
+    assert response.status_code == 503
+    assert not sample_logged_user_account_token.user.record_set.exists()
+
+    settings.METRICS_TOKEN = "metrics-token"
+    metrics = get_api("/api/status/metrics", token="metrics-token").json()
+    assert metrics["outbound"]["random_org"]["errors"] == 1
+
+
+def test_metrics_require_the_metrics_token(settings):
+    """
+    This function tests that the metrics are only served to the requests sending the METRICS_TOKEN,
+    and not at all while it is unset.
+    """
+    settings.METRICS_TOKEN = ""
+    assert get_api("/api/status/metrics", token="metrics-token").status_code == 404
+    settings.METRICS_TOKEN = "metrics-token"
+    assert get_api("/api/status/metrics").status_code == 401
+    assert get_api("/api/status/metrics", token="other-token").status_code == 401
+    assert get_api("/api/status/metrics", token="metrics-token").status_code == 200
@@ -1,10 +1,37 @@
+import csv
+from datetime import timedelta
+import io
 import math
+import time
 import pytest
 import json
 from calculator import OperationType
-from calculator.tests import get_api, post_api, delete_api
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from django.utils.timezone import localdate, now
+from calculator.model_queries import query_charge_operation
+from calculator.models import (
+    Record,
+    RecordArchive,
+    RecordCounter,
+    RecordRollup,
+    User,
+)
+from calculator.utils.exceptions import OutOfMoney
+from calculator.utils.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    month_start,
+    partition_name,
+)
+from calculator.utils.search_index import build_search_document
+from calculator.tests import get_api, post_api, delete_api, explain_query
 from calculator.utils.utils import build_dict_with_required_fields, read_json_file
 from calculator.views import operation_functions
+from calculator.views.operation_views import GetUserRecords
 
 operations_json = read_json_file("calculator/fixtures/integrated_operations.json")
 
@@ -23,21 +50,34 @@ def get_operation(
     return get_api("/api/operations", payload, token)
 
 
-def get_records(
-    token,
+def get_records_payload(
     page: int = 1,
     size: int = 10,
     search: str = "",
     filter: str = "",
     order: str = "",
+    fields: str = "",
 ):
-    payload = {
+    return {
         "page": page,
         "size": size,
         "search": search,
         "filter": filter,
         "order": order,
+        "fields": fields,
     }
+
+
+def get_records(
+    token,
+    page: int = 1,
+    size: int = 10,
+    search: str = "",
+    filter: str = "",
+    order: str = "",
+    fields: str = "",
+):
+    payload = get_records_payload(page, size, search, filter, order, fields)
     return get_api("/api/records", payload, token)
 
 
@@ -97,6 +137,131 @@ def test_addition_operation_out_of_money(
     )
 
 
+def test_operation_charges_user_balance(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that performing an operation debits its cost from the user balance and stores
+    the new balance on the created record.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    user = sample_logged_user_account_token.user
+    operation = sample_addition_operation[1]
+    response, _ = reach_operation(operation, sample_logged_user_account_token.key)
+    data = response.json()
+    user.refresh_from_db()
+    assert response.status_code == 200
+    assert data["data"]["user_balance"] == user.balance == 4.8
+    assert user.record_set.get().user_balance == 4.8
+
+
+def test_charge_operation_out_of_money_writes_nothing(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that charging an operation the user can't pay raises OutOfMoney without
+    touching the balance nor creating a record.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    user = sample_logged_user_account_token.user
+    user.balance = 0.1
+    user.save()
+    with pytest.raises(OutOfMoney):
+        query_charge_operation(user.id, sample_addition_operation[1], "11")
+    user.refresh_from_db()
+    assert user.balance == 0.1
+    assert not user.record_set.exists()
+
+
+def reach_batch(operations, token, mode=None):
+    payload = {"operations": operations}
+    if mode:
+        payload["mode"] = mode
+    return post_api("/api/records/batch", payload, token)
+
+
+def test_batch_operations_atomic(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that a batch of operations is charged at once and stores a record per
+    operation with the balance the user had after it.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    operation = sample_addition_operation[1]
+    operations = [
+        {"operation_id": operation.id, "variables": {"A": i, "B": 1}} for i in range(3)
+    ]
+    response = reach_batch(operations, sample_logged_user_account_token.key)
+    data = response.json()
+    assert response.status_code == 200
+    assert [r["result"] for r in data["data"]["results"]] == [1, 2, 3]
+    assert data["data"]["user_balance"] == 4.4
+    records = sample_logged_user_account_token.user.record_set.order_by("user_balance")
+    assert [r.user_balance for r in records] == [4.4, 4.6, 4.8]
+
+
+def test_batch_operations_atomic_invalid_item(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that an invalid operation rejects the whole atomic batch.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    operation = sample_addition_operation[1]
+    operations = [
+        {"operation_id": operation.id, "variables": {"A": 1, "B": 1}},
+        {"operation_id": operation.id, "variables": {"A": 1}},
+    ]
+    response = reach_batch(operations, sample_logged_user_account_token.key)
+    data = response.json()
+    user = sample_logged_user_account_token.user
+    user.refresh_from_db()
+    assert response.status_code == 400
+    assert data["data"]["results"][0]["index"] == 1
+    assert user.balance == 5
+    assert not user.record_set.exists()
+
+
+def test_batch_operations_best_effort(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that a best effort batch processes the operations the user can pay and
+    reports the rest as errors.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    user = sample_logged_user_account_token.user
+    user.balance = 0.5
+    user.save()
+    operation = sample_addition_operation[1]
+    operations = [
+        {"operation_id": operation.id, "variables": {"A": 1, "B": 1}},
+        {"operation_id": 0, "variables": {"A": 1, "B": 1}},
+        {"operation_id": operation.id, "variables": {"A": 2, "B": 2}},
+        {"operation_id": operation.id, "variables": {"A": 3, "B": 3}},
+    ]
+    response = reach_batch(
+        operations, sample_logged_user_account_token.key, "best_effort"
+    )
+    results = response.json()["data"]["results"]
+    assert response.status_code == 200
+    assert [r["success"] for r in results] == [True, False, True, False]
+    assert [r["status"] for r in results if not r["success"]] == [404, 402]
+    assert response.json()["data"]["user_balance"] == 0.1
+    assert user.record_set.count() == 2
+
+
 def test_invalid_addition_operation_payload(
     sample_logged_user_account_token, sample_addition_operation
 ):
@@ -181,6 +346,74 @@ def test_get_filtered_operations_v2(
     assert len(data["data"]) >= 3
 
 
+def test_operation_catalog_serves_operations_from_memory(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that once the operation catalog is loaded performing an operation doesn't
+    query the operation table anymore.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    operation = sample_addition_operation[1]
+    reach_operation(operation, sample_logged_user_account_token.key)
+    with CaptureQueriesContext(connection) as context:
+        response, _ = reach_operation(operation, sample_logged_user_account_token.key)
+    assert response.status_code == 200
+    assert not any("calculator_operation" in q["sql"] for q in context.captured_queries)
+
+
+def test_operation_catalog_reloads_on_operation_change(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the catalog picks the new cost of an operation once it is saved.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    operation = sample_addition_operation[1]
+    reach_operation(operation, sample_logged_user_account_token.key)
+    operation.cost = 1
+    operation.save()
+    response, _ = reach_operation(operation, sample_logged_user_account_token.key)
+    assert response.json()["data"]["user_balance"] == 3.8
+    response = get_operation(sample_logged_user_account_token.key)
+    assert response.json()["data"][0]["cost"] == 1
+
+
+def test_operation_catalog_reloads_after_max_age(
+    settings, sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that an operation changed by another worker, whose version bump never
+    arrived, reaches the catalog and the operations listing once the catalog reaches its max age.
+
+    :param settings: pytest-django fixture to override the django settings
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: A fixture with an addition operation of cost 0.2
+    """
+    from calculator.models import Operation
+    from calculator.utils.operation_catalog import operation_catalog
+
+    operation = sample_addition_operation[1]
+    token = sample_logged_user_account_token.key
+    assert get_operation(token).json()["data"][0]["cost"] == 0.2
+    version = operation_catalog.version
+    # An update() skips the invalidation, as a write on a worker with its own cache
+    Operation.objects.filter(id=operation.id).update(cost=1)
+    assert operation_catalog.get(operation.id).cost == 0.2
+
+    operation_catalog._loaded_at -= settings.OPERATION_CATALOG_MAX_AGE
+    assert operation_catalog.get(operation.id).cost == 1
+    assert operation_catalog.version != version
+    assert get_operation(token).json()["data"][0]["cost"] == 1
+
+
 def test_get_filtered_records_v1(
     sample_logged_user_account_token, build_sample_records
 ):
@@ -263,3 +496,982 @@ def test_delete_record(sample_logged_user_account_token, build_sample_records):
     assert response.status_code == 200
     assert data["data"]["result"]["id"] == record.id
     assert data["data"]["result"]["deleted"] == 1
+
+
+def walk_records_with_cursor(token, size: int, order: str = ""):
+    pages, cursor = [], ""
+    while cursor is not None:
+        payload = {"size": size, "order": order, "cursor": cursor}
+        data = get_api("/api/records", payload, token).json()
+        pages.append(data)
+        cursor = data["next_cursor"]
+    return pages
+
+
+@pytest.mark.parametrize("order", ["", "-user_balance", "operation__type"])
+def test_get_records_with_cursor(
+    sample_logged_user_account_token, build_sample_records, order
+):
+    """
+    This function tests that walking the records listing with the cursors returns every record once,
+    in the order of the page based listing, and that the previous cursor goes back to the page
+    before.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    :param order: The ordering of the listing
+    """
+    build_sample_records(23)
+    token = sample_logged_user_account_token.key
+    expected = get_records(token, size=100, order=order).json()["data"]
+    pages = walk_records_with_cursor(token, 5, order)
+    assert [len(page["data"]) for page in pages] == [5, 5, 5, 5, 3]
+    ids = [row["id"] for page in pages for row in page["data"]]
+    # Rows tied on the ordering key could come in any order from the page based pagination
+    assert sorted(ids) == sorted(row["id"] for row in expected)
+    if not order:
+        assert ids == [row["id"] for row in expected]
+    assert pages[0]["prev_cursor"] is None
+    assert "total_pages" not in pages[0]
+
+    # Going back from the last page returns the same rows of the page before it
+    payload = {"size": 5, "order": order, "cursor": pages[-1]["prev_cursor"]}
+    previous_page = get_api("/api/records", payload, token).json()
+    assert previous_page["data"] == pages[-2]["data"]
+    assert previous_page["next_cursor"] == pages[-2]["next_cursor"]
+
+
+def test_get_records_with_cursor_skips_count_and_offset(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the pages after the first one are read by seeking to the cursor,
+    without counting the records nor skipping them with OFFSET unless the total is asked for.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(12)
+    token = sample_logged_user_account_token.key
+    first_page = get_api("/api/records", {"size": 5, "cursor": ""}, token).json()
+    payload = {"size": 5, "cursor": first_page["next_cursor"]}
+    with CaptureQueriesContext(connection) as queries:
+        get_api("/api/records", payload, token)
+    sql = " ".join(query["sql"] for query in queries.captured_queries).upper()
+    assert "COUNT(" not in sql
+    assert "OFFSET" not in sql
+
+    payload["total"] = "true"
+    data = get_api("/api/records", payload, token).json()
+    assert data["total_pages"] == 3
+
+
+def test_get_records_with_invalid_cursor(sample_logged_user_account_token):
+    """
+    This function tests that a cursor that can't be decoded is rejected with a 400.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    token = sample_logged_user_account_token.key
+    response = get_api("/api/records", {"cursor": "not-a-cursor"}, token)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "body,index",
+    [
+        ({}, "record_user_created_idx"),
+        ({"order": "-created_at"}, "record_user_created_idx"),
+        ({"order": "amount"}, "record_user_amount_idx"),
+        ({"order": "-user_balance"}, "record_user_balance_idx"),
+    ],
+)
+def test_records_listing_uses_indexes(
+    sample_logged_user_account_token, build_sample_records, body, index
+):
+    """
+    This function tests that the database serves each ordering of the records listing of a user from
+    its partial composite index.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    :param body: The request parameters of the listing
+    :param index: The index expected on the query plan
+    """
+    build_sample_records(20)
+    request = RequestFactory().get("/api/records")
+    request.user = sample_logged_user_account_token.user
+    queryset = GetUserRecords().get_queryset(request, body)
+    assert index in explain_query(queryset)
+
+
+def test_charged_record_search_document(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that charging an operation stores the search document of its record, built
+    from the operation type, the username, the amounts and the response.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    _, operation = sample_addition_operation
+    reach_operation(operation, sample_logged_user_account_token.key)
+    record = Record.objects.select_related("user").get()
+    assert record.search_document == build_search_document(
+        operation.type,
+        record.user.username,
+        operation.cost,
+        record.user_balance,
+        record.operation_response,
+    )
+
+
+@pytest.mark.parametrize("search", ["ad", "ADDITION", "admin@", "5", "0.20"])
+def test_search_records_by_document(
+    sample_logged_user_account_token, build_sample_records, search
+):
+    """
+    This function tests that the records search matches the search document case insensitively, and
+    that the document isn't served with the records.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    :param search: The text searched
+    """
+    records = build_sample_records(30)
+    expected = sorted(
+        record.id
+        for type_records in records.values()
+        for record in type_records
+        if search.lower() in record.search_document
+    )
+    response = get_records(
+        sample_logged_user_account_token.key, size=100, search=search
+    )
+    assert response.status_code == 200
+    assert sorted(row["id"] for row in response.json()["data"]) == expected
+    assert all("search_document" not in row for row in response.json()["data"])
+
+
+def test_record_counters(sample_logged_user_account_token, sample_addition_operation):
+    """
+    This function tests that the counters of the user follow the records charged one by one or in a
+    batch and the deleted ones, deleting a record twice discounting it once.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    _, operation = sample_addition_operation
+    token = sample_logged_user_account_token.key
+    user = sample_logged_user_account_token.user
+    reach_operation(operation, token)
+    reach_operation(operation, token)
+    reach_batch(
+        [{"operation_id": operation.id, "variables": {"A": 1, "B": 1}}] * 3, token
+    )
+    counter = RecordCounter.objects.get(user=user)
+    assert counter.records == 5
+    assert round(counter.spent, 2) == round(operation.cost * 5, 2)
+
+    record = Record.objects.filter(user=user).first()
+    delete_api(f"/api/record/delete?id={record.id}", token=token)
+    delete_api(f"/api/record/delete?id={record.id}", token=token)
+    counter.refresh_from_db()
+    assert counter.records == 4
+    assert round(counter.spent, 2) == round(operation.cost * 4, 2)
+
+
+def test_get_records_total_pages_from_counters(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the unfiltered records listing takes its total pages from the counters
+    of the user instead of counting the records.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(25)
+    token = sample_logged_user_account_token.key
+    with CaptureQueriesContext(connection) as queries:
+        data = get_records(token).json()
+    assert data["total_pages"] == 3
+    sql = " ".join(query["sql"] for query in queries.captured_queries).upper()
+    assert "COUNT(" not in sql
+
+
+def test_get_filtered_records_has_next(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that a filtered listing asked without the count tells if there is a next
+    page instead of counting the records.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    records = build_sample_records(30)
+    filter = f"operation__type:{OperationType.ADDITION.value}"
+    total = len(records[OperationType.ADDITION.value])
+    token = sample_logged_user_account_token.key
+    payload = {"size": 5, "filter": filter, "count": "false"}
+    with CaptureQueriesContext(connection) as queries:
+        data = get_api("/api/records", {**payload, "page": 1}, token).json()
+    sql = " ".join(query["sql"] for query in queries.captured_queries).upper()
+    assert "COUNT(" not in sql
+    assert "total_pages" not in data
+    assert data["has_next"] == (total > 5)
+    last_page = math.ceil(total / 5) or 1
+    data = get_api("/api/records", {**payload, "page": last_page}, token).json()
+    assert not data["has_next"]
+    assert len(data["data"]) == total - (last_page - 1) * 5
+
+
+def export_records(token, **payload):
+    response = get_api("/api/records/export", payload, token)
+    return response, b"".join(response.streaming_content).decode()
+
+
+def test_export_records_ndjson(sample_logged_user_account_token, build_sample_records):
+    """
+    This function tests that the export streams one JSON line per record matching the filter, in the
+    requested order and without the search document.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    records = build_sample_records(30)
+    token = sample_logged_user_account_token.key
+    filter = f"operation__type:{OperationType.ADDITION.value}"
+    response, content = export_records(token, filter=filter, order="id")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in content.splitlines()]
+    assert [row["id"] for row in rows] == sorted(
+        record.id for record in records[OperationType.ADDITION.value]
+    )
+    assert all("search_document" not in row for row in rows)
+
+
+def test_export_records_csv(sample_logged_user_account_token, build_sample_records):
+    """
+    This function tests that the export streams the records as CSV, with a header row of the record
+    columns.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(12)
+    response, content = export_records(
+        sample_logged_user_account_token.key, format="csv"
+    )
+    assert response["Content-Type"] == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert len(rows) == 12
+    assert set(rows[0]) == {
+        "id",
+        "operation_id",
+        "user_id",
+        "amount",
+        "user_balance",
+        "operation_response",
+        "created_at",
+        "deleted",
+    }
+
+
+def test_export_records_invalid_format(sample_logged_user_account_token):
+    """
+    This function tests that an export format other than ndjson or csv is rejected with a 400.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    response = get_api(
+        "/api/records/export", {"format": "xml"}, sample_logged_user_account_token.key
+    )
+    assert response.status_code == 400
+
+
+def test_get_records_with_fields(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the records listing only serves and selects the requested fields,
+    following the relations they go through.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(6)
+    token = sample_logged_user_account_token.key
+    payload = {"fields": "id,operation__type,amount"}
+    with CaptureQueriesContext(connection) as queries:
+        data = get_records(token, **payload).json()
+    assert len(data["data"]) == 6
+    assert all(set(row) == {"id", "operation__type", "amount"} for row in data["data"])
+    select = next(
+        query["sql"]
+        for query in queries.captured_queries
+        if 'FROM "calculator_record"' in query["sql"] and "COUNT(" not in query["sql"]
+    )
+    assert '"calculator_operation"."type"' in select
+    assert "operation_response" not in select
+    assert "user_balance" not in select
+
+
+def test_get_records_with_fields_and_cursor(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the cursor pagination keeps working when the ordering key isn't one of
+    the requested fields.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(12)
+    token = sample_logged_user_account_token.key
+    payload = {"size": 5, "order": "-user_balance", "cursor": "", "fields": "amount"}
+    first_page = get_api("/api/records", payload, token).json()
+    assert all(set(row) == {"amount"} for row in first_page["data"])
+    payload["cursor"] = first_page["next_cursor"]
+    second_page = get_api("/api/records", payload, token).json()
+    assert len(second_page["data"]) == 5
+    assert second_page["prev_cursor"] is not None
+
+
+@pytest.mark.parametrize("fields", ["search_document", "id,user__password", ","])
+def test_get_records_with_invalid_fields(sample_logged_user_account_token, fields):
+    """
+    This function tests that the fields that aren't served by the listing, or an empty list of them,
+    are rejected with a 400.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param fields: The fields parameter of the request
+    """
+    response = get_records(sample_logged_user_account_token.key, fields=fields)
+    assert response.status_code == 400
+
+
+def test_get_operations_with_fields(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the operations listing only serves the requested fields.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    response = get_api(
+        "/api/operations", {"fields": "id,type"}, sample_logged_user_account_token.key
+    )
+    data = response.json()["data"]
+    assert data
+    assert all(set(row) == {"id", "type"} for row in data)
+
+
+def test_export_records_with_fields(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the export only writes the columns of the requested fields.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(4)
+    response, content = export_records(
+        sample_logged_user_account_token.key,
+        format="csv",
+        fields="id,operation__type",
+    )
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert len(rows) == 4
+    assert set(rows[0]) == {"id", "operation__type"}
+
+
+def test_get_records_not_modified(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that a records page revalidated with its ETag is answered with a 304 before
+    reading the records, and that another page or a deleted record changes the ETag.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    records = build_sample_records(5)
+    token = sample_logged_user_account_token.key
+    response = get_records(token)
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert not response.has_header("Last-Modified")
+
+    # The 304 is decided before counting or reading the page
+    with CaptureQueriesContext(connection) as queries:
+        response = get_api(
+            "/api/records", get_records_payload(), token, {"HTTP_IF_NONE_MATCH": etag}
+        )
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert not any(
+        'FROM "calculator_record"' in query["sql"] for query in queries.captured_queries
+    )
+
+    # Another page has its own validator
+    response = get_records(token, page=2)
+    assert response["ETag"] != etag
+
+    record = next(record for group in records.values() for record in group)
+    delete_api(f"/api/record/delete?id={record.id}", token=token)
+    response = get_api(
+        "/api/records", get_records_payload(), token, {"HTTP_IF_NONE_MATCH": etag}
+    )
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_get_records_ignore_modified_since(
+    sample_logged_user_account_token,
+    sample_addition_operation,
+    django_capture_on_commit_callbacks,
+):
+    """
+    This function tests that the records listing is only revalidated by its ETag, an If-Modified-Since
+    never hides the records written in the same second.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Operation charged between the two requests
+    """
+    token = sample_logged_user_account_token.key
+    get_records(token)
+    with django_capture_on_commit_callbacks(execute=True):
+        reach_operation(sample_addition_operation[1], token)
+    response = get_api(
+        "/api/records",
+        get_records_payload(),
+        token,
+        {"HTTP_IF_MODIFIED_SINCE": http_date(time.time() + 60)},
+    )
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 1
+
+
+def test_get_operations_not_modified(
+    sample_logged_user_account_token,
+    sample_addition_operation,
+    build_sample_operation,
+    django_capture_on_commit_callbacks,
+):
+    """
+    This function tests that the operations listing is answered with a 304 while the catalog doesn't
+    change, and that a new operation changes its ETag once committed.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    :param build_sample_operation: Fixture creating an operation of the given type, cost and fields
+    """
+    token = sample_logged_user_account_token.key
+    etag = get_operation(token)["ETag"]
+    response = get_api(
+        "/api/operations",
+        {"page": 1, "size": 10, "filter": "", "order": ""},
+        token,
+        {"HTTP_IF_NONE_MATCH": etag},
+    )
+    assert response.status_code == 304
+
+    # A new operation changes the catalog version once committed
+    with django_capture_on_commit_callbacks(execute=True):
+        build_sample_operation(OperationType.SQUARE_ROOT.value, 1, {"A": "number"})
+    assert get_operation(token)["ETag"] != etag
+
+
+def get_rollups(user):
+    return {
+        (rollup.day, rollup.operation_type): (rollup.records, round(rollup.amount, 2))
+        for rollup in RecordRollup.objects.filter(user=user, records__gt=0)
+    }
+
+
+def test_record_rollups(sample_logged_user_account_token, sample_addition_operation):
+    """
+    This function tests that the daily rollups of the user follow the records charged one by one or
+    in a batch and the deleted ones, deleting a record twice discounting it once.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    _, operation = sample_addition_operation
+    token = sample_logged_user_account_token.key
+    user = sample_logged_user_account_token.user
+    reach_operation(operation, token)
+    reach_batch(
+        [{"operation_id": operation.id, "variables": {"A": 1, "B": 1}}] * 3, token
+    )
+    key = (localdate(), operation.type)
+    assert get_rollups(user) == {key: (4, round(operation.cost * 4, 2))}
+
+    record = Record.objects.filter(user=user).first()
+    delete_api(f"/api/record/delete?id={record.id}", token=token)
+    delete_api(f"/api/record/delete?id={record.id}", token=token)
+    assert get_rollups(user) == {key: (3, round(operation.cost * 3, 2))}
+
+
+def test_get_records_summary(sample_logged_user_account_token, build_sample_records):
+    """
+    This function tests that the summary serves the records per day and operation type of the user,
+    filtered by day and operation type, and rejects the invalid days.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    records = build_sample_records(20)
+    token = sample_logged_user_account_token.key
+    data = get_api("/api/records/summary", {}, token).json()
+    expected = {
+        operation_type: len(group) for operation_type, group in records.items() if group
+    }
+    assert {row["operation_type"]: row["records"] for row in data["data"]} == expected
+    assert data["total_records"] == 20
+    assert all(row["day"] == localdate().isoformat() for row in data["data"])
+
+    filter = f"operation_type:{OperationType.ADDITION.value},day__gte:{localdate()}"
+    data = get_api("/api/records/summary", {"filter": filter}, token).json()
+    assert data["total_records"] == len(records[OperationType.ADDITION.value])
+
+    response = get_api("/api/records/summary", {"filter": "day__gte:yesterday"}, token)
+    assert response.status_code == 400
+
+
+def test_get_records_summary_ignore_modified_since(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the summary is only revalidated by its ETag, an If-Modified-Since never
+    hides the records written in the same second.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Operation charged between the two requests
+    """
+    token = sample_logged_user_account_token.key
+    response = get_api("/api/records/summary", {}, token)
+    assert response["ETag"]
+    assert not response.has_header("Last-Modified")
+    reach_operation(sample_addition_operation[1], token)
+    response = get_api(
+        "/api/records/summary",
+        {},
+        token,
+        {"HTTP_IF_MODIFIED_SINCE": http_date(time.time() + 60)},
+    )
+    assert response.status_code == 200
+    assert response.json()["total_records"] == 1
+
+
+def test_backfill_record_rollups(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the backfill command rebuilds the rollups from the records, leaving out
+    the deleted ones.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(15)
+    user = sample_logged_user_account_token.user
+    Record.objects.filter(user=user).first().soft_delete()
+    expected = get_rollups(user)
+    RecordRollup.objects.all().delete()
+    call_command("backfill_record_rollups", chunk_size=1, stdout=io.StringIO())
+    assert get_rollups(user) == expected
+
+
+@pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="Partitioning is PostgreSQL only"
+)
+def test_partitioned_records(
+    sample_logged_user_account_token, build_sample_records, sample_addition_operation
+):
+    """
+    This function tests that the records keep being listed and charged once the table is partitioned
+    by month, and that a listing bounded by creation date only reads the partitions of those months.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    build_sample_records(10)
+    _, operation = sample_addition_operation
+    token = sample_logged_user_account_token.key
+    user = sample_logged_user_account_token.user
+    old_record = Record.objects.filter(user=user).first()
+    Record.objects.filter(id=old_record.id).update(
+        created_at=add_months(old_record.created_at, -2)
+    )
+    expected = [row["id"] for row in get_records(token, size=100).json()["data"]]
+    call_command("partition_records", months_ahead=1, stdout=io.StringIO())
+
+    # The records keep working once the table is partitioned
+    assert [
+        row["id"] for row in get_records(token, size=100).json()["data"]
+    ] == expected
+    response, _ = reach_operation(operation, token)
+    assert response.status_code == 200
+    assert Record.objects.filter(user=user).count() == 11
+
+    # The planner only reads the partitions of the creation dates requested
+    current_month = month_start(now())
+    filter = (
+        f"created_at__gte:{current_month.isoformat()},"
+        f"created_at__lt:{add_months(current_month, 1).isoformat()}"
+    )
+    request = RequestFactory().get("/api/records")
+    request.user = user
+    queryset = GetUserRecords().get_queryset(request, {"filter": filter})
+    plan = explain_query(queryset)
+    assert partition_name(current_month) in plan
+    assert partition_name(add_months(current_month, -2)) not in plan
+    assert partition_name(add_months(current_month, 1)) not in plan
+    assert DEFAULT_PARTITION not in plan
+    assert len(queryset) == 10
+
+
+def test_archive_records(sample_logged_user_account_token, build_sample_records):
+    """
+    This function tests that the archive command moves the deleted records and the ones past the
+    retention to the archive, discounting them from the counters but not from the rollups.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(8)
+    token = sample_logged_user_account_token.key
+    user = sample_logged_user_account_token.user
+    deleted, old, *_ = Record.objects.filter(user=user).order_by("id")
+    deleted.soft_delete()
+    Record.objects.filter(id=old.id).update(created_at=now() - timedelta(days=400))
+    rollups = get_rollups(user)
+
+    call_command(
+        "archive_records", retention_days=365, batch_size=1, stdout=io.StringIO()
+    )
+    assert set(RecordArchive.objects.values_list("id", flat=True)) == {
+        deleted.id,
+        old.id,
+    }
+    assert not Record.objects.filter(id__in=[deleted.id, old.id]).exists()
+    assert RecordCounter.objects.get(user=user).records == 6
+    data = get_records(token).json()
+    assert data["total_pages"] == 1
+    assert len(data["data"]) == 6
+    # The spend history keeps the archived records
+    assert get_rollups(user) == rollups
+
+
+def build_other_user_record(operation):
+    other_user = User(username="other@admin.com", password="other")
+    other_user.save()
+    record = Record(operation=operation, user=other_user, amount=operation.cost)
+    record.save()
+    return record
+
+
+def test_delete_record_of_other_user(
+    sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that a user can't delete the record of another user, it is answered with a
+    404 and the record is kept.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    record = build_other_user_record(sample_addition_operation[1])
+    response = delete_api(
+        f"/api/record/delete?id={record.id}", token=sample_logged_user_account_token.key
+    )
+    assert response.status_code == 404
+    record.refresh_from_db()
+    assert not record.deleted
+
+
+def test_delete_records_by_ids(
+    sample_logged_user_account_token, build_sample_records, sample_operation_records
+):
+    """
+    This function tests that the bulk delete soft deletes the given records of the user with a
+    single UPDATE, skipping the already deleted ones and the ones of other users, and discounts them
+    from the counters and rollups.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    :param sample_operation_records: It is a fixture with the operations of the catalog
+    """
+    build_sample_records(10)
+    token = sample_logged_user_account_token.key
+    user = sample_logged_user_account_token.user
+    other_record = build_other_user_record(sample_operation_records[0])
+    records = list(Record.objects.filter(user=user).order_by("id"))
+    records[0].soft_delete()
+    ids = [record.id for record in records[:4]] + [other_record.id]
+    expected_rollups = get_rollups(user)
+    for record in records[1:4]:
+        key = (localdate(record.created_at), record.operation.type)
+        count, amount = expected_rollups[key]
+        expected_rollups[key] = (count - 1, round(amount - record.amount, 2))
+    expected_rollups = {
+        key: value for key, value in expected_rollups.items() if value[0]
+    }
+
+    with CaptureQueriesContext(connection) as queries:
+        response = delete_api(
+            "/api/records/delete?ids=" + ",".join(map(str, ids)), token=token
+        )
+    assert response.status_code == 200
+    assert response.json()["data"]["deleted"] == 3
+    if connection.vendor == "postgresql":
+        updates = [q for q in queries.captured_queries if "UPDATE" in q["sql"]]
+        assert "UPDATE calculator_record SET deleted = true" in updates[0]["sql"]
+    assert Record.objects.filter(user=user, deleted=False).count() == 6
+    assert RecordCounter.objects.get(user=user).records == 6
+    assert get_rollups(user) == expected_rollups
+    other_record.refresh_from_db()
+    assert not other_record.deleted
+
+
+def test_delete_records_by_filter(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the bulk delete soft deletes the records matching the filter of the
+    listing.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    records = build_sample_records(12)
+    token = sample_logged_user_account_token.key
+    filter = f"operation__type:{OperationType.ADDITION.value}"
+    response = delete_api(f"/api/records/delete?filter={filter}", token=token)
+    additions = len(records[OperationType.ADDITION.value])
+    assert response.json()["data"]["deleted"] == additions
+    assert get_records(token, size=100, filter=filter).json()["data"] == []
+    user = sample_logged_user_account_token.user
+    assert RecordCounter.objects.get(user=user).records == 12 - additions
+
+
+@pytest.mark.parametrize(
+    "query", ["", "?ids=1,a", "?ids=,", "?filter=,", "?search=%20", "?filter=bogus:1"]
+)
+def test_delete_records_bad_request(
+    sample_logged_user_account_token, build_sample_records, query
+):
+    """
+    This function tests that a bulk delete without ids, a filter or a search that narrow the records
+    is rejected instead of deleting every record of the user.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user
+    :param query: The query string of the request
+    """
+    build_sample_records(4)
+    response = delete_api(
+        f"/api/records/delete{query}", token=sample_logged_user_account_token.key
+    )
+    assert response.status_code == 400
+    user = sample_logged_user_account_token.user
+    assert Record.objects.filter(user=user, deleted=False).count() == 4
+
+
+def test_get_records_multi_key_order(
+    sample_logged_user_account_token, build_sample_records
+):
+    """
+    This function tests that the records listing is ordered by every key of the order parameter, the
+    id breaking the ties, in a single ORDER BY.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(20)
+    token = sample_logged_user_account_token.key
+    with CaptureQueriesContext(connection) as queries:
+        data = get_records(token, size=100, order="operation__type,-amount").json()
+    rows = [(row["operation_id"], row["amount"], row["id"]) for row in data["data"]]
+    types = dict(Record.objects.values_list("operation_id", "operation__type"))
+    assert [(types[row[0]], -row[1], -row[2]) for row in rows] == sorted(
+        (types[row[0]], -row[1], -row[2]) for row in rows
+    )
+    select = next(
+        query["sql"]
+        for query in queries.captured_queries
+        if 'FROM "calculator_record" ' in query["sql"] and "ORDER BY" in query["sql"]
+    )
+    assert '"calculator_record"."amount" DESC' in select
+    assert '"calculator_record"."id" DESC' in select
+
+
+def test_get_records_not_allowed_filter(sample_logged_user_account_token):
+    """
+    This function tests that a filter on a key the listing doesn't allow is rejected with a 400.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    response = get_records(sample_logged_user_account_token.key, filter="deleted:1")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("backend", ["local", "shared"])
+def test_get_operations_response_cache(
+    backend,
+    settings,
+    monkeypatch,
+    sample_logged_user_account_token,
+    sample_addition_operation,
+    build_sample_operation,
+    django_capture_on_commit_callbacks,
+):
+    """
+    This function tests that the operations listing is served from the cached bytes of its response,
+    and that a new operation leaves the cached responses behind once committed.
+
+    :param backend: The OPERATIONS_RESPONSE_CACHE backend
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    :param build_sample_operation: Fixture creating an operation of the given type, cost and fields
+    """
+    from calculator.views.operation_views import GetOperations
+
+    settings.OPERATIONS_RESPONSE_CACHE = backend
+    monkeypatch.setattr(
+        "calculator.utils.response_cache.operations_response_cache", None
+    )
+    token = sample_logged_user_account_token.key
+    response = get_operation(token)
+    assert response.status_code == 200
+
+    # The hits are served from the cached bytes without building the page
+    def fail(*args, **kwargs):
+        raise AssertionError("The response wasn't cached")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(GetOperations, "process_request", fail)
+        cached = get_operation(token)
+    assert cached.status_code == 200
+    assert cached.content == response.content
+
+    # A new operation bumps the catalog version, which leaves the cached responses behind
+    with django_capture_on_commit_callbacks(execute=True):
+        build_sample_operation(OperationType.SQUARE_ROOT.value, 1, {"A": "number"})
+    data = get_operation(token).json()
+    assert len(data["data"]) == len(response.json()["data"]) + 1
+
+
+def test_get_records_page_cache(
+    settings,
+    sample_logged_user_account_token,
+    sample_addition_operation,
+    django_capture_on_commit_callbacks,
+):
+    """
+    This function tests that the records pages are served from the worker cache while the generation
+    of the user doesn't move, that new and deleted records move it once committed, and that nothing
+    is cached without a shared cache.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    settings.SHARED_CACHE = True
+    _, operation = sample_addition_operation
+    token = sample_logged_user_account_token.key
+    with django_capture_on_commit_callbacks(execute=True):
+        reach_operation(operation, token)
+    first = get_records(token).json()
+    assert len(first["data"]) == 1
+
+    # The same page is served from memory, without the page query nor the COUNT
+    with CaptureQueriesContext(connection) as queries:
+        cached = get_records(token).json()
+    assert cached == first
+    assert not any(
+        'FROM "calculator_record" ' in query["sql"]
+        for query in queries.captured_queries
+    )
+
+    # New and deleted records move the generation of the user once committed
+    with django_capture_on_commit_callbacks(execute=True):
+        reach_operation(operation, token)
+    data = get_records(token).json()
+    assert len(data["data"]) == 2
+    with django_capture_on_commit_callbacks(execute=True):
+        delete_api(f"/api/record/delete?id={data['data'][0]['id']}", token=token)
+    assert len(get_records(token).json()["data"]) == 1
+
+    # A process-local cache wouldn't see the writes of the other workers, the pages aren't kept
+    settings.SHARED_CACHE = False
+    with CaptureQueriesContext(connection) as queries:
+        get_records(token)
+    assert any(
+        'FROM "calculator_record" ' in query["sql"]
+        for query in queries.captured_queries
+    )
+
+
+def test_replica_routing(
+    settings, sample_logged_user_account_token, sample_addition_operation
+):
+    """
+    This function tests that the reads of the listings go to a replica and the writes to the primary
+    database, and that the user reads from the primary one after a write or without a shared cache.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param sample_addition_operation: Fixture creating an addition operation
+    """
+    from django.core.cache.backends.db import DatabaseCache
+    from calculator.utils.db_router import ReplicaRouter, use_database
+    from calculator.views.operation_views import NewOperationView
+
+    settings.DATABASE_REPLICAS = ["replica_1"]
+    request = RequestFactory().get("/api/records")
+    request.user = sample_logged_user_account_token.user
+    # The sticky window can't reach the other workers through a process-local cache
+    settings.SHARED_CACHE = False
+    assert GetUserRecords().get_read_database(request) is None
+    settings.SHARED_CACHE = True
+    assert GetUserRecords().get_read_database(request) == "replica_1"
+    assert NewOperationView().get_read_database(request) is None
+
+    # The reads follow the database of the request, the writes stay on the primary one
+    cache_entry = DatabaseCache("calculator_cache", {}).cache_model_class
+    with use_database("replica_1"):
+        assert Record.objects.all().db == "replica_1"
+        assert ReplicaRouter().db_for_write(Record) == "default"
+        assert ReplicaRouter().db_for_read(cache_entry) == "default"
+    assert Record.objects.all().db == "default"
+
+    # After a write the user reads from the primary database until the sticky window passes
+    _, operation = sample_addition_operation
+    reach_operation(operation, sample_logged_user_account_token.key)
+    assert GetUserRecords().get_read_database(request) is None
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+import pytest
+from calculator.models import Record
+from calculator.utils.exceptions import BadRequest
+from calculator.utils.query_plans import compile_query_plan
+from calculator.views.operation_views import GetUserRecords
+
+ALLOWED = GetUserRecords.allowed_order_filters
+
+
+def test_query_plan_typed_filters():
+    """
+    This function tests that the filters of a query plan keep their values converted to the type of
+    their columns, the datetimes made aware.
+    """
+    plan = compile_query_plan(
+        Record,
+        ALLOWED,
+        "amount__gt:0.5,operation__type:addition,created_at__gte:2023-06-24T04:24:26Z",
+    )
+    assert plan.filters == (
+        ("amount__gt", "amount", "gt", 0.5),
+        ("operation__type", "operation__type", "exact", "addition"),
+        (
+            "created_at__gte",
+            "created_at",
+            "gte",
+            datetime(2023, 6, 24, 4, 24, 26, tzinfo=timezone.utc),
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "order,default,expected",
+    [
+        ("operation__type,-amount", [], ("operation__type", "-amount", "-id")),
+        ("", ["-created_at"], ("-created_at", "-id")),
+        ("amount,id", [], ("amount", "id")),
+    ],
+)
+def test_query_plan_ordering(order, default, expected):
+    """
+    This function tests that the ordering of a query plan falls back on the default one and always
+    ends with the id.
+
+    :param order: The order parameter of the request
+    :param default: The default ordering of the view
+    :param expected: The ordering of the plan
+    """
+    plan = compile_query_plan(
+        Record, ALLOWED, order_param=order, default_ordering=default
+    )
+    assert plan.ordering == expected
+
+
+def test_query_plan_is_cached():
+    """
+    This function tests that the same parameters return the plan compiled the first time.
+    """
+    plan = compile_query_plan(Record, ALLOWED, "amount__lt:2", "-amount")
+    assert compile_query_plan(Record, ALLOWED, "amount__lt:2", "-amount") is plan
+
+
+@pytest.mark.parametrize(
+    "filter,order",
+    [
+        ("deleted:true", ""),
+        ("amount", ""),
+        ("amount__gt:much", ""),
+        ("created_at__gte:yesterday", ""),
+        ("", "search_document"),
+        ("", "amount__lt"),
+    ],
+)
+def test_query_plan_invalid(filter, order):
+    """
+    This function tests that the keys that aren't allowed or valid and the values that don't match
+    their column are rejected with a BadRequest.
+
+    :param filter: The filter parameter of the request
+    :param order: The order parameter of the request
+    """
+    with pytest.raises(BadRequest):
+        compile_query_plan(Record, ALLOWED, filter, order)
@@ -0,0 +1,54 @@
+import time
+from calculator.utils.random_string import (
+    LocalRandomStringProvider,
+    RandomStringPool,
+    RANDOM_STRING_CHARACTERS,
+    RANDOM_STRING_LENGTH,
+)
+
+
+class CountingProvider(LocalRandomStringProvider):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def fetch(self, n: int):
+        self.calls.append(n)
+        return super().fetch(n)
+
+
+def test_local_provider_strings():
+    """
+    This function tests that the offline provider returns strings shaped like the random.org ones.
+    """
+    strings = LocalRandomStringProvider().fetch(20)
+    assert len(strings) == 20
+    assert all(len(string) == RANDOM_STRING_LENGTH for string in strings)
+    assert all(set(string) <= set(RANDOM_STRING_CHARACTERS) for string in strings)
+
+
+def test_pool_serves_strings_from_a_single_batch():
+    """
+    This function tests that the pool fetches the strings in batches instead of once per request.
+    """
+    provider = CountingProvider()
+    pool = RandomStringPool(provider, batch_size=10, low_water_mark=2, background=False)
+    strings = [pool.get() for _ in range(10)]
+    assert provider.calls == [10]
+    assert len(set(strings)) == 10
+
+
+def test_pool_refills_in_background_below_low_water_mark():
+    """
+    This function tests that the pool asks for a new batch in background once it goes below the low
+    water mark, before it runs out of strings.
+    """
+    provider = CountingProvider()
+    pool = RandomStringPool(provider, batch_size=10, low_water_mark=5)
+    for _ in range(6):
+        pool.get()
+    deadline = time.monotonic() + 5
+    while len(pool) < 14 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert provider.calls == [10, 10]
+    assert len(pool) == 14
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+import pytest
+from calculator.utils.responses import ApiResponse, json_codecs, orjson
+
+
+def upper_codec(data):
+    return json.dumps(data).upper().encode()
+
+
+@pytest.mark.parametrize("codec", list(json_codecs))
+def test_api_response_codecs(settings, codec):
+    """
+    This function tests that every JSON codec serializes the datetimes, dates, times and decimals of
+    a response in the format of DjangoJSONEncoder.
+
+    :param codec: The name of the codec on JSON_CODEC
+    """
+    if codec == "orjson" and orjson is None:
+        pytest.skip("orjson is not installed")
+    settings.JSON_CODEC = codec
+    created_at = datetime(2023, 6, 24, 4, 24, 26, 398900, tzinfo=timezone.utc)
+    response = ApiResponse(
+        {
+            "data": [
+                {
+                    "created_at": created_at,
+                    "day": created_at.date(),
+                    "time": created_at.time(),
+                    "amount": Decimal("0.20"),
+                }
+            ],
+            "success": True,
+        }
+    )
+    assert response["Content-Type"] == "application/json"
+    # Every codec keeps the format of DjangoJSONEncoder, milliseconds and Z for UTC
+    assert json.loads(response.content) == {
+        "data": [
+            {
+                "created_at": "2023-06-24T04:24:26.398Z",
+                "day": "2023-06-24",
+                "time": "04:24:26.398",
+                "amount": "0.20",
+            }
+        ],
+        "success": True,
+    }
+
+
+def test_api_response_custom_codec(settings):
+    """
+    This function tests that JSON_CODEC accepts the dotted path of a custom codec function.
+    """
+    settings.JSON_CODEC = "calculator.tests.response_test.upper_codec"
+    assert ApiResponse({"status": "ok"}).content == b'{"STATUS": "OK"}'
+
+
+def test_envelope_serialized_once(
+    sample_logged_user_account_token, build_sample_records, monkeypatch
+):
+    """
+    This function tests that the records listing serializes its whole envelope, data, success and
+    balance, a single time.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param build_sample_records: Fixture creating records of the user, it returns them grouped by
+    operation type
+    """
+    build_sample_records(3)
+    calls = []
+    monkeypatch.setattr(
+        "calculator.utils.responses.get_json_codec",
+        lambda: lambda data: calls.append(data)
+        or json.dumps(data, default=str).encode(),
+    )
+    from calculator.tests import get_api
+
+    response = get_api("/api/records", {}, sample_logged_user_account_token.key)
+    data = response.json()
+    assert len(calls) == 1
+    assert data["success"] is True
+    assert data["user_balance"] == sample_logged_user_account_token.user.balance
+    assert len(data["data"]) == 3
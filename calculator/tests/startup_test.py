@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.db import connection
+from calculator.utils import startup
+from calculator.utils.db_pool import connection_pools_metrics
+from calculator.utils.operation_catalog import operation_catalog
+from calculator.utils.startup import LAZY_MODULES, measure_imports, warm_up
+
+
+def test_startup_skips_lazy_modules():
+    """
+    This function tests that a new worker loads every view without importing the modules only some
+    requests need (the HTTP client of random.org, the admin along with its sessions and messages).
+    """
+    _, imports, modules = measure_imports()
+    assert "calculator.views" in imports
+    assert [module for module in LAZY_MODULES if module in modules] == []
+
+
+def test_warm_up(
+    transactional_db, sample_addition_operation, django_assert_num_queries
+):
+    """
+    This function tests that the warm-up closes the connection it opened, as the requests run on
+    other threads, leaving it in the pool when there is one, and loads the operation catalog so the
+    first request doesn't query it.
+
+    :param transactional_db: pytest-django fixture to run the test outside of a transaction
+    :param sample_addition_operation: Operation loaded into the catalog
+    :param django_assert_num_queries: pytest-django fixture to count the queries of a block of code
+    """
+    _, operation = sample_addition_operation
+    connection.close()
+    operation_catalog.invalidate()
+    warm_up()
+    # Django never closes the in-memory SQLite database of the tests
+    if connection.vendor != "sqlite":
+        assert connection.connection is None
+    pools = connection_pools_metrics()
+    if connection.settings_dict.get("POOL"):
+        assert pools[connection.alias]["idle"] >= 1
+    with django_assert_num_queries(0):
+        assert operation_catalog.get(operation.id) is not None
+
+
+def test_warm_up_on_ready(settings, monkeypatch):
+    """
+    This function tests that the workers only warm up when WARM_UP is true.
+    """
+    calls = []
+    monkeypatch.setattr(startup, "warm_up", lambda: calls.append(True))
+    config = apps.get_app_config("calculator")
+    settings.WARM_UP = False
+    config.ready()
+    assert calls == []
+    settings.WARM_UP = True
+    config.ready()
+    assert calls == [True]
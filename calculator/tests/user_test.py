@@ -1,4 +1,13 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from calculator.utils.cache import get_version
+from calculator.utils.signed_tokens import (
+    REVOCATION_VERSION_KEY,
+    RevocationSet,
+    read_signed_token,
+    revoked_tokens,
+)
 from calculator.tests import get_api, post_api
 
 
@@ -86,3 +95,130 @@ def test_simple_get_user_info(sample_logged_user_account_token):
     data = response.json()
     assert data["data"]["username"] == user.username
     assert data["data"]["user_balance"] == user.balance
+
+
+def test_get_user_not_modified(sample_logged_user_account_token):
+    """
+    This function tests that polling the user with the ETag of the previous response gets a 304 until
+    the balance of the user changes.
+
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    token = sample_logged_user_account_token.key
+    etag = get_api("/api/user", token=token)["ETag"]
+    response = get_api("/api/user", token=token, headers={"HTTP_IF_NONE_MATCH": etag})
+    assert response.status_code == 304
+
+    user = sample_logged_user_account_token.user
+    user.balance -= 1
+    user.save()
+    response = get_api("/api/user", token=token, headers={"HTTP_IF_NONE_MATCH": etag})
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.parametrize("shared_cache", [True, False])
+def test_cached_token_skips_token_lookup(
+    settings, sample_logged_user_account_token, shared_cache
+):
+    """
+    This function tests that once a token was validated the following requests don't query it, nor
+    the user when the view only needs its id. Without a shared cache the tokens aren't cached.
+
+    :param settings: pytest-django fixture to change the settings during the test
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    :param shared_cache: Whether the cache is shared by the workers
+    """
+    settings.SHARED_CACHE = shared_cache
+    token = sample_logged_user_account_token.key
+    with CaptureQueriesContext(connection) as miss:
+        assert get_api("/api/records/summary", token=token).status_code == 200
+    with CaptureQueriesContext(connection) as hit:
+        assert get_api("/api/records/summary", token=token).status_code == 200
+    if shared_cache:
+        assert len(hit) < len(miss)
+    else:
+        assert len(hit) == len(miss)
+
+
+def test_logout_invalidates_cached_token(settings, sample_logged_user_account_token):
+    """
+    This function tests that a cached token can't be used anymore after the user logs out.
+
+    :param settings: pytest-django fixture to change the settings during the test
+    :param sample_logged_user_account_token: It is a token that represents a logged-in user account
+    """
+    settings.SHARED_CACHE = True
+    token = sample_logged_user_account_token.key
+    assert get_api("/api/user", token=token).status_code == 200
+    post_api("/api/logout", token=token)
+    response = get_api("/api/user", token=token)
+    assert response.status_code == 401
+
+
+def test_stateless_token_login_and_logout(
+    settings, sample_user_success_account, django_assert_num_queries
+):
+    """
+    This function tests the stateless token mode, the token is validated without querying the
+    database and it is rejected once the user logs out.
+
+    :param settings: pytest-django fixture to override the django settings
+    :param sample_user_success_account: It is a fixture that sets up a sample user account with
+    valid credentials for testing purposes
+    :param django_assert_num_queries: pytest-django fixture to count the queries of a block of code
+    """
+    settings.STATELESS_TOKENS = True
+    token = reach_login(sample_user_success_account[0]).json()["token"]
+    # The first request loads the revocation set of the worker
+    get_api("/api/user", token=token)
+    # Then only the user is loaded, the token is never looked up
+    with django_assert_num_queries(1):
+        response = get_api("/api/user", token=token)
+    assert response.status_code == 200
+    assert (
+        response.json()["data"]["username"] == sample_user_success_account[1].username
+    )
+
+    post_api("/api/logout", token=token)
+    assert get_api("/api/user", token=token).status_code == 401
+
+
+def test_stateless_token_revoked_by_another_worker(
+    settings, sample_user_success_account
+):
+    """
+    This function tests that a stateless token revoked by another worker is rejected once the
+    revocations of this worker reach their max age, even if the version bump of the other worker
+    never arrived (a cache per process).
+
+    :param settings: pytest-django fixture to override the django settings
+    :param sample_user_success_account: It is a fixture that sets up a sample user account with
+    valid credentials for testing purposes
+    """
+    settings.STATELESS_TOKENS = True
+    token = reach_login(sample_user_success_account[0]).json()["token"]
+    assert get_api("/api/user", token=token).status_code == 200
+
+    # The other worker has its own revocations and version stamp
+    RevocationSet().revoke(read_signed_token(token))
+    revoked_tokens._version = get_version(REVOCATION_VERSION_KEY)
+    assert get_api("/api/user", token=token).status_code == 200
+
+    revoked_tokens._refreshed_at -= settings.SIGNED_TOKEN_REVOCATION_MAX_AGE
+    assert get_api("/api/user", token=token).status_code == 401
+
+
+def test_stateless_token_tampered(settings, sample_user_success_account):
+    """
+    This function tests that a stateless token with a modified user id is rejected.
+
+    :param settings: pytest-django fixture to override the django settings
+    :param sample_user_success_account: It is a fixture that sets up a sample user account with
+    valid credentials for testing purposes
+    """
+    settings.STATELESS_TOKENS = True
+    token = reach_login(sample_user_success_account[0]).json()["token"]
+    _, payload = token.split(".", 1)
+    response = get_api("/api/user", token=f"999.{payload}")
+    assert response.status_code == 401
@@ -1,12 +1,16 @@
 from django.urls import path
 
-from calculator.views import ApiStatusView
+from calculator.views import ApiStatusView, MetricsView
 from .views.user_views import LoginView, LogoutView, UserView
 from .views.operation_views import (
     NewOperationView,
+    BatchOperationView,
     GetOperations,
     GetUserRecords,
+    ExportUserRecords,
+    GetRecordsSummary,
     DeleteRecord,
+    DeleteRecords,
 )
 
 urlpatterns = [
@@ -15,7 +19,16 @@ urlpatterns = [
     path("record", NewOperationView.as_view(), name="new_operation_record"),
     path("operations", GetOperations.as_view(), name="get_operations"),
     path("records", GetUserRecords.as_view(), name="get_records"),
+    path("records/export", ExportUserRecords.as_view(), name="export_records"),
+    path("records/summary", GetRecordsSummary.as_view(), name="records_summary"),
+    path(
+        "records/batch",
+        BatchOperationView.as_view(),
+        name="new_operation_records_batch",
+    ),
     path("record/delete", DeleteRecord.as_view(), name="delete_record"),
+    path("records/delete", DeleteRecords.as_view(), name="delete_records"),
     path("user", UserView.as_view(), name="get_user_info"),
     path("status/", ApiStatusView.as_view(), name="get_api_status"),
+    path("status/metrics", MetricsView.as_view(), name="get_api_metrics"),
 ]
@@ -0,0 +1,124 @@
+import time
+import threading
+from collections import OrderedDict
+from django.core.cache import cache
+
+
+class LRUCache:
+    """
+    A small thread-safe, size bounded cache that keeps the most recently used entries in memory and
+    forgets each one once its own deadline has passed. It lives in the worker process, so every
+    value stored here should be cheap to rebuild from the database.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, deadline = item
+            if deadline is not None and deadline <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        This function stores a value, evicting the least recently used entries when it is full.
+
+        :param key: Hashable key used to find the value later
+        :param value: The value to keep in memory
+        :param ttl: Optional amount of seconds the value will be valid, the cache ttl by default
+        """
+        ttl = self.ttl if ttl is None else ttl
+        deadline = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_version(key: str):
+    """
+    This function returns the shared version stamp stored on Django's cache framework under `key`.
+    Workers compare it against the one they saw last time to find out if another process or node
+    changed the data they keep in memory.
+
+    :param key: The cache key of the version stamp
+    :return: An integer, when the key is missing (never bumped or evicted) a fresh time based value
+    is stored so every worker sees a change and drops what it cached.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str):
+    """
+    This function increments the shared version stamp stored under `key`, which invalidates the
+    in-memory copies kept by every worker.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+class VersionedLRUCache(LRUCache):
+    """
+    A LRUCache that is dropped entirely whenever the shared version stamp stored under `version_key`
+    changes, giving a cheap way to spread invalidations to every worker process/node.
+    """
+
+    def __init__(self, version_key: str, max_size: int = 1024, ttl: float = None):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.version_key = version_key
+        self._version = None
+
+    def check_version(self):
+        version = get_version(self.version_key)
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def invalidate(self, key=None):
+        """
+        This function removes `key` (or everything when not provided) from the local cache and bumps
+        the shared version so the rest of the workers do the same.
+        """
+        if key is None:
+            self.clear()
+        else:
+            self.delete(key)
+        previous_version = self._version
+        self._version = bump_version(self.version_key)
+        if previous_version is None or self._version != previous_version + 1:
+            # Somebody else bumped the version meanwhile, so what we have could be stale
+            self.clear()
@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import date
+from calculator.utils.exceptions import BadRequest
+
+NEXT_PAGE = "next"
+PREVIOUS_PAGE = "prev"
+
+
+def _dump_value(value):
+    # isoformat keeps the microseconds, needed to seek on datetime keys without skipping rows
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(ordering: list, values: list, direction: str = NEXT_PAGE):
+    """
+    This function builds the opaque cursor handed to the client to fetch the page next to a row.
+
+    :param ordering: The ordering keys of the paginated query, like ["-created_at", "-id"]
+    :param values: The values of the ordering keys for the row the page starts after
+    :param direction: NEXT_PAGE to read the rows after it or PREVIOUS_PAGE for the ones before it
+    :return: An url-safe string
+    """
+    payload = json.dumps(
+        {"o": ordering, "v": [_dump_value(value) for value in values], "d": direction},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    This function reads a cursor built by `encode_cursor`.
+
+    :param cursor: The cursor sent by the client
+    :return: A tuple with the ordering keys, their values and the direction of the page, a
+    BadRequest exception is raised if the cursor is malformed.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        ordering, values, direction = payload["o"], payload["v"], payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise BadRequest("Invalid cursor")
+    if (
+        not isinstance(ordering, list)
+        or not isinstance(values, list)
+        or len(ordering) != len(values)
+        or direction not in (NEXT_PAGE, PREVIOUS_PAGE)
+    ):
+        raise BadRequest("Invalid cursor")
+    return ordering, values, direction
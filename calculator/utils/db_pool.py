@@ -0,0 +1,214 @@
+import threading
+import time
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class ConnectionPool:
+    """
+    The ConnectionPool keeps up to `max_size` open database connections shared by the threads of the
+    worker. A thread takes one on its first query and gives it back once the request is done,
+    waiting up to `timeout` seconds when all of them are in use. Connections idle for more than
+    `check_idle` seconds are pinged before handing them out, the broken ones are replaced.
+    """
+
+    def __init__(
+        self, connect, max_size: int = 10, timeout: float = 5, check_idle: float = 30
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        # (connection, time it was given back) tuples, the last one is the most recently used
+        self._idle = []
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._counters = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "discarded": 0,
+        }
+
+    @staticmethod
+    def is_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, connection):
+        # Called holding the condition
+        self._size -= 1
+        self._counters["discarded"] += 1
+        self._condition.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _reserve(self, deadline: float):
+        """
+        This function waits, holding the condition, for an idle connection or a free slot.
+
+        :return: A tuple with the (connection, time it was given back) pair, None when a slot was
+        reserved for a new connection, and if the thread had to wait for it.
+        """
+        waited = False
+        while True:
+            if self._idle:
+                return self._idle.pop(), waited
+            if self._size < self.max_size:
+                self._size += 1
+                return None, waited
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._counters["timeouts"] += 1
+                raise OperationalError(
+                    f"No database connection was released within {self.timeout} seconds, "
+                    f"all the {self.max_size} connections of the pool are in use"
+                )
+            waited = True
+            self._waiting += 1
+            try:
+                self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def getconn(self):
+        """
+        This function hands out an idle connection, opening a new one while the pool isn't full.
+
+        :return: An open psycopg2 connection, if none is released within `timeout` seconds an
+        OperationalError is raised.
+        """
+        started_at = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._condition:
+                item, reserved_waited = self._reserve(deadline)
+            waited = waited or reserved_waited
+            if item is None:
+                try:
+                    connection = self.connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                break
+            # The idle connections are checked without holding the condition
+            connection, returned_at = item
+            if not connection.closed and (
+                time.monotonic() - returned_at <= self.check_idle
+                or self.is_usable(connection)
+            ):
+                break
+            with self._condition:
+                self._discard(connection)
+
+        with self._condition:
+            self._counters["checkouts"] += 1
+            if waited:
+                wait_ms = (time.perf_counter() - started_at) * 1000
+                self._counters["waits"] += 1
+                self._counters["wait_ms_total"] += wait_ms
+                self._counters["wait_ms_max"] = max(
+                    self._counters["wait_ms_max"], wait_ms
+                )
+        return connection
+
+    def putconn(self, connection):
+        """
+        This function gives a connection back to the pool, rolling back the transaction left open
+        (if any). The broken connections and the ones returned once the pool was closed are closed
+        instead.
+        """
+        if not connection.closed and (
+            connection.info.transaction_status != TRANSACTION_STATUS_IDLE
+        ):
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+        with self._condition:
+            if (
+                self._closed
+                or connection.closed
+                or connection.info.transaction_status != TRANSACTION_STATUS_IDLE
+            ):
+                self._discard(connection)
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """
+        This function closes the idle connections, the ones in use are closed once returned.
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def metrics(self):
+        with self._condition:
+            metrics = dict(self._counters)
+            metrics.update(
+                {
+                    "max_size": self.max_size,
+                    "size": self._size,
+                    "idle": len(self._idle),
+                    "in_use": self._size - len(self._idle),
+                    "waiting": self._waiting,
+                }
+            )
+        metrics["wait_ms_avg"] = (
+            metrics["wait_ms_total"] / metrics["waits"] if metrics["waits"] else 0.0
+        )
+        return metrics
+
+
+# Pool of each database alias of the worker, along with the connection parameters it was opened with
+connection_pools = {}
+connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(alias: str, conn_params: dict, connect, **options):
+    """
+    This function returns the pool of a database alias, creating it the first time. The pool is
+    replaced when the connection parameters change, e.g. once the test database is created.
+
+    :param alias: The alias of the database on DATABASES
+    :param conn_params: The parameters the connections are opened with
+    :param connect: Function opening a new connection
+    :return: A ConnectionPool built with `options`
+    """
+    with connection_pools_lock:
+        params, pool = connection_pools.get(alias, (None, None))
+        if pool is None or params != conn_params:
+            if pool is not None:
+                pool.close()
+            pool = ConnectionPool(connect, **options)
+            connection_pools[alias] = (dict(conn_params), pool)
+        return pool
+
+
+def close_connection_pool(alias: str):
+    with connection_pools_lock:
+        _, pool = connection_pools.pop(alias, (None, None))
+    if pool is not None:
+        pool.close()
+
+
+def connection_pools_metrics():
+    with connection_pools_lock:
+        pools = {alias: pool for alias, (_, pool) in connection_pools.items()}
+    return {alias: pool.metrics() for alias, pool in pools.items()}
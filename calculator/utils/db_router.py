@@ -0,0 +1,78 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARY_STICKY_KEY = "calculator:primary_sticky:%s"
+
+# Database the reads of the current request go to, None means the primary one. A context variable
+# follows the request through the threads of sync_to_async on the async views.
+read_database = ContextVar("read_database", default=None)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the views that opted in (see `use_database`) to a read replica and everything
+    else, writes and authentication included, to the primary database. The replicas are copies of
+    the primary one, so they are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        # The database cache (CACHE_BACKEND=database) holds the sticky windows, it can't lag behind
+        if model._meta.app_label == "django_cache":
+            return DEFAULT_DB_ALIAS
+        return read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_database(alias: str = None):
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def stick_to_primary(user_id: int):
+    """
+    This function sends the reads of a user to the primary database for REPLICA_STICKY_SECONDS, so
+    the records and the balance they just wrote are there when they read them back even if the
+    replicas are lagging behind. The window is shared with every worker through CACHES.
+    """
+    if settings.DATABASE_REPLICAS and settings.REPLICA_STICKY_SECONDS > 0:
+        cache.set(
+            PRIMARY_STICKY_KEY % user_id, True, timeout=settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def is_sticky(user_id: int):
+    return bool(cache.get(PRIMARY_STICKY_KEY % user_id))
+
+
+def get_replica(user_id: int):
+    """
+    This function picks the database the reads of a user go to.
+
+    :param user_id: The id of the authenticated user
+    :return: The alias of one of the DATABASE_REPLICAS, or None for the primary database when there
+    are no replicas, the user wrote something during the sticky window or the window can't be shared
+    with the rest of the workers (no SHARED_CACHE).
+    """
+    if (
+        not settings.DATABASE_REPLICAS
+        or not settings.SHARED_CACHE
+        or is_sticky(user_id)
+    ):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
@@ -1,12 +1,101 @@
 from datetime import datetime
 from wsgiref.simple_server import WSGIRequestHandler
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
 from calculator.utils.exceptions import Unauthorized
-from calculator.models import Token
+from calculator.model_queries import query_authenticated_token, query_user
+from calculator.utils.token_cache import cache_token, get_cached_token
+from calculator.utils.signed_tokens import (
+    is_signed_token,
+    read_signed_token,
+    revoked_tokens,
+)
 from django.utils import timezone
 
 
+class LazyUser(SimpleLazyObject):
+    """
+    A user loaded from the database on first use, except for its id that is already known from the
+    token, so the views that only read `request.user.id` don't query it.
+    """
+
+    def __init__(self, user_id: int):
+        super().__init__(lambda: query_user(user_id))
+        # Set on the instance so reading them doesn't go through the wrapped user
+        self.__dict__["id"] = self.__dict__["pk"] = user_id
+
+
+def expired_token_response():
+    return JsonResponse(
+        {"message": "Expired token, please refresh with /login endpoint"},
+        status=401,
+    )
+
+
+def authenticate_signed_token(
+    request: WSGIRequestHandler, auth_token: str, lazy_user: bool = True
+):
+    """
+    This function validates a stateless token without touching the database, by default the user is
+    loaded lazily only when the view reads `request.user`.
+
+    :param request: The request being authenticated
+    :param auth_token: The signed token sent on the HTTP_AUTHORIZATION header
+    :param lazy_user: False to load the user right away, async views can't query the database from
+    a lazy object
+    :return: None if the token is valid, otherwise the response to send back to the client.
+    """
+    claims = read_signed_token(auth_token)
+    if claims is None or claims.jti in revoked_tokens:
+        raise Unauthorized("Unauthorized")
+    if claims.expired:
+        return expired_token_response()
+    request.auth_claims = claims
+    if lazy_user:
+        request.user = LazyUser(claims.user_id)
+    else:
+        request.user = query_user(claims.user_id)
+    return None
+
+
+def authenticate_request(request: WSGIRequestHandler, lazy_user: bool = True):
+    """
+    This function checks if the token of a request is valid and not expired, setting the request user
+    when it is.
+
+    :param request: The request being authenticated
+    :param lazy_user: False to load the user right away instead of on first use
+    :return: None if the request is authenticated, otherwise the response to send back to the client.
+    If there is no token or it doesn't exist an Unauthorized exception is raised.
+    """
+    try:
+        # TODO Use token cookie instead of HTTP_AUTHORIZATION
+        auth_token = request.META["HTTP_AUTHORIZATION"].split()[1]
+        if settings.STATELESS_TOKENS and is_signed_token(auth_token):
+            return authenticate_signed_token(request, auth_token, lazy_user)
+        cached_token = get_cached_token(auth_token)
+        if cached_token:
+            # Known token, the user is only loaded if the view needs more than its id
+            user_id = cached_token[0]
+            if lazy_user:
+                request.user = LazyUser(user_id)
+            else:
+                request.user = query_user(user_id)
+            return None
+        token_obj = query_authenticated_token(auth_token)
+        if token_obj.expires_at >= datetime.now(timezone.utc):  # Check expiration date
+            cache_token(token_obj)
+            request.user = token_obj.user
+            return None
+        else:
+            return expired_token_response()
+    except (ObjectDoesNotExist, KeyError, IndexError):
+        raise Unauthorized("Unauthorized")
+
+
 def token_required(view_func):
     """
     This is a decorator function that checks if a token is valid and not expired before allowing access
@@ -19,21 +108,25 @@ def token_required(view_func):
     """
 
     def wrapper(request: WSGIRequestHandler, *args: dict, **kwargs: dict):
-        try:
-            # TODO Use token cookie instead of HTTP_AUTHORIZATION
-            auth_token = request.META["HTTP_AUTHORIZATION"].split()[1]
-            token_obj = Token.objects.get(key=auth_token, deleted=False)
-            if token_obj.expires_at >= datetime.now(
-                timezone.utc
-            ):  # Check expiration date
-                request.user = token_obj.user
-                return view_func(request, *args, **kwargs)
-            else:
-                return JsonResponse(
-                    {"message": "Expired token, please refresh with /login endpoint"},
-                    status=401,
-                )
-        except (ObjectDoesNotExist, KeyError):
-            raise Unauthorized("Unauthorized")
+        error_response = authenticate_request(request)
+        return error_response or view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_token_required(view_func):
+    """
+    This is the token_required decorator for async views, the token is checked in a worker thread so
+    the event loop is never blocked by the database.
+
+    :param view_func: The async view function that is being decorated
+    :return: A decorated coroutine function that authenticates the request before awaiting the view.
+    """
+
+    async def wrapper(request: WSGIRequestHandler, *args: dict, **kwargs: dict):
+        error_response = await sync_to_async(authenticate_request)(
+            request, lazy_user=False
+        )
+        return error_response or await view_func(request, *args, **kwargs)
 
     return wrapper
@@ -69,3 +69,31 @@ class OutOfMoney(BaseCustomException):
     user_message = (
         "The user doesn't have enough money in their account to perform the operation"
     )
+
+
+class ServiceUnavailable(BaseCustomException):
+    """
+    Should be thrown when a third party service the API depends on is failing or its circuit breaker
+    is open.
+    """
+
+    status_code = 503
+    user_message = "The service is not available right now. Please try again later."
+
+
+class BatchOperationError(BadRequest):
+    """
+    Should be thrown when an atomic batch of operations has invalid items, it carries the error of
+    each one of them.
+    """
+
+    user_message = (
+        "Some operations of the batch are invalid, none of them was processed"
+    )
+
+    def __init__(self, errors: list, developer_message: str = None):
+        super(BatchOperationError, self).__init__(developer_message)
+        self.errors = errors
+
+    def to_dict(self):
+        return {**super().to_dict(), "data": {"results": self.errors}}
@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+from calculator.utils.exceptions import ServiceUnavailable
+
+
+class CircuitBreaker:
+    """
+    The CircuitBreaker stops calling an upstream after `failure_threshold` consecutive failures.
+    Once `reset_timeout` seconds passed it lets a single trial call through (half open), closing
+    again if it succeeds or opening for another `reset_timeout` if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class OutboundClient:
+    """
+    The OutboundClient is the shared HTTP client used to call third party services. It keeps a pool
+    of keep-alive connections, applies strict connect/read timeouts, retries connection errors,
+    timeouts and 5xx responses with exponential backoff and full jitter, and fails fast with a
+    ServiceUnavailable exception while its circuit breaker is open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float = 2,
+        read_timeout: float = 5,
+        max_retries: int = 2,
+        backoff: float = 0.1,
+        pool_size: int = 10,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # requests is imported once a client is built, skipped by workers never calling an upstream
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "rejected": 0,
+            "latency_ms_total": 0.0,
+            "latency_ms_max": 0.0,
+        }
+
+    def _count(self, **increments):
+        with self._lock:
+            for counter, value in increments.items():
+                self._counters[counter] += value
+
+    def _track_latency(self, started_at: float):
+        latency = (time.perf_counter() - started_at) * 1000
+        with self._lock:
+            self._counters["latency_ms_total"] += latency
+            self._counters["latency_ms_max"] = max(
+                self._counters["latency_ms_max"], latency
+            )
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counters)
+        metrics["latency_ms_avg"] = (
+            metrics["latency_ms_total"] / metrics["requests"]
+            if metrics["requests"]
+            else 0.0
+        )
+        metrics["circuit"] = self.breaker.state
+        return metrics
+
+    def request(self, method: str, url: str, **kwargs):
+        """
+        This function sends a request to the upstream retrying the transient failures.
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the upstream endpoint
+        :return: The `requests.Response` of the first successful attempt, if every attempt fails or
+        the circuit is open a ServiceUnavailable exception is raised.
+        """
+        import requests
+
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count(rejected=1)
+                raise ServiceUnavailable(f"The {self.name} circuit is open")
+            if attempt:
+                self._count(retries=1)
+            started_at = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+            except requests.Timeout:
+                self._count(timeouts=1)
+            except requests.ConnectionError:
+                pass
+            finally:
+                self._count(requests=1)
+                self._track_latency(started_at)
+            self._count(errors=1)
+            self.breaker.record_failure()
+            if attempt < self.max_retries:
+                time.sleep(random.uniform(0, self.backoff * 2**attempt))
+        raise ServiceUnavailable(
+            f"The {self.name} service failed after {self.max_retries + 1} attempts"
+        )
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from calculator.utils.cache import bump_version, get_version
+
+OPERATION_CATALOG_VERSION_KEY = "calculator:operation_catalog_version"
+
+
+class OperationEntry:
+    """
+    Immutable in-memory copy of an `Operation` row with its required fields already parsed, it
+    exposes the same attributes the views read from the model.
+    """
+
+    __slots__ = ("id", "type", "cost", "fields", "required_fields")
+
+    def __init__(self, operation):
+        object.__setattr__(self, "id", operation.id)
+        object.__setattr__(self, "type", operation.type)
+        object.__setattr__(self, "cost", operation.cost)
+        object.__setattr__(self, "fields", MappingProxyType(dict(operation.fields)))
+        object.__setattr__(self, "required_fields", frozenset(operation.fields.keys()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "cost": self.cost,
+            "fields": dict(self.fields),
+        }
+
+
+class OperationCatalog:
+    """
+    The OperationCatalog loads every `Operation` once per worker and serves them from memory. Writes
+    to the operations drop the local copy right away and bump a shared version stamp once committed,
+    so the rest of the workers reload the catalog on their next read. They also reload it once it is
+    OPERATION_CATALOG_MAX_AGE seconds old, for the writes whose version bump doesn't reach them (a
+    cache that isn't shared).
+    """
+
+    # Minimum amount of seconds between reloads triggered by unknown operation ids
+    MISS_RELOAD_INTERVAL = 1
+
+    def __init__(self):
+        self._entries = None
+        self._version = None
+        self._digest = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from calculator.models import Operation
+
+        with self._lock:
+            self._version = get_version(OPERATION_CATALOG_VERSION_KEY)
+            # Read from the primary database, a lagging replica would be kept until the next version
+            self._entries = {
+                operation.id: OperationEntry(operation)
+                for operation in Operation.objects.using(DEFAULT_DB_ALIAS).order_by(
+                    "id"
+                )
+            }
+            # Same on every worker that loaded the same operations, unlike the version stamp
+            self._digest = hashlib.sha1(
+                repr([entry.to_dict() for entry in self._entries.values()]).encode()
+            ).hexdigest()
+            self._loaded_at = time.monotonic()
+        return self._entries
+
+    def _get_entries(self):
+        entries = self._entries
+        if (
+            entries is None
+            or get_version(OPERATION_CATALOG_VERSION_KEY) != self._version
+            or time.monotonic() - self._loaded_at >= settings.OPERATION_CATALOG_MAX_AGE
+        ):
+            entries = self._load()
+        return entries
+
+    @property
+    def version(self):
+        """
+        The digest of the loaded operations, it changes along with any of them so the ETags and the
+        cached responses built from the catalog never outlive a reload.
+        """
+        self._get_entries()
+        return self._digest
+
+    def all(self):
+        return list(self._get_entries().values())
+
+    def get(self, operation_id):
+        """
+        This function returns the catalog entry of an operation.
+
+        :param operation_id: The id of the operation, it could come as a string from the payload
+        :return: An `OperationEntry`, if the operation doesn't exist an `Operation.DoesNotExist` is
+        raised after giving the catalog a chance to reload, since the operation could have been
+        created by another worker.
+        """
+        from calculator.models import Operation
+
+        try:
+            operation_id = int(operation_id)
+        except (TypeError, ValueError):
+            raise Operation.DoesNotExist
+        entry = self._get_entries().get(operation_id)
+        if entry is None and (
+            time.monotonic() - self._loaded_at > self.MISS_RELOAD_INTERVAL
+        ):
+            entry = self._load().get(operation_id)
+        if entry is None:
+            raise Operation.DoesNotExist
+        return entry
+
+    def invalidate(self):
+        self._entries = None
+        transaction.on_commit(lambda: bump_version(OPERATION_CATALOG_VERSION_KEY))
+
+
+operation_catalog = OperationCatalog()
@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+from calculator.utils.search_index import RECORD_TABLE
+
+UNPARTITIONED_TABLE = f"{RECORD_TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{RECORD_TABLE}_default"
+
+
+def month_start(value: datetime):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month: datetime):
+    return f"{RECORD_TABLE}_{month:%Y_%m}"
+
+
+def fetch_all(schema_editor, sql: str, params=None):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def is_partitioned(schema_editor):
+    return bool(
+        fetch_all(
+            schema_editor,
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [RECORD_TABLE],
+        )
+    )
+
+
+def record_partitions(schema_editor):
+    return [
+        name
+        for (name,) in fetch_all(
+            schema_editor,
+            "SELECT inhrelid::regclass::text FROM pg_inherits "
+            "WHERE inhparent = %s::regclass ORDER BY 1",
+            [RECORD_TABLE],
+        )
+    ]
+
+
+def create_month_partition(schema_editor, month: datetime):
+    """
+    This function creates the partition of the records created during `month`. The rows of that
+    month that landed on the default partition meanwhile are moved to the new one, PostgreSQL
+    doesn't allow creating a partition overlapping rows of the default one.
+
+    :param month: The first instant of the month, in UTC
+    :return: True if the partition was created, False if it already existed.
+    """
+    name = partition_name(month)
+    if name in record_partitions(schema_editor):
+        return False
+    bounds = [month, add_months(month, 1)]
+    schema_editor.execute(
+        f"ALTER TABLE {RECORD_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {name} PARTITION OF {RECORD_TABLE} FOR VALUES FROM (%s) TO (%s)",
+        bounds,
+    )
+    schema_editor.execute(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+        f"INSERT INTO {RECORD_TABLE} SELECT * FROM moved",
+        bounds,
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {RECORD_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"
+    )
+    return True
+
+
+def partition_record_table(schema_editor):
+    """
+    This function turns the records table into a table partitioned by month of `created_at`, copying
+    its rows, indexes and foreign keys. The primary key becomes (id, created_at) since PostgreSQL
+    needs the partition key on every unique index, the ids keep coming from the same sequence. A
+    default partition keeps the rows of the months without partition.
+
+    The table is locked while the rows are copied, so it should be run on a maintenance window.
+    """
+    schema_editor.execute(f"LOCK TABLE {RECORD_TABLE} IN ACCESS EXCLUSIVE MODE")
+    # The deferred foreign key checks of the transaction would hold back dropping the old table
+    schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    indexes = fetch_all(
+        schema_editor,
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [RECORD_TABLE, f"{RECORD_TABLE}_pkey"],
+    )
+    foreign_keys = fetch_all(
+        schema_editor,
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [RECORD_TABLE],
+    )
+    ((sequence,),) = fetch_all(
+        schema_editor, "SELECT pg_get_serial_sequence(%s, 'id')", [RECORD_TABLE]
+    )
+
+    schema_editor.execute(f"ALTER TABLE {RECORD_TABLE} RENAME TO {UNPARTITIONED_TABLE}")
+    schema_editor.execute(
+        f"CREATE TABLE {RECORD_TABLE} (LIKE {UNPARTITIONED_TABLE} "
+        "INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (created_at)"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {RECORD_TABLE} DEFAULT"
+    )
+    ((oldest,),) = fetch_all(
+        schema_editor, f"SELECT MIN(created_at) FROM {UNPARTITIONED_TABLE}"
+    )
+    if oldest is not None:
+        month, current_month = month_start(oldest), month_start(
+            datetime.now(timezone.utc)
+        )
+        while month <= current_month:
+            create_month_partition(schema_editor, month)
+            month = add_months(month, 1)
+    schema_editor.execute(
+        f"INSERT INTO {RECORD_TABLE} SELECT * FROM {UNPARTITIONED_TABLE}"
+    )
+    schema_editor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {RECORD_TABLE}.id")
+    schema_editor.execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+
+    # The indexes are built once the rows are in place, every partition gets its own copy
+    schema_editor.execute(
+        f"ALTER TABLE {RECORD_TABLE} ADD CONSTRAINT {RECORD_TABLE}_pkey "
+        "PRIMARY KEY (id, created_at)"
+    )
+    for name, definition in foreign_keys:
+        schema_editor.execute(
+            f"ALTER TABLE {RECORD_TABLE} ADD CONSTRAINT {name} {definition}"
+        )
+    # The definitions were read before renaming the table, so they point to the partitioned one
+    for (definition,) in indexes:
+        schema_editor.execute(definition)
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.utils import timezone
+from calculator.utils.cache import LRUCache
+from calculator.utils.exceptions import BadRequest
+
+QUERY_PLAN_CACHE_SIZE = 1024
+
+# Lookups the in-memory lists can be filtered by
+entry_lookups = {
+    "exact": lambda x, y: x == y,
+    "gt": lambda x, y: x > y,
+    "gte": lambda x, y: x >= y,
+    "lt": lambda x, y: x < y,
+    "lte": lambda x, y: x <= y,
+}
+
+
+class QueryPlan:
+    """
+    Validated filters and ordering of a paginated request. Each filter keeps its value already
+    converted to the type of its column, and the ordering always ends with the id so every row has a
+    stable position.
+    """
+
+    __slots__ = ("filters", "ordering", "search")
+
+    def __init__(self, filters: list, ordering: list, search: str):
+        # (key, field path, lookup, value) tuples, like ("cost__gt", "cost", "gt", 0.3)
+        self.filters = tuple(filters)
+        self.ordering = tuple(ordering)
+        self.search = search
+
+    def apply(self, queryset):
+        for key, _, _, value in self.filters:
+            queryset = queryset.filter(**{key: value})
+        if self.ordering:
+            queryset = queryset.order_by(*self.ordering)
+        return queryset
+
+    def apply_to_entries(self, entries: list):
+        for _, field, lookup, value in self.filters:
+            compare = entry_lookups[lookup]
+            entries = [
+                entry for entry in entries if compare(getattr(entry, field), value)
+            ]
+        # Sort by the last key first so the first one ends up as the main key
+        for key in reversed(self.ordering):
+            entries = sorted(
+                entries,
+                key=lambda entry: getattr(entry, key.lstrip("-")),
+                reverse=key.startswith("-"),
+            )
+        return entries
+
+
+def resolve_field(model, key: str):
+    """
+    This function follows a filter or ordering key through the relations of a model.
+
+    :param model: The model being queried
+    :param key: A key like "amount__gt", "operation__type" or "user_id"
+    :return: A tuple with the field, its path (the key without the lookup) and the lookup ("exact"
+    when the key doesn't have one)
+    """
+    parts = key.split("__")
+    path = []
+    field = None
+    while parts:
+        try:
+            field = model._meta.get_field(parts[0])
+        except FieldDoesNotExist:
+            break
+        path.append(parts.pop(0))
+        if not field.is_relation or not parts:
+            break
+        model = field.related_model
+    if field is None or len(parts) > 1:
+        raise BadRequest(f"The key {key} is not valid")
+    return field, "__".join(path), parts[0] if parts else "exact"
+
+
+def coerce_value(field, value: str):
+    value = field.to_python(value)
+    if (
+        isinstance(field, models.DateTimeField)
+        and settings.USE_TZ
+        and timezone.is_naive(value)
+    ):
+        value = timezone.make_aware(value)
+    return value
+
+
+def compile_filters(model, allowed_filters, filter_param: str):
+    filters = []
+    for condition in filter_param.split(","):
+        if not condition:
+            continue
+        # Only the first colon splits the key, the values could be datetimes
+        key, separator, value = condition.partition(":")
+        if not separator:
+            raise BadRequest(f"The filter {condition} must look like key:value")
+        if key not in allowed_filters:
+            raise BadRequest(f"The filter {key} is not allowed")
+        field, path, lookup = resolve_field(model, key)
+        try:
+            filters.append((key, path, lookup, coerce_value(field, value)))
+        except ValidationError:
+            raise BadRequest(f"The value {value} is not valid for the filter {key}")
+    return filters
+
+
+def compile_ordering(model, allowed_order, order_param: str, default_ordering):
+    ordering = []
+    for key in order_param.split(","):
+        if not key or key in ordering:
+            continue
+        if key.lstrip("-") not in allowed_order:
+            raise BadRequest(f"The order {key} is not allowed")
+        if resolve_field(model, key.lstrip("-"))[2] != "exact":
+            raise BadRequest(f"The order {key} is not valid")
+        ordering.append(key)
+    ordering = ordering or list(default_ordering)
+    # The id breaks the ties in the direction of the last key, matching the indexes of the listings
+    if ordering and not any(key.lstrip("-") in ("id", "pk") for key in ordering):
+        ordering.append("-id" if ordering[-1].startswith("-") else "id")
+    return ordering
+
+
+query_plans = LRUCache(max_size=QUERY_PLAN_CACHE_SIZE)
+
+
+def compile_query_plan(
+    model,
+    allowed_filters,
+    filter_param: str = "",
+    order_param: str = "",
+    search: str = "",
+    default_ordering=(),
+):
+    """
+    This function turns the `filter`, `order` and `search` parameters of a paginated request into a
+    QueryPlan, kept on a LRU cache keyed by the raw strings so repeated requests skip the parsing.
+
+    :param model: The model being paginated
+    :param allowed_filters: The keys the view accepts to filter and order by
+    :param filter_param: Comma separated "key:value" conditions
+    :param order_param: Comma separated keys, with a leading "-" for descending order
+    :param search: The text to search
+    :param default_ordering: Ordering used when `order_param` is empty
+    :return: A QueryPlan, a BadRequest is raised when a key isn't allowed or a value doesn't match
+    the type of its column.
+    """
+    key = (
+        model._meta.label,
+        tuple(allowed_filters),
+        tuple(default_ordering),
+        filter_param,
+        order_param,
+        search,
+    )
+    plan = query_plans.get(key)
+    if plan is None:
+        plan = QueryPlan(
+            compile_filters(model, allowed_filters, filter_param),
+            compile_ordering(model, allowed_filters, order_param, default_ordering),
+            search,
+        )
+        query_plans.set(key, plan)
+    return plan
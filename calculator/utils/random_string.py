@@ -1,31 +1,194 @@
 import os
-import requests
+import secrets
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from calculator.utils.exceptions import ServiceUnavailable
+from calculator.utils.http_client import OutboundClient
+
+RANDOM_STRING_LENGTH = 10
+RANDOM_STRING_CHARACTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class RandomStringProvider:
+    """
+    Base class of the sources of random strings, `fetch` returns up to `n` strings of
+    RANDOM_STRING_LENGTH lowercase letters.
+    """
+
+    def fetch(self, n: int):
+        raise NotImplementedError
+
+
+random_org_client = None
+
+
+def get_random_org_client():
+    global random_org_client
+    if random_org_client is None:
+        random_org_client = OutboundClient(
+            "random.org",
+            connect_timeout=settings.RANDOM_ORG_CONNECT_TIMEOUT,
+            read_timeout=settings.RANDOM_ORG_READ_TIMEOUT,
+            max_retries=settings.RANDOM_ORG_MAX_RETRIES,
+            failure_threshold=settings.RANDOM_ORG_FAILURE_THRESHOLD,
+            reset_timeout=settings.RANDOM_ORG_RESET_TIMEOUT,
+        )
+    return random_org_client
+
+
+class RandomOrgProvider(RandomStringProvider):
+    def fetch(self, n: int):
+        """
+        The function generates random strings using an API call to random.org.
+        :return: a list of randomly generated strings of length 10, consisting of lowercase alphabets,
+        obtained from an API call using the shared outbound client. The API key and URL are obtained
+        from environment variables.
+        """
+        random_str_payload = {
+            "jsonrpc": "2.0",
+            "method": "generateStrings",
+            "params": {
+                "apiKey": os.environ.get("RANDOM_API_KEY"),
+                "n": n,
+                "length": RANDOM_STRING_LENGTH,
+                "characters": RANDOM_STRING_CHARACTERS,
+                "replacement": True,
+            },
+            "id": 42,
+        }
+        headers = {
+            "Content-Type": "application/json",
+        }
+        response = get_random_org_client().post(
+            os.environ.get("RANDOM_V4_API_URL"),
+            json=random_str_payload,
+            headers=headers,
+        )
+        data = response.json()
+        return data.get("result", {}).get("random", {}).get("data", [])
+
+
+class LocalRandomStringProvider(RandomStringProvider):
+    """
+    Offline stand-in of random.org, it optionally waits `latency` seconds per call to simulate the
+    round trip of the upstream API.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+
+    def fetch(self, n: int):
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            "".join(
+                secrets.choice(RANDOM_STRING_CHARACTERS)
+                for _ in range(RANDOM_STRING_LENGTH)
+            )
+            for _ in range(n)
+        ]
+
+
+random_string_providers = {
+    "random_org": RandomOrgProvider,
+    "local": LocalRandomStringProvider,
+}
+
+
+class RandomStringPool:
+    """
+    The RandomStringPool keeps in memory random strings fetched from a provider in batches of
+    `batch_size`, serving each request from memory. Once the pool goes below `low_water_mark` strings
+    it is refilled by a background thread, so requests only wait on the provider when the pool is empty.
+    """
+
+    def __init__(
+        self,
+        provider: RandomStringProvider,
+        batch_size: int = 200,
+        low_water_mark: int = 50,
+        background: bool = True,
+    ):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.low_water_mark = low_water_mark
+        self.background = background
+        self._strings = deque()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+
+    def refill(self):
+        with self._refill_lock:
+            # Another thread could have refilled the pool while this one was waiting
+            if len(self._strings) <= self.low_water_mark:
+                self._strings.extend(self.provider.fetch(self.batch_size))
+
+    def _background_refill(self):
+        try:
+            self.refill()
+        except ServiceUnavailable:
+            # The next request refills the pool again if it runs out of strings
+            pass
+        finally:
+            self._refilling = False
+
+    def schedule_refill(self):
+        if self._refilling:
+            return
+        self._refilling = True
+        threading.Thread(target=self._background_refill, daemon=True).start()
+
+    def get(self):
+        """
+        This function returns a random string from the pool, fetching a new batch first if it is empty.
+
+        :return: A random string or an empty string if the provider didn't return any
+        """
+        try:
+            value = self._strings.popleft()
+        except IndexError:
+            self.refill()
+            try:
+                value = self._strings.popleft()
+            except IndexError:
+                return ""
+        if self.background and len(self._strings) < self.low_water_mark:
+            self.schedule_refill()
+        return value
+
+    def __len__(self):
+        return len(self._strings)
+
+
+random_string_pool = None
+
+
+def get_random_string_provider():
+    provider = settings.RANDOM_STRING_PROVIDER
+    if provider in random_string_providers:
+        return random_string_providers[provider]()
+    # Any other value is the dotted path of a RandomStringProvider subclass
+    return import_string(provider)()
+
+
+def get_random_string_pool():
+    global random_string_pool
+    if random_string_pool is None:
+        random_string_pool = RandomStringPool(
+            get_random_string_provider(),
+            batch_size=settings.RANDOM_STRING_BATCH_SIZE,
+            low_water_mark=settings.RANDOM_STRING_LOW_WATER_MARK,
+            background=settings.RANDOM_STRING_BACKGROUND_REFILL,
+        )
+    return random_string_pool
 
 
 def perform_random_string_operation():
     """
-    The function generates a random string using an API call and returns the generated string.
-    :return: a randomly generated string of length 10, consisting of lowercase alphabets, obtained from
-    an API call using the `requests` library. The API key and URL are obtained from environment
-    variables.
-    """
-    random_str_payload = {
-        "jsonrpc": "2.0",
-        "method": "generateStrings",
-        "params": {
-            "apiKey": os.environ.get("RANDOM_API_KEY"),
-            "n": 1,
-            "length": 10,
-            "characters": "abcdefghijklmnopqrstuvwxyz",
-            "replacement": True,
-        },
-        "id": 42,
-    }
-    headers = {
-        "Content-Type": "application/json",
-    }
-    response = requests.post(
-        os.environ.get("RANDOM_V4_API_URL"), json=random_str_payload, headers=headers
-    )
-    data = response.json()
-    return data.get("result", {}).get("random", {}).get("data", [""])[0]
+    The function returns a random string of length 10, consisting of lowercase alphabets, served from
+    the pool of strings prefetched from the configured provider (random.org by default).
+    """
+    return get_random_string_pool().get()
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import transaction
+from calculator.utils.cache import LRUCache, bump_version, get_version
+
+RECORDS_GENERATION_KEY = "calculator:records_generation:%s"
+
+# Process-local map of (user id, generation, request parameters) -> page of the records listing. The
+# pages of a user are left behind as soon as their generation moves, and evicted later on.
+record_pages = LRUCache(
+    max_size=settings.RECORD_PAGE_CACHE_SIZE, ttl=settings.RECORD_PAGE_CACHE_TTL
+)
+
+
+def get_records_generation(user_id: int):
+    return get_version(RECORDS_GENERATION_KEY % user_id)
+
+
+def bump_records_generation(user_id: int):
+    """
+    This function moves the generation of the records of a user once the current transaction is
+    committed, so every worker stops serving the pages it cached for that user.
+    """
+    transaction.on_commit(lambda: bump_version(RECORDS_GENERATION_KEY % user_id))
+
+
+def get_record_page(user_id: int, body: dict, build):
+    """
+    This function returns a page of the records listing of a user from the cache, building it and
+    keeping it the first time it is requested on the current generation.
+
+    :param user_id: The id of the user owning the records
+    :param body: The request parameters, the page is cached for the same filter, order, search,
+    page, size, fields and cursor
+    :param build: Function returning the page when it isn't cached
+    :return: The page data as returned by `build`
+    """
+    if not settings.SHARED_CACHE:
+        # The generation bumped by a write on another worker would never be seen here
+        return build()
+    key = (user_id, get_records_generation(user_id), tuple(sorted(body.items())))
+    page = record_pages.get(key)
+    if page is None:
+        page = build()
+        record_pages.set(key, page)
+    return page
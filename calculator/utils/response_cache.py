@@ -0,0 +1,85 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from calculator.utils.cache import LRUCache
+
+
+class LocalResponseCache:
+    """
+    Keeps the serialized responses in the memory of the worker, each worker builds its own copy of a
+    response the first time it is requested.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = None):
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, content: bytes):
+        self._cache.set(key, content)
+
+
+class SharedResponseCache:
+    """
+    Keeps the serialized responses on a backend of Django's cache framework (memcached, redis...),
+    so a response built by one worker is served by the rest of them.
+    """
+
+    def __init__(self, alias: str = "default", ttl: float = None):
+        self.alias = alias
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(key):
+        # The keys carry the request parameters, hashing them keeps them valid for memcached
+        return "calculator:response:%s" % hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        return caches[self.alias].get(self.make_key(key))
+
+    def set(self, key, content: bytes):
+        caches[self.alias].set(self.make_key(key), content, timeout=self.ttl)
+
+
+def build_local_response_cache():
+    return LocalResponseCache(
+        max_size=settings.OPERATIONS_RESPONSE_CACHE_SIZE,
+        ttl=settings.OPERATIONS_RESPONSE_CACHE_TTL,
+    )
+
+
+def build_shared_response_cache():
+    return SharedResponseCache(
+        alias=settings.OPERATIONS_RESPONSE_CACHE_ALIAS,
+        ttl=settings.OPERATIONS_RESPONSE_CACHE_TTL,
+    )
+
+
+response_cache_backends = {
+    "local": build_local_response_cache,
+    "shared": build_shared_response_cache,
+}
+
+operations_response_cache = None
+
+
+def get_operations_response_cache():
+    """
+    This function returns the cache of the GET /api/operations responses, picked by the
+    OPERATIONS_RESPONSE_CACHE setting: "local", "shared", "none" or the dotted path of a class with
+    the `get(key)` and `set(key, content)` methods.
+
+    :return: The cache backend, or None when the responses aren't cached
+    """
+    global operations_response_cache
+    backend = settings.OPERATIONS_RESPONSE_CACHE
+    if backend == "none":
+        return None
+    if operations_response_cache is None:
+        if backend in response_cache_backends:
+            operations_response_cache = response_cache_backends[backend]()
+        else:
+            operations_response_cache = import_string(backend)()
+    return operations_response_cache
@@ -0,0 +1,67 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(data) -> bytes:
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def orjson_dumps(data) -> bytes:
+    # The datetimes are passed to DjangoJSONEncoder so they keep its format, orjson would write
+    # their microseconds instead of milliseconds
+    return orjson.dumps(
+        data,
+        default=DjangoJSONEncoder().default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+json_codecs = {
+    "json": json_dumps,
+    "orjson": orjson_dumps,
+}
+
+
+def get_json_codec():
+    """
+    This function returns the function used to serialize the API responses, picked by the JSON_CODEC
+    setting: "auto" (orjson when it is installed, json otherwise), "json", "orjson" or the dotted
+    path of a function taking the data and returning bytes.
+    """
+    codec = settings.JSON_CODEC
+    if codec == "auto":
+        codec = "orjson" if orjson is not None else "json"
+    if codec in json_codecs:
+        return json_codecs[codec]
+    return import_string(codec)
+
+
+def make_etag(*parts) -> str:
+    """
+    This function builds a strong ETag from the values a response depends on, like version stamps
+    and the request parameters.
+
+    :return: The quoted hex digest of the parts, ready for the ETag header
+    """
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class ApiResponse(HttpResponse):
+    """
+    JSON response built from the plain data returned by the views, the whole envelope (data,
+    pagination, success flag, balance...) is serialized a single time with the configured codec.
+    """
+
+    def __init__(self, data: dict, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        self.data = data
+        super().__init__(content=get_json_codec()(data), **kwargs)
@@ -0,0 +1,90 @@
+RECORD_TABLE = "calculator_record"
+SEARCH_TABLE = f"{RECORD_TABLE}_search"
+TRIGRAM_INDEX = "record_search_trgm_idx"
+
+
+def build_search_document(
+    operation_type: str,
+    username: str,
+    cost: float,
+    user_balance: float,
+    operation_response: str,
+):
+    """
+    This function joins the fields a record can be searched by into a single lowercase text, the
+    numbers are written with 2 decimals the same way PostgreSQL's ROUND(x::numeric, 2)::text does.
+    """
+    return " ".join(
+        [
+            operation_type,
+            username,
+            f"{cost:.2f}",
+            f"{user_balance:.2f}",
+            operation_response,
+        ]
+    ).lower()
+
+
+# SQLite keeps an external content FTS5 table in sync with the records through triggers
+SQLITE_SEARCH_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"search_document, content='{RECORD_TABLE}', content_rowid='id', "
+    "tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON {RECORD_TABLE} "
+    f"BEGIN INSERT INTO {SEARCH_TABLE}(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON {RECORD_TABLE} "
+    f"BEGIN INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update "
+    f"AFTER UPDATE OF search_document ON {RECORD_TABLE} "
+    f"BEGIN INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, search_document) "
+    "VALUES ('delete', old.id, old.search_document); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, search_document) "
+    "VALUES (new.id, new.search_document); END",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+# PostgreSQL answers the LIKE '%term%' lookups of the search documents with a trigram index
+POSTGRESQL_SEARCH_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {RECORD_TABLE} "
+    "USING gin (search_document gin_trgm_ops) WHERE NOT deleted",
+]
+
+
+def trigram_extension_available(connection):
+    # Some PostgreSQL builds don't ship the contrib extensions, the search works without the index
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = %s", ["pg_trgm"]
+        )
+        return cursor.fetchone() is not None
+
+
+def create_search_index(schema_editor):
+    """
+    This function creates the index used to search the records on the database of the schema editor.
+    It can be run again safely, SQLite drops the triggers whenever a migration rebuilds the records
+    table so the migrations changing it have to call it afterwards.
+    """
+    vendor = schema_editor.connection.vendor
+    statements = []
+    if vendor == "sqlite":
+        statements = SQLITE_SEARCH_INDEX
+    elif vendor == "postgresql" and trigram_extension_available(
+        schema_editor.connection
+    ):
+        statements = POSTGRESQL_SEARCH_INDEX
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
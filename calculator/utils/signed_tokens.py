@@ -0,0 +1,145 @@
+import base64
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from calculator.utils.cache import bump_version, get_version
+
+SIGNED_TOKEN_SALT = "calculator.utils.signed_tokens"
+REVOCATION_VERSION_KEY = "calculator:token_revocation_version"
+
+
+class SignedTokenClaims:
+    __slots__ = ("user_id", "expires_at", "jti")
+
+    def __init__(self, user_id: int, expires_at: int, jti: str):
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.jti = jti
+
+    @property
+    def expired(self):
+        return self.expires_at < time.time()
+
+
+def _sign(payload: str):
+    digest = salted_hmac(SIGNED_TOKEN_SALT, payload, algorithm="sha256").digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def is_signed_token(key: str):
+    return key.count(".") == 3
+
+
+def make_signed_token(user_id: int):
+    """
+    This function builds a stateless access token, `<user id>.<expiration>.<token id>.<signature>`,
+    signed with HMAC-SHA256 using the SECRET_KEY so it can be validated without the database.
+
+    :param user_id: The id of the user that owns the token
+    :return: A tuple with the token and its expiration datetime
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=settings.SIGNED_TOKEN_LIFETIME
+    )
+    payload = f"{user_id}.{int(expires_at.timestamp())}.{secrets.token_urlsafe(12)}"
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def read_signed_token(key: str):
+    """
+    This function checks the signature of a stateless token and returns its claims.
+
+    :param key: The token sent by the client
+    :return: A `SignedTokenClaims` instance or None when the token is malformed or was tampered.
+    """
+    try:
+        payload, signature = key.rsplit(".", 1)
+        user_id, expires_at, jti = payload.split(".")
+        if not constant_time_compare(_sign(payload), signature):
+            return None
+        return SignedTokenClaims(int(user_id), int(expires_at), jti)
+    except ValueError:
+        return None
+
+
+class RevocationSet:
+    """
+    The RevocationSet keeps in memory the ids of the stateless tokens revoked before their
+    expiration, pruning them once they expire. It is rebuilt from the deleted `Token` rows the first
+    time it is used by a worker and then refreshed incrementally whenever another worker revokes a
+    token, or at least every SIGNED_TOKEN_REVOCATION_MAX_AGE seconds in case that worker's version
+    bump didn't reach this one (a cache that isn't shared).
+    """
+
+    # Rows created a bit before the last refresh are read again to cover clock skew between nodes
+    REFRESH_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self):
+        self._revoked = {}
+        self._version = None
+        self._loaded_at = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from calculator.models import Token
+
+        started_at = datetime.now(timezone.utc)
+        tokens = Token.objects.filter(deleted=True, expires_at__gt=started_at)
+        if self._loaded_at:
+            tokens = tokens.filter(
+                created_at__gte=self._loaded_at - self.REFRESH_OVERLAP
+            )
+        for key, expires_at in tokens.values_list("key", "expires_at"):
+            self._revoked[key] = expires_at.timestamp()
+        self._loaded_at = started_at
+
+        # Forget the revocations that expired, those tokens are rejected anyway
+        current_time = time.time()
+        self._revoked = {
+            jti: expires_at
+            for jti, expires_at in self._revoked.items()
+            if expires_at >= current_time
+        }
+
+    def is_stale(self):
+        return (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at
+            >= settings.SIGNED_TOKEN_REVOCATION_MAX_AGE
+        )
+
+    def refresh(self):
+        version = get_version(REVOCATION_VERSION_KEY)
+        if version != self._version or self.is_stale():
+            with self._lock:
+                self._load()
+                self._version = version
+                self._refreshed_at = time.monotonic()
+
+    def __contains__(self, jti: str):
+        self.refresh()
+        return jti in self._revoked
+
+    def revoke(self, claims: SignedTokenClaims):
+        """
+        This function stores the revocation of a token on the `Token` table so it survives restarts
+        and let the rest of the workers know they have to refresh their revocation sets.
+
+        :param claims: The claims of the token being revoked
+        """
+        from calculator.models import Token
+
+        expires_at = datetime.fromtimestamp(claims.expires_at, timezone.utc)
+        Token.objects.create(
+            user_id=claims.user_id, key=claims.jti, expires_at=expires_at, deleted=True
+        )
+        self._revoked[claims.jti] = claims.expires_at
+        bump_version(REVOCATION_VERSION_KEY)
+
+
+revoked_tokens = RevocationSet()
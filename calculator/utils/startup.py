@@ -0,0 +1,89 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# What a worker runs before serving its first request: the apps and the URLconf with every view
+STARTUP_CODE = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Modules only some requests need, importing them at startup slows down every new worker
+LAZY_MODULES = [
+    "requests",
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+]
+
+
+def warm_up():
+    """
+    This function connects to every database and loads the operation catalog, so the first request
+    of a new worker doesn't load the catalog and a database that can't be reached is logged right
+    away. The connections are closed afterwards, the requests run on other threads that never reuse
+    them: only a pooled connection, given back to its pool, saves the first request the connection
+    setup.
+    """
+    from django.db import DatabaseError, connections
+    from calculator.utils.operation_catalog import operation_catalog
+
+    try:
+        operation_catalog.all()
+        for alias in connections:
+            connection = connections[alias]
+            connection.ensure_connection()
+            # Except within a transaction (tests), which owns the connection
+            if not connection.in_atomic_block:
+                connection.close()
+    except DatabaseError as error:
+        logger.warning("The worker warm-up failed: %s", error)
+
+
+def measure_imports(code: str = STARTUP_CODE):
+    """
+    This function runs `code` on a new interpreter with `-X importtime`, without the warm-up so the
+    database isn't involved.
+
+    :param code: The Python code to measure, by default the startup of a worker
+    :return: A tuple with the wall time in milliseconds, a dict with the self and cumulative import
+    time (microseconds) of the modules reported by `-X importtime` and the set of modules loaded
+    once `code` ran. The latter is the one to check, `-X importtime` misses some of the modules
+    Django loads through `import_module`.
+    """
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE,
+        "WARM_UP": "false",
+        # Same modules as this process, whatever directory it was started from
+        "PYTHONPATH": os.pathsep.join(path for path in sys.path if path),
+    }
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"{code}\nimport sys; print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    wall_ms = (time.perf_counter() - started_at) * 1000
+    if result.returncode:
+        raise RuntimeError(result.stderr[-2000:])
+    imports = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        imports[module.strip()] = (int(self_us), int(cumulative_us))
+    return wall_ms, imports, set(result.stdout.split())
@@ -0,0 +1,52 @@
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from calculator.utils.cache import VersionedLRUCache
+
+TOKEN_CACHE_VERSION_KEY = "calculator:token_cache_version"
+
+# Process-local map of token key -> (user id, expires_at) used by token_required to skip the token
+# lookup. Invalidations reach the other workers through the shared version stamp, so it's only used
+# with a SHARED_CACHE.
+token_cache = VersionedLRUCache(
+    TOKEN_CACHE_VERSION_KEY,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL,
+)
+
+
+def get_cached_token(key: str):
+    """
+    This function returns the cached (user id, expires_at) tuple of a token key while it is valid.
+
+    :param key: The token key sent by the client on the HTTP_AUTHORIZATION header
+    :return: A tuple with the user id and the expiration datetime of the token or None if the token
+    is not cached (or the shared version changed and the cache was dropped).
+    """
+    if not settings.SHARED_CACHE:
+        # A logout on another worker wouldn't reach this one
+        return None
+    token_cache.check_version()
+    return token_cache.get(key)
+
+
+def cache_token(token):
+    """
+    This function keeps a token in memory for TOKEN_CACHE_TTL seconds at most, capping that time at
+    the token expiration date so an expired token is always checked against the database.
+
+    :param token: A `Token` instance that is not deleted
+    """
+    if not settings.SHARED_CACHE:
+        return
+    remaining = (token.expires_at - datetime.now(timezone.utc)).total_seconds()
+    if remaining > 0:
+        token_cache.set(
+            token.key,
+            (token.user_id, token.expires_at),
+            ttl=min(settings.TOKEN_CACHE_TTL, remaining),
+        )
+
+
+def invalidate_token(key: str):
+    token_cache.invalidate(key)
@@ -1,21 +1,37 @@
+import hmac
 import math
 from typing import Any
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.views import View
 from wsgiref.simple_server import WSGIRequestHandler
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.forms.models import model_to_dict
 from calculator import OperationType
-from calculator.utils.exceptions import BadRequest
+from calculator.utils.exceptions import BadRequest, NotFound, Unauthorized
 import json
 from django.utils.decorators import method_decorator
-from calculator.utils.decorators import token_required
+from calculator.utils.decorators import async_token_required, token_required
 from calculator.model_queries import (
-    query_filter_to_paginated_api_view,
-    query_order_to_paginated_api_view,
+    query_ordering_keys,
     query_search_by_related_conditions,
+    query_search_document,
+    query_seek_to_paginated_api_view,
+    reverse_ordering_keys,
 )
-from calculator.utils.random_string import perform_random_string_operation
+from calculator.utils.db_pool import connection_pools_metrics
+from calculator.utils.db_router import get_replica, stick_to_primary, use_database
+from calculator.utils.cursor import PREVIOUS_PAGE, decode_cursor, encode_cursor
+from calculator.utils.query_plans import compile_query_plan
+from calculator.utils.random_string import (
+    get_random_org_client,
+    perform_random_string_operation,
+)
+from calculator.utils.responses import ApiResponse
 from calculator.utils.utils import add_success_response, check_keys_on_dict
 
 
@@ -34,9 +50,14 @@ operation_functions = {
 class BaseAuthView(View):
     required_fields = []
     model = None
+    # Views whose GET requests can be answered by a read replica
+    read_from_replica = False
 
     @staticmethod
     def add_success(response, key="success", status=True):
+        # The views return plain data, so the envelope is serialized only once here
+        if isinstance(response, dict):
+            return ApiResponse({**response, key: status})
         return add_success_response(response, key, status)
 
     def validate_payload(self, payload: dict):
@@ -49,6 +70,7 @@ class BaseAuthView(View):
         body = json.loads(body_unicode)
         if len(self.required_fields) > 0:
             self.validate_payload(body)
+        stick_to_primary(request.user.id)
         response = self.process_request(request, body)
         return self.add_success(response)
 
@@ -56,43 +78,129 @@ class BaseAuthView(View):
         body = request.GET.dict()
         if len(self.required_fields) > 0:
             self.validate_payload(body)
-        response = self.process_request(request, body)
-        return self.add_success(response)
+        with use_database(self.get_read_database(request)):
+            etag, last_modified = self.get_validators(request, body)
+            response = self.not_modified(request, etag, last_modified)
+            if response is None:
+                response = self.get_response(request, body)
+        return self.add_validators(response, etag, last_modified)
 
     def delete(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
         body = request.GET.dict()
         if len(self.required_fields) > 0:
             self.validate_payload(body)
-        record = self.model.objects.get(id=body.get("id"))
-        record.deleted = True
-        record.save()
-        response = JsonResponse(
-            {
-                "developer_message": f"The {self.model.__class__.__name__} was deleted",
-                "data": {"result": model_to_dict(record)},
-            }
-        )
+        stick_to_primary(request.user.id)
+        response = self.delete_record(request, body)
         return self.add_success(response)
 
+    def delete_record(self, request: WSGIRequestHandler, body: dict):
+        queryset = self.model.objects.all()
+        # Check if model belongs to the users and then only let them delete their own rows
+        if hasattr(self.model, "user"):
+            queryset = queryset.filter(user_id=request.user.id)
+        try:
+            record = queryset.get(id=body.get("id"))
+        except (self.model.DoesNotExist, ValueError):
+            raise NotFound(f"The {self.model.__name__} doesn't exist")
+        # Check if model keeps counters of the deleted rows and then let it update them
+        if hasattr(record, "soft_delete"):
+            record.soft_delete()
+        else:
+            record.deleted = True
+            record.save()
+        return {
+            "developer_message": f"The {self.model.__class__.__name__} was deleted",
+            "data": {"result": model_to_dict(record)},
+        }
+
+    def get_read_database(self, request: WSGIRequestHandler):
+        # The user was authenticated against the primary database, only the rest of the reads move
+        if not self.read_from_replica:
+            return None
+        return get_replica(request.user.id)
+
+    def get_validators(self, request: WSGIRequestHandler, body: dict):
+        """
+        Views able to tell cheaply if their response changed return here its ETag and the timestamp of
+        its last modification, so the polls of unchanged data are answered with a 304 before running
+        the queries of the page. None means the response is always built.
+        """
+        return None, None
+
+    @staticmethod
+    def not_modified(request: WSGIRequestHandler, etag, last_modified):
+        if etag is None and last_modified is None:
+            return None
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+
+    @staticmethod
+    def add_validators(response, etag, last_modified):
+        if etag is None and last_modified is None:
+            return response
+        if etag is not None:
+            response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # The data belongs to the user of the token, the clients have to revalidate it every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_response_cache(self):
+        """
+        Views whose GET responses are the same for every user return here the cache keeping their
+        serialized bytes, so the hits skip the queries and the JSON encoding. None means the responses
+        are always built.
+        """
+        return None
+
+    def get_response_cache_key(self, body: dict):
+        raise NotImplemented
+
+    def get_response(self, request: WSGIRequestHandler, body: dict):
+        response_cache = self.get_response_cache()
+        if response_cache is None:
+            return self.add_success(self.process_request(request, body))
+        key = self.get_response_cache_key(body)
+        content = response_cache.get(key)
+        if content is not None:
+            return HttpResponse(content, content_type="application/json")
+        response = self.add_success(self.process_request(request, body))
+        response_cache.set(key, response.content)
+        return response
+
     def process_request(self, request: WSGIRequestHandler, body: dict):
         raise NotImplemented
 
 
 class PaginatedView(BaseAuthView):
+    read_from_replica = True
     allowed_order_filters = []
     search_fields = []
+    # Fields the client can ask for through the `fields` parameter
+    allowed_fields = []
     model = None
 
     def base_query(self, request):
         # Get all objects from the model
         return self.model.objects.all()
 
-    def process_request(self, request, body):
-        # Get query parameters for filtering and ordering
-        filter_param = body.get("filter", "")
-        order_param = body.get("order", "")
-        search = body.get("search", "")
-        ordering_conditions = []
+    def get_query_plan(self, body):
+        # Check if model has created_at field and then use it to order by default to keep consistency data
+        default_ordering = ["-created_at"] if hasattr(self.model, "created_at") else []
+        return compile_query_plan(
+            self.model,
+            self.allowed_order_filters,
+            body.get("filter", ""),
+            body.get("order", ""),
+            body.get("search", ""),
+            default_ordering,
+        )
+
+    def get_queryset(self, request, body):
+        # The filters and the ordering come validated and typed from the compiled plan
+        plan = self.get_query_plan(body)
 
         queryset = self.base_query(request)
 
@@ -101,39 +209,186 @@ class PaginatedView(BaseAuthView):
             queryset = queryset.filter(deleted=0)
 
         # Apply filtering by search fields
-        if search and len(self.search_fields) > 0:
-            queryset = query_search_by_related_conditions(
-                queryset, self.search_fields, search
-            )
+        if plan.search and len(self.search_fields) > 0:
+            # Check if model has an indexed search document and then use it instead of the related fields
+            if hasattr(self.model, "search_document"):
+                queryset = query_search_document(queryset, plan.search)
+            else:
+                queryset = query_search_by_related_conditions(
+                    queryset, self.search_fields, plan.search
+                )
+
+        return plan.apply(queryset)
 
-        # Apply filtering if filter_param is provided
-        if filter_param:
-            # Split the filters into individual filter conditions
-            filter_conditions = filter_param.split(",")
-            queryset = query_filter_to_paginated_api_view(
-                self.allowed_order_filters, filter_conditions, queryset
+    def get_default_fields(self):
+        # Empty means every column of the model
+        return []
+
+    def get_fields(self, body: dict):
+        """
+        This function reads the sparse fieldset requested through the `fields` parameter.
+
+        :param body: The request parameters, `fields` is a comma separated list of the allowed fields
+        :return: The list of fields to select, without duplicates and in the requested order, or the
+        default fields of the view when `fields` is not provided. A BadRequest is raised when any of them
+        isn't allowed.
+        """
+        fields_param = body.get("fields", "")
+        if not fields_param:
+            return self.get_default_fields()
+        fields = list(
+            dict.fromkeys(
+                field.strip() for field in fields_param.split(",") if field.strip()
             )
+        )
+        not_allowed = [field for field in fields if field not in self.allowed_fields]
+        if not fields or not_allowed:
+            raise BadRequest(f"The fields {', '.join(not_allowed)} are not allowed")
+        return fields
+
+    def serialize_page(self, object_list, fields: list):
+        return list(object_list.values(*fields))
+
+    @staticmethod
+    def get_page_size(body: dict):
+        try:
+            size = int(body.get("size", 10))
+        except (TypeError, ValueError):
+            raise BadRequest("The size must be a number")
+        if size < 1:
+            raise BadRequest("The size must be greater than zero")
+        return size
+
+    @staticmethod
+    def ordering_fields(ordering: list):
+        return ["id" if key.lstrip("-") == "pk" else key.lstrip("-") for key in ordering]
+
+    @classmethod
+    def cursor_values(cls, queryset, ordering: list, row: dict):
+        fields = cls.ordering_fields(ordering)
+        if all(field in row for field in fields):
+            return [row[field] for field in fields]
+        # Ordering by a related field, which the serialized row doesn't have
+        return list(
+            queryset.model.objects.filter(pk=row["id"]).values_list(*fields).get()
+        )
 
-        # Apply ordering if order_param is provided
-        if order_param:
-            # Split the ordering into individual ordering conditions
-            ordering_conditions = order_param.split(",")
-        elif hasattr(self.model, "created_at"):
-            # Check if model has created_at field and then use it to order by default to keep consistency data
-            ordering_conditions = ["-created_at"]
-
-        if len(ordering_conditions) > 0:
-            queryset = query_order_to_paginated_api_view(
-                self.allowed_order_filters, ordering_conditions, queryset
+    def process_cursor_request(self, queryset, body: dict):
+        """
+        This function paginates a queryset using keyset (cursor) pagination, each page seeks from the
+        ordering keys of the last row of the previous one instead of using OFFSET, and the COUNT is only
+        run when the client asks for the `total_pages`.
+
+        :param queryset: The filtered and ordered queryset of the view
+        :param body: The request parameters, `cursor` is empty for the first page or one of the
+        `next_cursor`/`prev_cursor` values of a previous response, `total` is "true" to get the
+        `total_pages` too
+        :return: the response data with the page, the `next_cursor` and `prev_cursor` (null when there
+        are no more rows on that direction) and the request parameters.
+        """
+        size = self.get_page_size(body)
+        fields = self.get_fields(body)
+        ordering = query_ordering_keys(queryset)
+        cursor = body.get("cursor")
+        backwards = False
+        page_queryset = queryset.order_by(*ordering)
+        if cursor:
+            cursor_ordering, values, direction = decode_cursor(cursor)
+            if cursor_ordering != ordering:
+                raise BadRequest("The cursor doesn't match the ordering requested")
+            backwards = direction == PREVIOUS_PAGE
+            seek_ordering = reverse_ordering_keys(ordering) if backwards else ordering
+            page_queryset = query_seek_to_paginated_api_view(
+                queryset.order_by(*seek_ordering), seek_ordering, values
             )
 
+        # The ordering keys are selected too so the cursors can be built from the rows
+        key_fields = [
+            field
+            for field in self.ordering_fields(ordering)
+            if fields and field not in fields
+        ]
+
+        # One extra row tells if there is another page without counting them
+        data = self.serialize_page(page_queryset[: size + 1], fields + key_fields)
+        has_more = len(data) > size
+        data = data[:size]
+        if backwards:
+            data.reverse()
+
+        next_cursor = prev_cursor = None
+        if data:
+            if has_more or backwards:
+                next_cursor = encode_cursor(
+                    ordering, self.cursor_values(queryset, ordering, data[-1])
+                )
+            if (has_more and backwards) or (cursor and not backwards):
+                prev_cursor = encode_cursor(
+                    ordering,
+                    self.cursor_values(queryset, ordering, data[0]),
+                    PREVIOUS_PAGE,
+                )
+        if key_fields:
+            data = [{field: row[field] for field in fields} for row in data]
+
+        pagination_data = {
+            "size": size,
+            **body,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        }
+        if str(body.get("total", "")).lower() == "true":
+            pagination_data["total_pages"] = math.ceil(queryset.count() / size)
+        return {"data": data, **pagination_data}
+
+    def count_objects(self, request, body):
+        """
+        Views keeping counters of their rows return here how many the request matches, so the total
+        pages are known without a COUNT. None means they have to be counted.
+        """
+        return None
+
+    def process_has_next_request(self, queryset, body: dict):
+        # One extra row tells if there is a next page without counting them
+        size = self.get_page_size(body)
+        try:
+            page_number = max(int(body.get("page", 1)), 1)
+        except (TypeError, ValueError):
+            page_number = 1
+        offset = (page_number - 1) * size
+        data = self.serialize_page(
+            queryset[offset : offset + size + 1], self.get_fields(body)
+        )
+        pagination_data = {
+            "page": 1,
+            "size": 10,
+            **body,
+            "has_next": len(data) > size,
+        }
+        return {"data": data[:size], **pagination_data}
+
+    def process_request(self, request, body):
+        queryset = self.get_queryset(request, body)
+
+        # Opt-in keyset pagination, the in-memory lists keep the page number one
+        if "cursor" in body and isinstance(queryset, QuerySet):
+            return self.process_cursor_request(queryset, body)
+
+        # Opt-in pagination without total pages
+        if str(body.get("count", "")).lower() == "false":
+            return self.process_has_next_request(queryset, body)
+
         # Pagination
         page_number = body.get("page", 1)
         size = body.get("size", 10)
+        fields = self.get_fields(body)
         paginator = Paginator(queryset, size)
+        count = self.count_objects(request, body)
+        if count is not None:
+            paginator.count = count
         try:
             page_obj = paginator.page(page_number)
-            data = list(page_obj.object_list.values())
+            data = self.serialize_page(page_obj.object_list, fields)
         except Exception:
             # Handle invalid page number gracefully
             data = []
@@ -144,10 +399,109 @@ class PaginatedView(BaseAuthView):
             "size": 10,
             **body,
         }
-        return JsonResponse({"data": data, **pagination_data})
+        return {"data": data, **pagination_data}
+
+
+# Async counterpart of BaseAuthView for ASGI deployments, the request processing runs on worker
+# threads through sync_to_async so a single worker can hold many in-flight requests.
+@method_decorator(async_token_required, name="dispatch")
+class AsyncBaseAuthView(BaseAuthView):
+    @classmethod
+    def as_view(cls, **initkwargs: Any):
+        view = super().as_view(**initkwargs)
+        # Django 3.2 doesn't detect async class-based views, flag the view so its handler awaits it
+        return markcoroutinefunction(view)
+
+    def dispatch(self, request: WSGIRequestHandler, *args: Any, **kwargs: Any):
+        # Skip the sync token_required of BaseAuthView, the async one is applied instead
+        return View.dispatch(self, request, *args, **kwargs)
+
+    @staticmethod
+    async def as_coroutine(response: HttpResponse):
+        return response
+
+    # The View handlers for the methods not implemented are sync, their responses are returned through
+    # a coroutine so the view can await them as Django 4.1 does.
+    def http_method_not_allowed(
+        self, request: WSGIRequestHandler, *args: Any, **kwargs: Any
+    ):
+        response = super().http_method_not_allowed(request, *args, **kwargs)
+        return self.as_coroutine(response)
+
+    def options(self, request: WSGIRequestHandler, *args: Any, **kwargs: Any):
+        return self.as_coroutine(super().options(request, *args, **kwargs))
+
+    async def post(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
+        body_unicode = request.body.decode("utf-8")
+        body = json.loads(body_unicode)
+        if len(self.required_fields) > 0:
+            self.validate_payload(body)
+        await sync_to_async(stick_to_primary)(request.user.id)
+        response = await self.aprocess_request(request, body)
+        return self.add_success(response)
+
+    async def get(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
+        body = request.GET.dict()
+        if len(self.required_fields) > 0:
+            self.validate_payload(body)
+        alias = await sync_to_async(self.get_read_database)(request)
+        # sync_to_async copies the context, so the database is seen by the worker threads too
+        with use_database(alias):
+            etag, last_modified = await sync_to_async(self.get_validators)(
+                request, body
+            )
+            response = self.not_modified(request, etag, last_modified)
+            if response is None:
+                response = await self.aget_response(request, body)
+        return self.add_validators(response, etag, last_modified)
+
+    async def delete(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
+        body = request.GET.dict()
+        if len(self.required_fields) > 0:
+            self.validate_payload(body)
+        await sync_to_async(stick_to_primary)(request.user.id)
+        response = await sync_to_async(self.delete_record)(request, body)
+        return self.add_success(response)
+
+    async def aprocess_request(self, request: WSGIRequestHandler, body: dict):
+        return await sync_to_async(self.process_request)(request, body)
+
+    async def aget_response(self, request: WSGIRequestHandler, body: dict):
+        if self.get_response_cache() is None:
+            return self.add_success(await self.aprocess_request(request, body))
+        # The shared cache backends do blocking I/O as well
+        return await sync_to_async(self.get_response)(request, body)
+
+
+class AsyncPaginatedView(AsyncBaseAuthView, PaginatedView):
+    pass
 
 
 class ApiStatusView(View):
     def get(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
         data = {"status": "OK"}
         return JsonResponse(data)
+
+
+class MetricsView(View):
+    """
+    The MetricsView class serves the internals of the worker to the monitoring, which authenticates
+    with the METRICS_TOKEN instead of a user token.
+    """
+
+    def check_metrics_token(self, request: WSGIRequestHandler):
+        if not settings.METRICS_TOKEN:
+            raise NotFound
+        scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        if scheme != "Bearer" or not hmac.compare_digest(
+            token.encode(), settings.METRICS_TOKEN.encode()
+        ):
+            raise Unauthorized
+
+    def get(self, request: WSGIRequestHandler, **kwargs: Any) -> JsonResponse:
+        self.check_metrics_token(request)
+        data = {
+            "outbound": {"random_org": get_random_org_client().metrics()},
+            "database": {"pools": connection_pools_metrics()},
+        }
+        return JsonResponse(data)
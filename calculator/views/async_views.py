@@ -0,0 +1,51 @@
+from wsgiref.simple_server import WSGIRequestHandler
+from asgiref.sync import sync_to_async
+from calculator.views import AsyncBaseAuthView, AsyncPaginatedView, operation_functions
+from calculator.views.operation_views import (
+    DeleteRecord,
+    DeleteRecords,
+    GetOperations,
+    GetRecordsSummary,
+    GetUserRecords,
+    NewOperationView,
+)
+from calculator.views.user_views import UserView
+
+
+# Async version of NewOperationView, the operation itself runs outside the thread used for the
+# database so requests waiting on random.org don't hold back the rest of them.
+class AsyncNewOperationView(AsyncBaseAuthView, NewOperationView):
+    async def aprocess_request(self, request: WSGIRequestHandler, body: dict):
+        operation, variables = await sync_to_async(self.get_operation)(request, body)
+        result = await sync_to_async(
+            operation_functions[operation.type], thread_sensitive=False
+        )(**variables)
+        return await sync_to_async(self.charge_operation)(
+            request, operation, variables, result
+        )
+
+
+class AsyncGetOperations(AsyncPaginatedView, GetOperations):
+    pass
+
+
+class AsyncGetUserRecords(AsyncPaginatedView, GetUserRecords):
+    pass
+
+
+class AsyncGetRecordsSummary(AsyncBaseAuthView, GetRecordsSummary):
+    pass
+
+
+class AsyncDeleteRecord(AsyncBaseAuthView, DeleteRecord):
+    pass
+
+
+class AsyncDeleteRecords(AsyncBaseAuthView, DeleteRecords):
+    pass
+
+
+class AsyncUserView(AsyncBaseAuthView, UserView):
+    async def aprocess_request(self, request: WSGIRequestHandler, body: dict):
+        # The user was already loaded by async_token_required
+        return self.process_request(request, body)
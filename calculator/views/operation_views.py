@@ -1,11 +1,37 @@
 from wsgiref.simple_server import WSGIRequestHandler
-from django.http import JsonResponse
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 import json
 from django.core.exceptions import ObjectDoesNotExist
-from calculator import BASE_USER_BALANCE
-from calculator.utils.exceptions import BadRequest, NotFound, OutOfMoney
-from calculator.models import Operation, Record, User
-from calculator.utils.utils import add_success_response, check_keys_on_dict
+from calculator import (
+    BASE_USER_BALANCE,
+    EXPORT_CHUNK_SIZE,
+    MAX_BATCH_OPERATIONS,
+    MAX_BULK_DELETE_IDS,
+    BatchMode,
+    ExportFormat,
+)
+from calculator.utils.exceptions import (
+    BadRequest,
+    BaseCustomException,
+    BatchOperationError,
+    NotFound,
+    OutOfMoney,
+)
+from calculator.models import Operation, Record, RecordCounter, RecordRollup, User
+from calculator.model_queries import (
+    query_charge_operation,
+    query_charge_operations,
+    query_records_changed,
+    query_soft_delete_records,
+)
+from calculator.utils.operation_catalog import OperationEntry, operation_catalog
+from calculator.utils.query_plans import compile_query_plan
+from calculator.utils.record_cache import get_record_page
+from calculator.utils.response_cache import get_operations_response_cache
+from calculator.utils.responses import make_etag
+from calculator.utils.utils import check_keys_on_dict
 from calculator.views import BaseAuthView, PaginatedView
 from calculator.views import operation_functions
 
@@ -25,10 +51,10 @@ class NewOperationView(BaseAuthView):
         type and raises an exception if not.
 
         :param variables: A dictionary containing the variables needed to process a specific operation
-        :param operation_type: The type of operation being performed. It is used to determine which
-        fields are required in the "variables" parameter
+        :param operation: The catalog entry of the operation being performed. It is used to determine
+        which fields are required in the "variables" parameter
         """
-        required_keys = operation.fields.keys()
+        required_keys = operation.required_fields
         if check_keys_on_dict(required_keys, variables):
             raise BadRequest(
                 f"Variables field doesn't have the required fields to proccess the operation {operation.type}"
@@ -52,6 +78,8 @@ class NewOperationView(BaseAuthView):
         method. If the conversion fails, an empty dictionary is returned. If `variables` is `None` or an
         empty string, an empty dictionary is returned.
         """
+        if isinstance(variables, dict):
+            return variables
         try:
             variables = variables if variables else "{}"
             variables = json.loads(variables)
@@ -62,16 +90,16 @@ class NewOperationView(BaseAuthView):
         return variables
 
     @staticmethod
-    def check_balance(user: User, operation: Operation):
+    def check_balance(user: User, operation: OperationEntry):
         """
         This function checks the balance of a user after a given operation.
 
         :param user: The user object represents the user for whom we want to check the balance
         :type user: User
-        :param operation: The `operation` parameter is an instance of the `Operation` model class, which
+        :param operation: The `operation` parameter is the catalog entry of the `Operation`, which
         represents a transaction or operation that a user can perform in the system. It has a `cost`
         attribute that represents the amount of money that the operation costs
-        :type operation: Operation
+        :type operation: OperationEntry
         :return: The `check_balance` method returns a tuple containing the user's current balance
         (either the last recorded balance or the base user balance if there are no records) and the new
         balance after deducting the cost of the operation.
@@ -79,6 +107,61 @@ class NewOperationView(BaseAuthView):
         new_user_balance = user.balance - operation.cost
         return user.balance, new_user_balance
 
+    def get_operation(self, request: WSGIRequestHandler, body: dict):
+        """
+        This function finds the operation requested and checks the user can pay it and the variables
+        are the ones it needs, without performing it.
+
+        :param request: The request of the user performing the operation
+        :type request: WSGIRequestHandler
+        :param body: The request body with the `operation_id` and `variables` keys
+        :return: A tuple with the catalog entry of the operation and the variables dictionary
+        """
+        variables = self.get_variables(body["variables"])
+        try:
+            operation = operation_catalog.get(body["operation_id"])
+        except ObjectDoesNotExist:
+            raise NotFound
+        user_balance, new_user_balance = self.check_balance(request.user, operation)
+        if new_user_balance < 0:
+            raise OutOfMoney(
+                f"User balance({user_balance}) is not enough to perform an operation({operation.type}) of {operation.cost}"
+            )
+        self.check_variable_payload(variables, operation)
+        return operation, variables
+
+    def charge_operation(
+        self,
+        request: WSGIRequestHandler,
+        operation: OperationEntry,
+        variables: dict,
+        result,
+    ):
+        """
+        This function charges a performed operation to the user and builds the response with its result.
+
+        :param request: The request of the user performing the operation
+        :param operation: The catalog entry of the operation performed
+        :param variables: The variables used to perform the operation
+        :param result: The result of the operation
+        :return: the response data with a developer message and data containing the result of the
+        operation.
+        """
+        # The balance checked before is only a hint, the charge is checked again atomically
+        new_user_balance, _ = query_charge_operation(
+            request.user.id, operation, str(result)
+        )
+        request.user.balance = new_user_balance
+
+        return {
+            "developer_message": f"The process {operation.type} was successful",
+            "data": {
+                "result": result,
+                "variables": variables,
+                "user_balance": new_user_balance,
+            },
+        }
+
     def process_request(self, request: WSGIRequestHandler, body: json):
         """
         This function processes a request by performing an addition operation and saving the result in a
@@ -92,51 +175,195 @@ class NewOperationView(BaseAuthView):
         the server. It is expected to have two keys: `operation_id` and `variables`. The `operation_id`
         is the ID of the operation to be performed, while the `variables` key contains the variables
         :type body: json
-        :return: a JSON response with a developer message and data containing the result of the
+        :return: the response data with a developer message and data containing the result of the
         operation.
         """
-        operation_id = body["operation_id"]
-        variables = self.get_variables(body["variables"])
+        operation, variables = self.get_operation(request, body)
+        # Perform the operation using the corresponding function
+        result = operation_functions[operation.type](**variables)
+        return self.charge_operation(request, operation, variables, result)
+
+
+def batch_item_error(index: int, exception: BaseCustomException):
+    return {"index": index, "success": False, **exception.to_dict()}
+
+
+class BatchOperationView(NewOperationView):
+    """
+    The BatchOperationView class processes a list of operations in a single request, charging their
+    total cost to the user at once and storing all their records with a bulk insert. In "atomic" mode
+    (default) any invalid item rejects the whole batch, in "best_effort" mode the valid items the user
+    can pay are processed and the rest are reported as errors.
+    """
+
+    required_fields = ["operations"]
+    item_required_fields = ["operation_id", "variables"]
+
+    def validate_batch(self, body: dict):
+        mode = body.get("mode", BatchMode.ATOMIC.value)
+        items = body["operations"]
+        if mode not in [batch_mode.value for batch_mode in BatchMode]:
+            raise BadRequest(f"Invalid batch mode {mode}")
+        if not isinstance(items, list) or not 0 < len(items) <= MAX_BATCH_OPERATIONS:
+            raise BadRequest(
+                f"Operations field must be a list of 1 to {MAX_BATCH_OPERATIONS} operations"
+            )
+        return mode, items
+
+    def resolve_item(self, item):
+        """
+        This function finds the operation of a batch item and checks its variables without running it.
+
+        :param item: A dictionary with the `operation_id` and `variables` keys
+        :return: A tuple with the catalog entry of the operation and the variables dictionary
+        """
+        if not isinstance(item, dict) or check_keys_on_dict(
+            self.item_required_fields, item
+        ):
+            raise BadRequest(
+                "Each operation needs the operation_id and variables fields"
+            )
         try:
-            operation = Operation.objects.get(id=operation_id)
-            user_balance, new_user_balance = self.check_balance(request.user, operation)
-            if new_user_balance >= 0:
-                self.check_variable_payload(variables, operation)
-                # Perform the operation using the corresponding function
-                operation_function = operation_functions[operation.type]
-                result = operation_function(**variables)
-
-                record_payload = {
-                    "operation": operation,
-                    "user": request.user,
-                    "amount": operation.cost,
-                    "operation_response": str(result),
-                }
-                record = Record(**record_payload)
-                record.user_balance = new_user_balance
-                request.user.balance = new_user_balance
-                record.save()
-                request.user.save()
-
-                return JsonResponse(
-                    {
-                        "developer_message": f"The process {operation.type} was successful",
-                        "data": {"result": result, "variables": variables},
-                    }
+            operation = operation_catalog.get(item["operation_id"])
+        except ObjectDoesNotExist:
+            raise NotFound(f"The operation {item['operation_id']} doesn't exist")
+        variables = self.get_variables(item["variables"])
+        self.check_variable_payload(variables, operation)
+        return operation, variables
+
+    @staticmethod
+    def affordable(planned: list, balance: float):
+        # Split the planned items on the ones the balance can pay, in order, and the rest
+        total = 0
+        for position, (_, operation, _) in enumerate(planned):
+            if round(total + operation.cost, 2) > balance:
+                return planned[:position], planned[position:]
+            total += operation.cost
+        return planned, []
+
+    def process_request(self, request: WSGIRequestHandler, body: dict):
+        """
+        This function validates, performs and charges a batch of operations.
+
+        :param request: The `request` parameter is an instance of the `WSGIRequestHandler` class
+        :type request: WSGIRequestHandler
+        :param body: The request body with the `operations` list, each one with the `operation_id` and
+        `variables` keys, and the optional `mode` ("atomic" or "best_effort")
+        :return: the response data with the result or the error of each operation and the new user
+        balance
+        """
+        mode, items = self.validate_batch(body)
+        atomic = mode == BatchMode.ATOMIC.value
+        results = [None] * len(items)
+
+        planned = []
+        for index, item in enumerate(items):
+            try:
+                planned.append((index, *self.resolve_item(item)))
+            except BaseCustomException as e:
+                results[index] = batch_item_error(index, e)
+        if atomic and len(planned) < len(items):
+            raise BatchOperationError([r for r in results if r])
+
+        # Check the balance before running the operations, the charge checks it again atomically
+        planned, unpaid = self.affordable(planned, request.user.balance)
+        if atomic and unpaid:
+            total_cost = round(
+                sum(operation.cost for _, operation, _ in unpaid + planned), 2
+            )
+            raise OutOfMoney(
+                f"User balance({request.user.balance}) is not enough to perform an operation(batch) of {total_cost}"
+            )
+
+        performed = []
+        for index, operation, variables in planned:
+            try:
+                result = operation_functions[operation.type](**variables)
+                performed.append((index, operation, variables, result))
+                continue
+            except BaseCustomException as e:
+                error = e
+            except (ArithmeticError, ValueError, TypeError):
+                error = BadRequest(
+                    f"Invalid variables for the operation {operation.type}"
                 )
-            else:
-                raise OutOfMoney(
-                    f"User balance({user_balance}) is not enough to perform an operation({operation.type}) of {operation.cost}"
+            if atomic:
+                raise BatchOperationError([batch_item_error(index, error)])
+            results[index] = batch_item_error(index, error)
+
+        new_user_balance = request.user.balance
+        while performed:
+            try:
+                new_user_balance, _ = query_charge_operations(
+                    request.user.id,
+                    [(operation, str(result)) for _, operation, _, result in performed],
                 )
-        except ObjectDoesNotExist:
-            raise NotFound
+                break
+            except OutOfMoney:
+                if atomic:
+                    raise
+                # The balance changed meanwhile, keep only what the current balance can pay
+                request.user.refresh_from_db(fields=["balance"])
+                new_user_balance = request.user.balance
+                paid, not_paid = self.affordable(
+                    [(i, op, v) for i, op, v, _ in performed], new_user_balance
+                )
+                unpaid += not_paid
+                performed = performed[: len(paid)]
+        request.user.balance = new_user_balance
+
+        for index, operation, _ in unpaid:
+            results[index] = batch_item_error(
+                index,
+                OutOfMoney(
+                    f"User balance is not enough to perform the operation({operation.type})"
+                ),
+            )
+        for index, operation, variables, result in performed:
+            results[index] = {
+                "index": index,
+                "success": True,
+                "operation_id": operation.id,
+                "result": result,
+                "variables": variables,
+            }
+
+        return {
+            "developer_message": f"The batch of {len(performed)} operations was processed",
+            "data": {"results": results, "user_balance": new_user_balance},
+        }
 
 
 # This is a paginated view class for the Operation model with allowed filters for type and cost range.
 class GetOperations(PaginatedView):
     allowed_order_filters = ["type", "cost__gt", "cost__lt"]
+    allowed_fields = ["id", "type", "cost", "fields"]
     model = Operation
 
+    def get_queryset(self, request, body):
+        # The operations are served from the in-memory catalog instead of the database
+        return self.get_query_plan(body).apply_to_entries(operation_catalog.all())
+
+    def get_validators(self, request, body):
+        # The listing only changes when the catalog does
+        return (
+            make_etag("operations", operation_catalog.version, sorted(body.items())),
+            None,
+        )
+
+    def get_response_cache(self):
+        return get_operations_response_cache()
+
+    def get_response_cache_key(self, body):
+        # The catalog version changes on every write to the operations, which leaves the old keys behind
+        return ("operations", operation_catalog.version, tuple(sorted(body.items())))
+
+    def serialize_page(self, object_list, fields: list):
+        data = [entry.to_dict() for entry in object_list]
+        if fields:
+            data = [{field: item[field] for field in fields} for item in data]
+        return data
+
 
 # This is a paginated view class for retrieving user records with allowed filters and search fields.
 class GetUserRecords(PaginatedView):
@@ -156,6 +383,9 @@ class GetUserRecords(PaginatedView):
         "user_balance__gt",
         "operation_response",
         "created_at",
+        # Bounding the creation date lets PostgreSQL skip the partitions of the other months
+        "created_at__gte",
+        "created_at__lt",
     ]
     search_fields = [
         "operation__type",
@@ -164,19 +394,221 @@ class GetUserRecords(PaginatedView):
         "user_balance",
         "operation_response",
     ]
+    allowed_fields = [
+        "id",
+        "operation_id",
+        "user_id",
+        "amount",
+        "user_balance",
+        "operation_response",
+        "created_at",
+        "operation__type",
+        "operation__cost",
+        "user__username",
+    ]
     model = Record
 
     def base_query(self, request, *args, **kwargs):
         queryset = super().base_query(request, *args, **kwargs)
-        return queryset.filter(user=request.user)
+        return queryset.filter(user_id=request.user.id)
+
+    def get_validators(self, request, body):
+        # Every new or deleted record of the user moves the changed_at stamp of their counters
+        records, changed_at = query_records_changed(request.user.id)
+        etag = make_etag(
+            "records",
+            request.user.id,
+            records,
+            changed_at,
+            request.user.balance,
+            sorted(body.items()),
+        )
+        # No Last-Modified, with a resolution of seconds it would hide the records written in the same
+        # second as the response
+        return etag, None
+
+    def count_objects(self, request, body):
+        # The unfiltered listing is answered by the counters of the user
+        if body.get("filter") or body.get("search"):
+            return None
+        return (
+            RecordCounter.objects.filter(user_id=request.user.id)
+            .values_list("records", flat=True)
+            .first()
+            or 0
+        )
+
+    def get_default_fields(self):
+        # The search document is only used to filter the records
+        return [
+            field.attname
+            for field in self.model._meta.concrete_fields
+            if field.name != "search_document"
+        ]
+
+    def process_request(self, request, body, *args, **kwargs):
+        # The same pages are requested over and over between the writes of the user
+        response = get_record_page(
+            request.user.id,
+            body,
+            lambda: super(GetUserRecords, self).process_request(
+                request, body, *args, **kwargs
+            ),
+        )
+        return {**response, "user_balance": round(request.user.balance, 2)}
+
+
+class Echo:
+    # Pseudo buffer for csv.writer, it returns the rows instead of storing them
+    def write(self, value):
+        return value
+
+
+# This is a view class that streams every record of the user matching the listing filters.
+class ExportUserRecords(GetUserRecords):
+    content_types = {
+        ExportFormat.NDJSON.value: "application/x-ndjson",
+        ExportFormat.CSV.value: "text/csv",
+    }
+
+    @staticmethod
+    def ndjson_rows(fields: list, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    @staticmethod
+    def csv_rows(fields: list, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([row[field] for field in fields])
+
+    def get(self, request: WSGIRequestHandler, **kwargs) -> StreamingHttpResponse:
+        """
+        This function streams the records of the user matching the `filter`, `search`, `order` and
+        `fields` parameters of the listing, as NDJSON (default) or CSV depending on the `format` parameter.
+        The rows are read through a server-side cursor in chunks of EXPORT_CHUNK_SIZE, so the memory
+        used doesn't depend on how many records the user has.
+
+        :param request: The request of the user exporting the records
+        :type request: WSGIRequestHandler
+        :return: A StreamingHttpResponse with one record per line.
+        """
+        body = request.GET.dict()
+        export_format = body.get("format", ExportFormat.NDJSON.value)
+        if export_format not in self.content_types:
+            raise BadRequest(f"The format {export_format} is not supported")
+        fields = self.get_fields(body)
+        queryset = self.get_queryset(request, body)
+        # The rows are streamed after the view returns, so the queryset is bound to the replica
+        alias = self.get_read_database(request)
+        if alias is not None:
+            queryset = queryset.using(alias)
+        rows = queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        serialize = (
+            self.csv_rows
+            if export_format == ExportFormat.CSV.value
+            else self.ndjson_rows
+        )
+        response = StreamingHttpResponse(
+            serialize(fields, rows), content_type=self.content_types[export_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="records.{export_format}"'
+        )
+        return response
+
+
+# This is a view class that returns how many records and how much the user spent per day and operation
+# type, read from the rollups kept up to date with the records.
+class GetRecordsSummary(BaseAuthView):
+    read_from_replica = True
+    allowed_filters = ["day", "day__gte", "day__lte", "operation_type"]
+
+    def get_validators(self, request, body):
+        # The rollups change along with the counters of the user
+        records, changed_at = query_records_changed(request.user.id)
+        etag = make_etag(
+            "records_summary",
+            request.user.id,
+            records,
+            changed_at,
+            sorted(body.items()),
+        )
+        # Revalidated by the ETag only, as the records listing
+        return etag, None
 
     def process_request(self, request, body, *args, **kwargs):
-        response = super().process_request(request, body, *args, **kwargs)
-        return add_success_response(
-            response, "user_balance", round(request.user.balance, 2)
+        """
+        This function returns the spend rollups of the user ordered by day and operation type.
+
+        :param body: The request parameters, `filter` takes the same `key:value` conditions of the
+        listings on the `day` (YYYY-MM-DD), `day__gte`, `day__lte` and `operation_type` keys
+        :return: the rollups of the days with records along with the total of records and amount.
+        """
+        plan = compile_query_plan(
+            RecordRollup, self.allowed_filters, body.get("filter", "")
+        )
+        rollups = plan.apply(
+            RecordRollup.objects.filter(user_id=request.user.id, records__gt=0)
         )
+        data = list(
+            rollups.order_by("day", "operation_type").values(
+                "day", "operation_type", "records", "amount"
+            )
+        )
+        for rollup in data:
+            rollup["amount"] = round(rollup["amount"], 2)
+        return {
+            "data": data,
+            "total_records": sum(rollup["records"] for rollup in data),
+            "total_amount": round(sum(rollup["amount"] for rollup in data), 2),
+            **body,
+        }
 
 
 class DeleteRecord(BaseAuthView):
     model = Record
     required_fields = ["id"]
+
+
+# This is a view class that soft deletes at once the records of the user matching a list of ids or the
+# listing filters.
+class DeleteRecords(GetUserRecords):
+    http_method_names = ["delete"]
+
+    @staticmethod
+    def get_ids(body: dict):
+        try:
+            ids = [int(id) for id in body.get("ids", "").split(",") if id.strip()]
+        except ValueError:
+            raise BadRequest("The ids must be numbers")
+        if len(ids) > MAX_BULK_DELETE_IDS:
+            raise BadRequest(
+                f"At most {MAX_BULK_DELETE_IDS} ids can be deleted at once"
+            )
+        return ids
+
+    def delete_record(self, request, body):
+        """
+        This function soft deletes the records of the user given by `ids` (comma separated), matching
+        the `filter` and `search` parameters of the listing, or both, with a single UPDATE.
+
+        :param body: The request parameters, at least `ids`, `filter` or `search` has to be provided
+        :return: how many records were deleted, records already deleted or from other users aren't.
+        """
+        ids = self.get_ids(body)
+        # Checked on the compiled plan, the empty conditions and blank searches don't narrow the query
+        plan = self.get_query_plan(body)
+        if not ids and not plan.filters and not plan.search.strip():
+            raise BadRequest(
+                "The ids, a filter or a search of the records are required"
+            )
+        queryset = self.get_queryset(request, body)
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+        deleted = query_soft_delete_records(request.user.id, queryset)
+        return {
+            "developer_message": f"{deleted} records were deleted",
+            "data": {"deleted": deleted},
+        }
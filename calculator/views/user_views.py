@@ -1,4 +1,5 @@
 from wsgiref.simple_server import WSGIRequestHandler
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
 from django.forms.models import model_to_dict
 from django.core.exceptions import ObjectDoesNotExist
@@ -12,6 +13,9 @@ from django.utils import timezone
 from datetime import datetime
 import json
 from calculator.utils.utils import check_keys_on_dict
+from calculator.utils.token_cache import invalidate_token
+from calculator.utils.responses import make_etag
+from calculator.utils.signed_tokens import make_signed_token, revoked_tokens
 from calculator.views import BaseAuthView
 
 
@@ -24,6 +28,23 @@ class LoginView(View):
         if missing_fields:
             raise BadRequest
 
+    @staticmethod
+    def get_or_create_token(user: User):
+        """
+        This function returns the active token of the user, replacing it by a new one if it expired.
+
+        :param user: The user that is logging in
+        :type user: User
+        :return: A tuple with the token key and its expiration datetime
+        """
+        token, _ = Token.objects.get_or_create(user=user, deleted=False)
+        if token.expires_at < datetime.now(timezone.utc):  # Check expiration date
+            token.deleted = True
+            token.save()
+            invalidate_token(token.key)
+            token, _ = Token.objects.get_or_create(user=user, deleted=False)
+        return token.key, token.expires_at
+
     def post(self, request: WSGIRequestHandler):
         """
         This function handles user login by checking the validity of the provided credentials and
@@ -42,22 +63,17 @@ class LoginView(View):
             is_password_valid = check_password(body["password"], user.password)
             if is_password_valid:
                 user.last_login = now()
-                token, _ = Token.objects.get_or_create(user=user, deleted=False)
-                if token.expires_at < datetime.now(
-                    timezone.utc
-                ):  # Check expiration date
-                    token.deleted = True
-                    token.save()
-                    token, _ = Token.objects.get_or_create(user=user, deleted=False)
-                user.save()
-                lifetime = (
-                    token.expires_at - datetime.now(timezone.utc)
-                ).total_seconds()
+                if settings.STATELESS_TOKENS:
+                    token_key, expires_at = make_signed_token(user.id)
+                else:
+                    token_key, expires_at = self.get_or_create_token(user)
+                user.save(update_fields=["last_login"])
+                lifetime = (expires_at - datetime.now(timezone.utc)).total_seconds()
                 response = JsonResponse(
                     {
                         "developer_message": "Login successful",
                         "lifetime": lifetime,
-                        "token": token.key,
+                        "token": token_key,
                         "data": {"username": user.username, "balance": user.balance},
                     }
                 )
@@ -86,20 +102,35 @@ class LogoutView(BaseAuthView):
         :type request: WSGIRequestHandler
         :return: A JSON response with a message indicating that the logout was successful.
         """
+        claims = getattr(request, "auth_claims", None)
+        if claims:
+            # Stateless tokens can't be deleted, they are revoked until they expire
+            revoked_tokens.revoke(claims)
+            return JsonResponse({"developer_message": "Logout successful"})
         token = Token.objects.get(user=request.user, deleted=False)
         token.deleted = True
         token.save()
+        invalidate_token(token.key)
         return JsonResponse({"developer_message": "Logout successful"})
 
 
 # This is a class-based view in Python that handles user logout by deleting the user's token.
 class UserView(BaseAuthView):
+    read_from_replica = True
+
+    def get_validators(self, request: WSGIRequestHandler, body: dict):
+        # The user was already read by the authentication
+        return (
+            make_etag(
+                "user", request.user.id, request.user.username, request.user.balance
+            ),
+            None,
+        )
+
     def process_request(self, request: WSGIRequestHandler, body, *args, **kwargs):
-        return JsonResponse(
-            {
-                "data": {
-                    "username": request.user.username,
-                    "user_balance": round(request.user.balance, 2),
-                }
+        return {
+            "data": {
+                "username": request.user.username,
+                "user_balance": round(request.user.balance, 2),
             }
-        )
+        }
@@ -2,3 +2,15 @@ import pytest
 
 from calculator.fixtures.user_fixtures import *
 from calculator.fixtures.operation_fixtures import *
+from calculator.fixtures.http_fixtures import *
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_cache():
+    from django.core.cache import caches
+    from django.core.cache.backends.db import DatabaseCache
+
+    # Drops the shared version stamps so every in-memory cache starts empty, the database cache
+    # (CACHE_BACKEND=database) is rolled back along with the test instead
+    if not isinstance(caches["default"], DatabaseCache):
+        caches["default"].clear()